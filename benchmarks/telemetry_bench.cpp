@@ -0,0 +1,68 @@
+/////////////////////////////////////////////////////////////////////////////////
+// @file            telemetry_bench.cpp
+// @brief           Compares the decode cost of the JSON and binary telemetry
+//                  messages as seen by EO_Interface::ProcessData
+// @author          Chip Brommer
+/////////////////////////////////////////////////////////////////////////////////
+
+/////////////////////////////////////////////////////////////////////////////////
+//
+// Includes:
+//          name                    reason included
+//          ------------------      ------------------------
+#include    <iostream>              // console io
+#include    <chrono>                // timing
+#include    <string>                // strings
+#include    "nlohmann/json.hpp"     // json handling
+#include    "eo_interface.h"        // frame header size and binary telemetry record
+//
+constexpr int ITERATIONS = 200000;  // number of messages to decode per encoding
+//
+/////////////////////////////////////////////////////////////////////////////////
+
+int main()
+{
+    // Same message as the python script sends for each encoding
+    const std::string json = R"({"sequence": 1, "timestamp": 45296.123456, "azimuth": -12.3456789, )"
+        R"("elevation": 3.21098765, "distance": 1523.75, "frame_seq": 1234, "capture_ns": 912345678901234, )"
+        R"("publish_ns": 912345690123456, "driver_ms": -1.0, "flags": 3, "azimuth_rate": 0.52341, )"
+        R"("elevation_rate": -0.10472, "distance_rate": -3.25, "covariance": [0.0021, 0.0019, 0.87], "tracks": []})";
+
+    TelemetryRecord sample{ TELEMETRY_BINARY_VERSION, TELEMETRY_FLAG_TRACKING | TELEMETRY_FLAG_PREDICTED, 0, 1, 1234, 0,
+        912345678901234, 912345690123456, 45296.123456, -12.3456789, 3.21098765, 1523.75, NO_DRIVER_TIMESTAMP,
+        0.52341, -0.10472, -3.25, 0.0021, 0.0019, 0.87 };
+    std::string binary(reinterpret_cast<const char*>(&sample), sizeof(sample));
+
+    // Accumulate the decoded values so the work cannot be optimized away
+    double sum = 0;
+
+    auto start = std::chrono::steady_clock::now();
+    for (int i = 0; i < ITERATIONS; i++)
+    {
+        nlohmann::json jsonData = nlohmann::json::parse(json.data(), json.data() + json.size());
+        if (jsonData.contains("azimuth"))   sum += jsonData["azimuth"].get<double>();
+        if (jsonData.contains("elevation")) sum += jsonData["elevation"].get<double>();
+        if (jsonData.contains("distance"))  sum += jsonData["distance"].get<double>();
+        if (jsonData.contains("capture_ns")) sum += jsonData["capture_ns"].get<uint64_t>();
+    }
+    auto jsonTime = std::chrono::steady_clock::now() - start;
+
+    start = std::chrono::steady_clock::now();
+    for (int i = 0; i < ITERATIONS; i++)
+    {
+        TelemetryRecord record{};
+        if (DecodeTelemetry(binary.data(), binary.size(), record))
+        {
+            sum += record.azimuth + record.elevation + record.distance + record.captureNs;
+        }
+    }
+    auto binaryTime = std::chrono::steady_clock::now() - start;
+
+    auto perMessage = [](auto elapsed) { return std::chrono::duration<double, std::micro>(elapsed).count() / ITERATIONS; };
+
+    std::cout << "encoding  decode us  wire bytes\n";
+    std::cout << "json      " << perMessage(jsonTime) << "  " << FRAME_HEADER_SIZE + json.size() << "\n";
+    std::cout << "binary    " << perMessage(binaryTime) << "  " << FRAME_HEADER_SIZE + binary.size() << "\n";
+    std::cout << "(checksum " << sum << ")\n";
+    return 0;
+}
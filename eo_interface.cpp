@@ -11,6 +11,7 @@
 //          ------------------      ------------------------
 #include    "eo_interface.h"        // class header
 #include    <iostream>              // console io
+#include    <cstring>               // memcpy
 //
 /////////////////////////////////////////////////////////////////////////////////
 
@@ -19,8 +20,8 @@ EO_Interface::EO_Interface(const std::string& scriptFilePath, const std::string&
     const int port, const int timeoutSeconds, const int messageRate, const std::string videoFilePath)
     : mScriptFilePath(scriptFilePath), mCameraPort(cameraPort), mIpAddress(ip),
     mPort(port), mTimeout(timeoutSeconds), mMessageRate(messageRate), mVideoFilePath(videoFilePath),
-    mVideoCaptureEnabled(false), mDisplay(false), mStarted(false), mSocket(-1), mReadBuffer{},
-    mRxCount(0), mTxCount(0), mConnectionStatus(ConnectionStatus::DISCONNECTED)
+    mTelemetryEncoding(TelemetryEncoding::JSON), mVideoCaptureEnabled(false), mDisplay(false), mStarted(false), mSocket(-1), mReadBuffer{},
+    mRxCount(0), mTxCount(0), mConnectionStatus(ConnectionStatus::DISCONNECTED), mReceiveNs(0), mLatency{}
 {
     // If we received a desired path for the video output saving, 
     // then enable the flag for passing to the python script. 
@@ -93,6 +94,18 @@ bool EO_Interface::SetPythonServerMessageRateInHz(const int rate)
     return mMessageRate == rate;
 }
 
+bool EO_Interface::SetTelemetryEncoding(const TelemetryEncoding encoding)
+{
+    // Prevent if already connected. 
+    if (mStarted)
+    {
+        return false;
+    }
+
+    mTelemetryEncoding = encoding;
+    return mTelemetryEncoding == encoding;
+}
+
 bool EO_Interface::Setup(const std::string& ip, const int port)
 {
     // Prevent if already connected. 
@@ -150,6 +163,11 @@ bool EO_Interface::Connect()
         command += " --save " + mVideoFilePath;
     }
 
+    if (mTelemetryEncoding == TelemetryEncoding::BINARY)
+    {
+        command += " --encoding binary";
+    }
+
     // For linux, redirect the console output and errors to /dev/null and add
     // an '&' to the end of the command instructing it to run in the background. 
 #ifndef _WIN32
@@ -171,6 +189,9 @@ bool EO_Interface::Connect()
         return false;
     }
 
+    // Start the new connection without any partial message from a previous one
+    mRxBuffer.clear();
+
     // Attempt to create the socket for communication
     mSocket = socket(AF_INET, SOCK_STREAM, 0);
     if (mSocket < 0)
@@ -235,7 +256,9 @@ bool EO_Interface::Start()
 
         if (data != "")
         {
-            ProcessData(data);
+            // A single read may hold partial or several messages, buffer and extract them
+            mRxBuffer.append(data);
+            ProcessReceiveBuffer();
         }
     }
 
@@ -249,7 +272,13 @@ bool EO_Interface::Stop()
         return false;
     }
 
-    if (!closesocket(mSocket))
+    // Tell the script to quit while the connection is still up, a lost connection has nobody to tell
+    if (mConnectionStatus == ConnectionStatus::CONNECTED && !Write(QUIT_COMMAND))
+    {
+        std::cerr << "[EO_iFace] Error sending quit command\n";
+    }
+
+    if (closesocket(mSocket) != 0)
     {
 #ifdef _WIN32
         int err = WSAGetLastError();
@@ -286,7 +315,6 @@ std::string EO_Interface::Read()
     if (bytesRead > 0)
     {
         std::string receivedData(mReadBuffer, bytesRead);
-        mRxCount++;
         return receivedData;
     }
     else if (bytesRead == 0)
@@ -330,10 +358,22 @@ bool EO_Interface::Write(const std::string & data)
         return false;
     }
 
+    if (data.size() > MAX_MESSAGE_SIZE)
+    {
+        std::cerr << "[EO_iFace] Message too large to write: " << data.size() << "\n";
+        return false;
+    }
+
+    // Prefix the message with its length in network byte order
+    uint32_t length = htonl(static_cast<uint32_t>(data.size()));
+    std::string message(FRAME_HEADER_SIZE, '\0');
+    std::memcpy(message.data(), &length, FRAME_HEADER_SIZE);
+    message += data;
+
     // Send data over the connection
-    int bytesSent = send(mSocket, data.c_str(), static_cast<int>(data.size()), 0);
+    int bytesSent = send(mSocket, message.c_str(), static_cast<int>(message.size()), 0);
 
-    if (bytesSent == static_cast<int>(data.size()))
+    if (bytesSent == static_cast<int>(message.size()))
     {
         // Data sent successfully
         mTxCount++;
@@ -358,12 +398,124 @@ EO_Interface::ConnectionStatus EO_Interface::GetConnectionStatus() const
     return mConnectionStatus;
 }
 
-void EO_Interface::ProcessData(const std::string & data)
+LatencyStatistics EO_Interface::GetLatencyStatistics() const
+{
+    std::lock_guard<std::mutex> lock(mLatencyMutex);
+    return mLatency;
+}
+
+void EO_Interface::ResetLatencyStatistics()
+{
+    std::lock_guard<std::mutex> lock(mLatencyMutex);
+    mLatency = {};
+}
+
+void EO_Interface::PrintTracks() const
+{
+    for (const TelemetryTrack& track : mTracks)
+    {
+        std::cout << "\tTrack " << track.id << " :: "
+            << "Azimuth: " << std::to_string(track.azimuth) << " "
+            << "Elevation: " << std::to_string(track.elevation) << " "
+            << "Distance: " << std::to_string(track.distance) << "\n";
+    }
+}
+
+double EO_Interface::UpdateLatency(const uint64_t captureNs, const uint64_t publishNs)
+{
+    if (captureNs == 0 || publishNs == 0)
+    {
+        return -1;
+    }
+
+    // Signed differences so a clock mismatch shows up as negative rather than wrapping
+    auto toMs = [](const uint64_t from, const uint64_t to) { return static_cast<double>(static_cast<int64_t>(to - from)) / 1e6; };
+    double captureToReceive = toMs(captureNs, mReceiveNs);
+
+    std::lock_guard<std::mutex> lock(mLatencyMutex);
+    mLatency.captureToPublish.Add(toMs(captureNs, publishNs));
+    mLatency.publishToReceive.Add(toMs(publishNs, mReceiveNs));
+    mLatency.captureToReceive.Add(captureToReceive);
+    return captureToReceive;
+}
+
+void EO_Interface::ProcessReceiveBuffer()
+{
+    size_t offset = 0;
+
+    // Every message extracted here arrived with the latest read
+    mReceiveNs = static_cast<uint64_t>(std::chrono::duration_cast<std::chrono::nanoseconds>(
+        std::chrono::steady_clock::now().time_since_epoch()).count());
+
+    while (mRxBuffer.size() - offset >= FRAME_HEADER_SIZE)
+    {
+        uint32_t length = 0;
+        std::memcpy(&length, mRxBuffer.data() + offset, FRAME_HEADER_SIZE);
+        length = ntohl(length);
+
+        if (length > MAX_MESSAGE_SIZE)
+        {
+            // The stream is out of sync and there is no way to find the next message
+            std::cerr << "[EO_iFace] Invalid message length " << length << ", discarding received data\n";
+            mRxBuffer.clear();
+            return;
+        }
+
+        // Wait for the rest of the message
+        if (mRxBuffer.size() - offset - FRAME_HEADER_SIZE < length)
+        {
+            break;
+        }
+
+        mRxCount++;
+        ProcessData(mRxBuffer.data() + offset + FRAME_HEADER_SIZE, length);
+        offset += FRAME_HEADER_SIZE + length;
+    }
+
+    // Keep only the trailing partial message
+    mRxBuffer.erase(0, offset);
+}
+
+void EO_Interface::ProcessData(const char* data, const size_t size)
 {
+    // Binary records are copied out directly, no parsing required
+    if (IsBinaryTelemetry(data, size))
+    {
+        TelemetryRecord record{};
+        if (!DecodeTelemetry(data, size, record))
+        {
+            std::cerr << "[EO_iFace] Invalid binary telemetry of " << size << " bytes\n";
+            return;
+        }
+
+        if (!DecodeTelemetryTracks(data, size, record, mTracks))
+        {
+            std::cerr << "[EO_iFace] Telemetry announced " << record.trackCount << " tracks in " << size << " bytes\n";
+            return;
+        }
+
+        double latency = UpdateLatency(record.captureNs, record.publishNs);
+
+        std::cout << mRxCount << " :: "
+            << "Timestamp: " << std::to_string(record.timestamp) << " "
+            << "Frame: " << record.frameSequence << " "
+            << "Azimuth: " << std::to_string(record.azimuth) << " "
+            << "Elevation: " << std::to_string(record.elevation) << " "
+            << "Distance: " << std::to_string(record.distance) << " "
+            << "AzRate: " << std::to_string(record.azimuthRate) << " "
+            << "ElRate: " << std::to_string(record.elevationRate) << " "
+            << ((record.flags & TELEMETRY_FLAG_PREDICTED) ? "Predicted " : "")
+            << "Tracks: " << mTracks.size() << " "
+            << "Latency: " << std::to_string(latency) << " ms \n";
+
+        PrintTracks();
+        return;
+    }
+
     // Attempt to parse the data as Json we are looking for.
     try
     {
-        nlohmann::json jsonData = nlohmann::json::parse(data);
+        nlohmann::json jsonData = nlohmann::json::parse(data, data + size);
 
         std::string out(std::to_string(mRxCount) + " :: ");
 
@@ -404,7 +556,42 @@ void EO_Interface::ProcessData(const std::string & data)
             out += "Distance: " + std::to_string(distance) + " ";
         }
 
+        if (jsonData.contains("azimuth_rate"))
+        {
+            double azimuthRate = jsonData["azimuth_rate"];
+            out += "AzRate: " + std::to_string(azimuthRate) + " ";
+        }
+
+        if (jsonData.contains("elevation_rate"))
+        {
+            double elevationRate = jsonData["elevation_rate"];
+            out += "ElRate: " + std::to_string(elevationRate) + " ";
+        }
+
+        if (jsonData.contains("flags") && (jsonData["flags"].get<int>() & TELEMETRY_FLAG_PREDICTED))
+        {
+            out += "Predicted ";
+        }
+
+        // Tracks are compact [id, azimuth, elevation, distance] arrays
+        mTracks.clear();
+        if (jsonData.contains("tracks"))
+        {
+            for (const auto& track : jsonData["tracks"])
+            {
+                mTracks.push_back({ track[0].get<uint32_t>(), track[1].get<float>(), track[2].get<float>(), track[3].get<float>() });
+            }
+            out += "Tracks: " + std::to_string(mTracks.size()) + " ";
+        }
+
+        if (jsonData.contains("capture_ns") && jsonData.contains("publish_ns"))
+        {
+            double latency = UpdateLatency(jsonData["capture_ns"], jsonData["publish_ns"]);
+            out += "Latency: " + std::to_string(latency) + " ms ";
+        }
+
         std::cout << out << "\n";
+        PrintTracks();
     }
     catch (const std::exception& e)
     {
@@ -19,7 +19,11 @@
 #include    <chrono>                // sleep duration
 #include    <thread>                // sleep
 #include    <atomic>                // atomic bool
+#include    <cstdint>               // fixed width integers
+#include    <mutex>                 // latency statistics lock
+#include    <vector>                // decoded telemetry tracks
 #include    "nlohmann/json.hpp"     // json handling
+#include    "telemetry.h"           // binary telemetry record
 //
 #ifdef _WIN32                       // if Windows -----
 #include <winsock2.h>               // sockets 
@@ -43,8 +47,11 @@ using SOCKADDR = sockaddr;                          // sockaddr to mimic windows
 constexpr int DEFAULT_PORT = 3456;                  // 
 const std::string DEFAULT_IP = "127.0.0.1";         // loop back address
 constexpr int DEFAULT_TIMEOUT_SECS = 30;            // default timeout for attempting connection
-constexpr int BUFFER_SIZE = 800;                    // default buffer size for read
+constexpr int BUFFER_SIZE = 4096;                   // default buffer size for read
+constexpr size_t FRAME_HEADER_SIZE = 4;             // size of the big endian length prefix on every message
+constexpr uint32_t MAX_MESSAGE_SIZE = 64 * 1024;    // largest message accepted, must match framing.py
 constexpr int DEFAULT_MESSAGE_RATE = 1;             // default rate for python TCP server is 1 Hz
+constexpr const char* QUIT_COMMAND = "quit";        // asks the python script to finalize its recording and exit
 //
 /////////////////////////////////////////////////////////////////////////////////
 
@@ -96,6 +103,11 @@ public:
     /// @return true if set successfully, false if failed (typically means script already running)
     bool SetPythonServerMessageRateInHz(const int rate);
 
+    /// @brief Selects the encoding the python script uses for the telemetry messages
+    /// @param encoding - JSON or the fixed layout binary record
+    /// @return true if set successfully, false if failed (typically means script already running)
+    bool SetTelemetryEncoding(const TelemetryEncoding encoding);
+
     /// @brief Setup the EO Interface for the connection to the python script
     /// @param ip - ip address for the connection
     /// @param port - the port number for the connection
@@ -110,15 +122,16 @@ public:
     /// @return false if the server is not connected
     bool Start();
 
-    /// @brief Stops the connection to the Python server
+    /// @brief Stops the connection to the Python server, asking a connected script to quit first
+    ///        so it finalizes its recording
     /// @return false if server not start or on error, true on successful stop
     bool Stop();
 
     /// @brief Reads data from the the python script
-    /// @return string containings the read contents. 
+    /// @return string containings the read contents, which may hold partial or several framed messages. 
     std::string Read();
 
-    /// @brief Wrate data to the python script
+    /// @brief Wrate data to the python script as a single length prefixed message
     /// @param data - string of data to write to the python script
     /// @return - false if failed to write, else true
     bool Write(const std::string& data);
@@ -127,11 +140,31 @@ public:
     /// @return - class enum represented connection status
     ConnectionStatus GetConnectionStatus() const;
 
+    /// @brief Get the end to end latency statistics computed from the received telemetry
+    /// @return - copy of the current statistics
+    LatencyStatistics GetLatencyStatistics() const;
+
+    /// @brief Clears the latency statistics
+    void ResetLatencyStatistics();
+
 private:
 
-    /// @brief Process the received data from the python client
-    /// @param data - data received from the python server to be processed
-    void ProcessData(const std::string& data);
+    /// @brief Extracts every complete length prefixed message from the receive buffer
+    void ProcessReceiveBuffer();
+
+    /// @brief Process a single message received from the python client
+    /// @param data - pointer to the message payload
+    /// @param size - size of the message payload in bytes
+    void ProcessData(const char* data, const size_t size);
+
+    /// @brief Adds a message's timestamps to the latency statistics
+    /// @param captureNs - monotonic capture time of the processed frame, 0 if not sent
+    /// @param publishNs - monotonic time of message sending
+    /// @return - capture to receive latency in milliseconds, negative if not available
+    double UpdateLatency(const uint64_t captureNs, const uint64_t publishNs);
+
+    /// @brief Prints the tracks of the last processed message
+    void PrintTracks() const;
 
     /// @brief a function that can be called to attempt reconnection if it was dropped. 
     void Reconnect();
@@ -143,6 +176,7 @@ private:
     std::string         mCameraPort;                //< Port for the camera connection to send to the python script
     int                 mPort;                      //< Port number for the client connection
     int                 mMessageRate;               //< Message rate for the python TCP server
+    TelemetryEncoding   mTelemetryEncoding;         //< Encoding requested from the python script
     std::string         mScriptFilePath;            //< File path for the python script 
     std::string         mVideoFilePath;             //< Video file path to be forwarded to the python script
     bool                mVideoCaptureEnabled;       //< Flag for video capture being enabled 
@@ -151,9 +185,14 @@ private:
     SOCKET              mSocket;                    //< Connection socket
     int                 mTimeout;                   //< Timeout for the connection loop
     char                mReadBuffer[BUFFER_SIZE];   //< Read buffer for reading from the python script server
-    long                mRxCount;                   //< Rx Count we have successfully received
+    std::string         mRxBuffer;                  //< Reassembly buffer for messages split or coalesced by TCP
+    long                mRxCount;                   //< Rx count of messages we have successfully received
     long                mTxCount;                   //< Tx count we have successfully sent
     ConnectionStatus    mConnectionStatus;          //< Enum for the current connection status
+    uint64_t            mReceiveNs;                 //< Monotonic time the data being processed was received
+    LatencyStatistics   mLatency;                   //< End to end latency statistics
+    mutable std::mutex  mLatencyMutex;              //< Lock for the latency statistics
+    std::vector<TelemetryTrack> mTracks;            //< Tracks of the last processed message
 };
 
 #endif // EO_INTERFACE_H
\ No newline at end of file
@@ -5,15 +5,23 @@
 # @author          Chip Brommer
 #///////////////////////////////////////////////////////////////////////////////
 
-import datetime
 import socket
-import json
+import select
 import argparse
 import sys
 import cv2
 import platform
 import os
 import subprocess
+import time
+from modules.frame_pool import FramePool
+from modules.framing import FrameDecoder, encode_frame
+from modules.telemetry import TelemetryEncoder, TelemetryEncoding, TelemetryFlags, NO_DRIVER_TIMESTAMP, seconds_since_midnight
+from modules.rate_scheduler import RateScheduler
+from modules.pyramid import ImagePyramid
+from modules.video_recorder import VideoRecorder
+from modules.segmented_writer import SegmentedVideoWriter
+from modules.tracker import CameraModel, ColorBlobTracker, TRACKERS, create_tracker
 
 # Define the version number
 MAJOR_VERSION = 0
@@ -22,6 +30,11 @@ BUILD_NUMBER = 6
 VERSION = f"{MAJOR_VERSION}.{MINOR_VERSION}.{BUILD_NUMBER}"
 DEFAULT_SERVER_PORT = 3456      # Default server port to server on
 PUBLISH_FREQUENCY_HZ = 1        # desired message rate from the TCP server
+TRACKER = None                  # Tracker behind process_frame, created in main
+OUTPUT_LEVEL = 1                # Pyramid level shown and recorded, 1 is half resolution
+STATS_INTERVAL_SECS = 5         # Interval between frame pool statistics prints
+RECV_SIZE = 4096                # Bytes read per check for commands from MiniStrike
+QUIT_COMMAND = b'quit'          # Sent by EO_Interface::Stop before it closes the connection
 
 # @brief - A function to handle connecting to the camera 
 # @param device - device location for the camera
@@ -39,26 +52,29 @@ def connect_camera(device: str):
         sys.exit(2)
 
 # @brief - A function to handle processing of a frame for desired items
-# @param frame - video frame to be processed
+# @param pyramid - ImagePyramid of the video frame to be processed
 # @param save - Boolean for if the frame is being written to a file
-# @param file_out - file handle for writing out the video
+# @param recorder - VideoRecorder encoding the video file on its own thread
 # @param display - flag to display video to monitor
+# @param frame_seq - sequence number of the frame, for the recording index
+# @param capture_ns - monotonic capture time of the frame, for the recording index
 # @return azimuth, elevation, distance of the tracked item
-def process_frame(frame, save: bool, file_out, display: bool):
+def process_frame(pyramid, save: bool, recorder, display: bool, frame_seq: int = 0, capture_ns: int = 0):
     azimuth = float(0.0)
     elevation = float(0.0)
     distance = float(0.0)
  
-    # @TODO process frame for desired items and draw box. 
+    # Track the target if a tracker is configured
+    if TRACKER is not None:
+        azimuth, elevation, distance = TRACKER.track(pyramid)
 
     # Display the frame if enabled
     if display:
-        cv2.imshow('Object Tracking - Video Stream', frame)
+        cv2.imshow('Object Tracking - Video Stream', pyramid.level(OUTPUT_LEVEL))
     
-    # Write the frame to the output video file if --save flag is provided
-    if save:
-        if file_out.isOpened():
-            file_out.write(frame)
+    # Queue the frame for the output video file if --save flag is provided, the recorder copies it
+    if save and recorder is not None:
+        recorder.write(pyramid.level(OUTPUT_LEVEL), frame_seq, capture_ns)
 
     return azimuth, elevation, distance
 
@@ -69,23 +85,45 @@ def process_frame(frame, save: bool, file_out, display: bool):
 # @param save - the program args.save 
 # @param out_file - the filename/location to write video. 
 # @param display - flag to display video to monitor
-def run_server(camera, ip, port, save = False, out_file = None, display = False):
+# @param encoding - the TelemetryEncoding for the messages
+# @param segment_secs - capture time per recording segment, 0 for no limit
+# @param segment_mb - size of a recording segment in MB, 0 for no limit
+# @param quota_mb - total size of the recording segments in MB, the oldest are deleted, 0 for no limit
+def run_server(camera, ip, port, save = False, out_file = None, display = False, encoding = TelemetryEncoding.JSON,
+               segment_secs = 0, segment_mb = 0, quota_mb = 0):
+    # Create the encoder for the telemetry messages
+    encoder = TelemetryEncoder(encoding)
+
     # Get camera properties
     frame_width = int(camera.get(cv2.CAP_PROP_FRAME_WIDTH))
     frame_height = int(camera.get(cv2.CAP_PROP_FRAME_HEIGHT))
     fps = int(camera.get(cv2.CAP_PROP_FPS))
 
-    # Resize frame to lower resolution
-    resized_width = int(frame_width / 2)
-    resized_height = int(frame_height / 2)
+    # Build a pyramid per frame, the tracker and the outputs pick their levels and only those are computed
+    tracker_levels = TRACKER.pyramid_levels if TRACKER is not None else 1
+    pyramid = ImagePyramid(frame_width, frame_height, max(OUTPUT_LEVEL + 1, tracker_levels))
+
+    # Preallocate the capture buffers so the loop does not allocate per frame
+    capture_pool = FramePool(frame_width, frame_height)
+    last_stats_time = time.monotonic()
     
-    # Define the codec and create a VideoWriter object if --save flag is provided
+    # Define the codec and start the recorder thread if --save flag is provided
+    recorder = None
+    telemetry_log = None
     if save:
         writer = cv2.VideoWriter_fourcc(*'MJPG')
-        file_out = cv2.VideoWriter(out_file, writer, fps, (resized_width,resized_height))
-        print(f"Writing video to {out_file}")
-    else:
-        file_out = ""    
+        # The tracker output of every frame goes to a sidecar of each segment, joined with the video on the frame sequence
+        file_out = SegmentedVideoWriter(out_file, writer, fps, pyramid.size(OUTPUT_LEVEL), segment_secs, segment_mb, quota_mb,
+                                        telemetry=True)
+        if file_out.is_opened():
+            recorder = VideoRecorder(file_out)
+            recorder.start()
+            print(f"Writing video to {out_file}")
+            telemetry_log = file_out.telemetry_log
+            print(f"Writing telemetry to {telemetry_log.path}")
+        else:
+            file_out.release()
+            print(f"Failed to open video file {out_file}")
 
     # Create a socket to communicate with MiniStrike OFS
     server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
@@ -107,59 +145,83 @@ def run_server(camera, ip, port, save = False, out_file = None, display = False)
         client_socket, client_address = server_socket.accept()
         print(f"Connection from {client_address}")
         
-        # Calculate the time interval between messages
-        time_interval = 1.0 / PUBLISH_FREQUENCY_HZ
-        print(f"TCP Server sending at {time_interval} seconds")
-        lastSend = datetime.datetime.now()
+        # Schedule the messages on fixed deadlines at the publish rate
+        publish_scheduler = RateScheduler(PUBLISH_FREQUENCY_HZ)
+        print(f"TCP Server sending at {PUBLISH_FREQUENCY_HZ} Hz")
+        frame_seq = 0
+        decoder = FrameDecoder()
         
         # While loop to execute while we have a connection
         while client_socket.fileno() != -1 and camera.isOpened():
-            # Read a new frame - break if we failed to read
-            goodRead, frame = camera.read()
+            # Read a new frame into a pooled buffer - break if we failed to read
+            capture_buffer = capture_pool.acquire()
+            goodRead, frame = camera.read(image=capture_buffer.array)
+            capture_ns = time.monotonic_ns()
             if not goodRead:
+                capture_buffer.release()
                 print("Failed to read camera frame")
                 break
-            
-             # Resize the frame
-            resized_frame = cv2.resize(frame, (resized_width, resized_height))
+            frame = capture_buffer.accept(frame)
+            frame_seq += 1
 
-            # Send resized frame for image processing and receive an azimuth, elevation, and distance
-            azimuth, elevation, distance = process_frame(resized_frame, save, file_out, display)
-
-            # Get the current timestamp of the day
-            now = datetime.datetime.now()
+            # Backends without a driver timestamp report 0
+            driver_ms = camera.get(cv2.CAP_PROP_POS_MSEC) or NO_DRIVER_TIMESTAMP
+            
+            # Send the frame's pyramid for image processing and receive an azimuth, elevation, and distance
+            azimuth, elevation, distance = process_frame(pyramid.set_frame(frame), save, recorder, display, frame_seq, capture_ns)
+            capture_buffer.release()
+
+            # Log the tracker output of the frame next to the recording
+            if telemetry_log is not None:
+                found = TRACKER is not None and TRACKER.found
+                track_count = len(TRACKER.get_tracks()) if TRACKER is not None else 0
+                telemetry_log.append(frame_seq, capture_ns, (azimuth, elevation, distance), found, track_count, driver_ms)
+
+            # Periodically report the pool allocations, these should settle at zero
+            if time.monotonic() - last_stats_time >= STATS_INTERVAL_SECS:
+                last_stats_time = time.monotonic()
+                print(f"Frame pool stats: capture {capture_pool.get_stats()} pyramid {pyramid.get_stats()}")
+                print(f"Publish schedule stats: {publish_scheduler.get_stats()}")
+                if TRACKER is not None:
+                    print(f"Tracker stats: {TRACKER.get_stats()}")
+                if recorder is not None:
+                    print(f"Recorder stats: {recorder.get_stats()}")
+                if telemetry_log is not None:
+                    print(f"Telemetry log stats: {telemetry_log.get_stats()}")
 
             # If its time to send another update mesage, send it
-            if (now - lastSend).total_seconds() >= time_interval:
-                lastSend = now
-                midnight = datetime.datetime.combine(now.date(), datetime.time())
-
-                # Get the microseconds and then convert to seconds so we have msec precision. 
-                microseconds = (now - midnight).microseconds 
-                seconds = (now - midnight).seconds + microseconds / 1_000_000  
-
-                data = {
-                    'timestamp': seconds,           # timestamp of message sending
-                    'azimuth': azimuth,             # Azimuth of the tracked item 
-                    'elevation': elevation,         # Elevation of the tracked item 
-                    'distance': distance            # Disatnce of the tracked item
-                }
-
-                # Convert data to JSON format
-                json_data = json.dumps(data)
+            if publish_scheduler.should_fire():
+                # Encode the telemetry in the negotiated format
+                found = TRACKER is not None and TRACKER.found
+                tracks = TRACKER.get_tracks() if TRACKER is not None else ()
+                message = encoder.encode(seconds_since_midnight(), azimuth, elevation, distance, frame_seq, capture_ns, driver_ms,
+                                         flags=TelemetryFlags.TRACKING if found else 0, tracks=tracks)
 
                 try:
-                    # Send JSON data over the socket
-                    client_socket.sendall(json_data.encode('utf-8'))
+                    # Send length prefixed telemetry over the socket
+                    client_socket.sendall(encode_frame(message))
 
                 except (BrokenPipeError, OSError):
                     print("Client disconnected")
                     client_socket.close()
 
+            # Exit if MiniStrike asks to stop or has gone, so the recording is finalized
+            if client_socket.fileno() != -1 and client_socket in select.select([client_socket], [], [], 0)[0]:
+                data = client_socket.recv(RECV_SIZE)
+                if data == b'':
+                    print("Client disconnected")
+                    break
+                if QUIT_COMMAND in decoder.feed(data):
+                    print("Quit received")
+                    break
+
             # Exit if 'q' is pressed
             if cv2.waitKey(1) & 0xFF == ord('q'):
                 break
 
+    except KeyboardInterrupt:
+        print("KeyboardInterrupt Caught, exiting...")
+
     except Exception as e:
         print(f"An error occurred: {e}")
 
@@ -168,9 +230,12 @@ def run_server(camera, ip, port, save = False, out_file = None, display = False)
         print("Closing.")
         server_socket.close()
         
-        # if we were saving to file, release the file 
-        if save:
-            file_out.release()
+        # if we were saving to file, encode what is queued and finalize the file
+        if recorder is not None:
+            recorder.close()
+            print(f"Recorder stats: {recorder.get_stats()}")
+        if telemetry_log is not None:
+            telemetry_log.close()
 
 # @brief - Prints out the received args
 def print_arguments(args):
@@ -260,6 +325,8 @@ def find_camera_path():
 def main():
     # Declare PUBLISH_FREQUENCY_HZ as global
     global PUBLISH_FREQUENCY_HZ  
+    global TRACKER
+    global OUTPUT_LEVEL
     
     # Stream items
     stream_enabled = False
@@ -282,6 +349,17 @@ def main():
     parser.add_argument('--device', '-d',nargs=1, metavar='DEVICE_PATH', help='Specify the device location for the camera connection')
     parser.add_argument('--save', '-s', nargs=1, metavar='OUTPUT_FILE', help='Specify the output file for saving data')
     parser.add_argument('--rate', '-r', default=1, type=int, metavar='RATE_HZ', help='Specify the TCP message rate in Hz')
+    parser.add_argument('--tracker', default='blob', choices=['none', *TRACKERS], help='Specify the tracker that finds the target in each frame')
+    parser.add_argument('--fov', nargs=2, type=float, default=[CameraModel.DEFAULT_HFOV_DEG, CameraModel.DEFAULT_VFOV_DEG], metavar=('H_DEG', 'V_DEG'), help='Specify the horizontal and vertical field of view of the camera')
+    parser.add_argument('--target-size', default=0.0, type=float, metavar='METERS', help='Specify the size of the target used to estimate distance, 0 disables it')
+    parser.add_argument('--target-hsv', nargs=6, type=int, default=[*ColorBlobTracker.DEFAULT_HSV_LOWER, *ColorBlobTracker.DEFAULT_HSV_UPPER], metavar=('H_LOW', 'S_LOW', 'V_LOW', 'H_HIGH', 'S_HIGH', 'V_HIGH'), help='Specify the HSV color range of the target for the blob tracker')
+    parser.add_argument('--segment-secs', default=0, type=float, metavar='SECS', help='Specify the capture time per recording segment, 0 for no limit')
+    parser.add_argument('--segment-mb', default=0, type=float, metavar='MB', help='Specify the size of a recording segment, 0 for no limit')
+    parser.add_argument('--quota-mb', default=0, type=float, metavar='MB', help='Specify the disk quota of the recording segments, the oldest are deleted, 0 for no limit')
+    parser.add_argument('--output-level', default=OUTPUT_LEVEL, type=int, metavar='LEVEL', help='Specify the pyramid level shown and recorded, each level halves the resolution')
+    parser.add_argument('--max-tracks', default=0, type=int, metavar='TRACKS', help='Specify the most targets tracked at once, 0 tracks a single target')
+    parser.add_argument('--full-frame', action='store_true', help='Disable region of interest tracking and search the whole frame every frame')
+    parser.add_argument('--encoding', '-e', default=TelemetryEncoding.JSON, choices=TelemetryEncoding.ALL, help='Specify the encoding of the TCP messages')
     parser.add_argument('--visual', '-v', action='store_true', help='Enable video output showing to screen')
     parser.add_argument('--stream', '-t', nargs=2, metavar=('IP', 'PORT'), help='Enable streaming to the specified IP address and port')
     parser.add_argument('--multicast', '-m', action='store_true', help='Enable multicast for steaming')
@@ -297,8 +375,7 @@ def main():
         if args.rate:
             PUBLISH_FREQUENCY_HZ = float(args.rate)
 
-        if args.visual:
-            displayEnabled = True
+        OUTPUT_LEVEL = args.output_level
             
         if args.stream:
             if args.stream != '':
@@ -308,7 +385,7 @@ def main():
                 
     # If a device was received, use it, else attempt to find a camera 
     if args.device:
-        camera_path = args.device
+        camera_path = args.device[0]
     else:
         camera_path = find_camera_path()
 
@@ -317,6 +394,10 @@ def main():
         print("Error: No camera path received or found. Exiting")
         sys.exit(1)
 
+    # Create the tracker used by process_frame
+    TRACKER = create_tracker(args.tracker, CameraModel(*args.fov), not args.full_frame, args.max_tracks, target_size_m=args.target_size,
+                             hsv_lower=args.target_hsv[:3], hsv_upper=args.target_hsv[3:])
+
     # Attempt to connect the camera
     camera = connect_camera(camera_path)
 
@@ -329,7 +410,8 @@ def main():
             sys.exit(2)
 
         # Run the server
-        run_server(camera, '0.0.0.0', int(DEFAULT_SERVER_PORT), args.save, out_file, args.visual)
+        run_server(camera, '0.0.0.0', int(DEFAULT_SERVER_PORT), args.save, out_file, args.visual, args.encoding,
+                   args.segment_secs, args.segment_mb, args.quota_mb)
 
     finally:
         # Clean up
@@ -5,17 +5,37 @@
 # @author          Chip Brommer
 #///////////////////////////////////////////////////////////////////////////////
 
-import datetime
-import json
 import argparse
+import functools
+import math
 import sys
 import cv2
 import select
 import platform
 import os
 import subprocess
+import time
+import numpy as np
 from modules.udp_client import UDPClient
-from modules.tcp_server import TCPServer
+from modules.tcp_server import TCPServer, OverflowPolicy
+from modules.frame_grabber import FrameGrabber
+from modules.frame_pool import FramePool
+from modules.pipeline import Pipeline, Stage, DropPolicy
+from modules.telemetry import TelemetryEncoder, TelemetryEncoding, TelemetryFlags, seconds_since_midnight
+from modules.rate_scheduler import RateScheduler, ScheduleMode
+from modules.pyramid import ImagePyramid
+from modules.kalman import ConstantVelocityKalman
+from modules.telemetry_publisher import TelemetryPublisher
+from modules.tracking_pool import TrackingPool
+from modules.video_recorder import VideoRecorder
+from modules.segmented_writer import SegmentedVideoWriter
+from modules.mjpeg import JPEG_DECODE_FLAGS, MjpegStreamer, decode_jpeg, decoded_size
+from modules.gst_streamer import GstStreamer, StreamEncoder, gst_available
+from modules.stream_controller import StreamController
+from modules.stream_sink import StreamSink
+from modules.control_state import ControlState
+from modules.command_protocol import CommandError, ErrorCode, Parameter
+from modules.tracker import CameraModel, ColorBlobTracker, RoiTracker, TRACKERS, create_tracker, find_tracker
 
 # Define the version number
 MAJOR_VERSION = 0
@@ -29,15 +49,20 @@ DEFAULT_UDP_CLIENT_PORT = 2468  # Default udp client port
 DEFAULT_TCP_SERVER_IP = "0.0.0.0"
 DEFAULT_TCP_SERVER_PORT = 3456  # Default tcp server port
 PUBLISH_FREQUENCY_HZ = 1        # Desired message rate from the TCP server
+TRACKER = None                  # Tracker behind process_frame, created in main
+TRACKER_FACTORY = None          # Picklable callable creating the detecting tracker of each tracking worker
 FRAME_WIDTH = 1280
 FRAME_HEIGHT = 960
 CAMERA_FPS = 60
-STREAM_SETUP = False
+STREAM_MAX_LEVEL = 3            # Deepest pyramid level the stream can be reconfigured to at runtime
+STATS_INTERVAL_SECS = 5         # Interval between capture statistics prints
+QUIT_COMMAND = 'quit'           # Sent by EO_Interface::Stop before it closes the connection
 
 # @brief - A function to handle connecting to the camera 
 # @param device - device location for the camera
+# @param passthrough - bool - Request MJPEG and keep the frames compressed instead of decoding them to BGR
 # @return - The connection to the camera
-def connect_camera(device: str):
+def connect_camera(device: str, passthrough: bool = False):
     try:
         # Detect if platform is windows, port will need to be an integer
         if platform.system() == "Windows":
@@ -49,6 +74,11 @@ def connect_camera(device: str):
         camera.set(cv2.CAP_PROP_FRAME_WIDTH, FRAME_WIDTH)
         camera.set(cv2.CAP_PROP_FRAME_HEIGHT, FRAME_HEIGHT)
         camera.set(cv2.CAP_PROP_FPS, CAMERA_FPS)
+
+        # Have the driver hand over the JPEG data as the camera sent it
+        if passthrough:
+            camera.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*'MJPG'))
+            camera.set(cv2.CAP_PROP_CONVERT_RGB, 0)
         return camera
     
     except Exception as e:
@@ -57,32 +87,315 @@ def connect_camera(device: str):
 
 # @brief - A function to handle processing of a frame for desired items
 # @param frame - video frame to be processed
-# @param save - Boolean for if the frame is being written to a file
-# @param file_out - file handle for writing out the video
-# @param display - flag to display video to monitor
 # @return azimuth, elevation, distance of the tracked item
-def process_frame(frame, save: bool, file_out, display: bool, stream: bool, udp_stream):
+def process_frame(frame):
     azimuth = float(0.0)
     elevation = float(0.0)
     distance = float(0.0)
  
-    # @TODO process frame for desired items and draw box. 
+    # Track the target if a tracker is configured
+    if TRACKER is not None:
+        azimuth, elevation, distance = TRACKER.track(frame)
 
-    # Display the frame if enabled
-    if display:
-        now = datetime.datetime.now()
-        cv2.imshow(f'MiniStrike Video Stream - {now}', frame)
-    
-    # Write the frame to the output video file if --save flag is provided
-    if save:
-        if file_out.isOpened():
-            file_out.write(frame)
-            
-    if stream:
-        udp_stream.write(frame)
+    return azimuth, elevation, distance
+
+# @brief - A function to handle the detections a tracking worker made in a frame
+# @param detections - list of Detection in full frame coordinates
+# @param frame - the video frame the detections are from
+# @return azimuth, elevation, distance of the tracked item
+def process_detections(detections, frame):
+    azimuth = float(0.0)
+    elevation = float(0.0)
+    distance = float(0.0)
+
+    # The detection ran in a worker, only the tracker state is updated here
+    if TRACKER is not None:
+        azimuth, elevation, distance = TRACKER.track_detections(detections, frame.shape[1], frame.shape[0])
 
     return azimuth, elevation, distance
 
+# @brief - Registers the runtime parameters served over the extended UDP commands. Setters
+#          validate and publish a new control state, the frame loop applies it on the next frame.
+# @param commands - CommandTable of the UDP client
+# @param control - SharedControlState of the UDP client
+# @param stream_controller - StreamController of the stream, None if the bitrate is not controlled
+# @param passthrough - bool - The stream carries the camera's JPEG data, its quality is fixed
+# @param tracking_workers - bool - Detection runs in worker processes, whose trackers cannot be tuned from here
+# @param recorder - VideoRecorder, None if not saving
+# @param get_frame_grabber - callable returning the FrameGrabber, None before it starts
+# @param predict - bool - A TelemetryPublisher sleeps until each publish deadline, so the rate cannot be 0
+# @return - None
+def register_parameters(commands, control, stream_controller, passthrough: bool, tracking_workers: bool,
+                        recorder, get_frame_grabber, predict: bool = False) -> None:
+    def require(valid, message):
+        if not valid:
+            raise CommandError(ErrorCode.INVALID_VALUE, message)
+
+    def set_publish_rate(rate_hz):
+        require(math.isfinite(rate_hz), "The publish rate must be finite")
+        if predict:
+            require(rate_hz > 0, "The predicted publish rate must be above 0")
+        require(rate_hz >= 0, "The publish rate cannot be negative")
+        control.update(publish_rate_hz=rate_hz)
+    commands.register(Parameter.PUBLISH_RATE, lambda: (control.get().publish_rate_hz,), set_publish_rate)
+
+    # Tracker settings only reach the tracker running in this process
+    if find_tracker(TRACKER, RoiTracker) is not None:
+        def set_roi(roi_scale, min_roi):
+            require(math.isfinite(roi_scale), "The ROI scale must be finite")
+            require(roi_scale > 0 and min_roi > 0, "The ROI scale and size must be positive")
+            control.update(roi=(roi_scale, min_roi))
+        commands.register(Parameter.ROI, lambda: control.get().roi, set_roi)
+    if find_tracker(TRACKER, ColorBlobTracker) is not None and not tracking_workers:
+        def set_hsv_range(*hsv):
+            # OpenCV hue runs 0 to 179, saturation and value 0 to 255
+            require(all(0 <= value <= limit for value, limit in zip(hsv, (179, 255, 255) * 2)),
+                    "The HSV bounds must be within H 0-179, S and V 0-255")
+            require(all(lower <= upper for lower, upper in zip(hsv[:3], hsv[3:])), "The lower HSV bound cannot exceed the upper")
+            control.update(hsv_range=hsv)
+        commands.register(Parameter.HSV_RANGE, lambda: control.get().hsv_range, set_hsv_range)
+
+        def set_min_area(min_area):
+            require(min_area > 0, "The minimum area must be positive")
+            control.update(min_area=min_area)
+        commands.register(Parameter.MIN_AREA, lambda: (control.get().min_area,), set_min_area)
+
+    if not passthrough:
+        def set_stream_quality(quality):
+            require(1 <= quality <= 100, "The stream quality must be 1 to 100")
+            control.update(stream_quality=quality)
+        commands.register(Parameter.STREAM_QUALITY, lambda: (control.get().stream_quality,), set_stream_quality)
+    if stream_controller is not None:
+        def set_stream_bitrate(ceiling_kbps):
+            require(ceiling_kbps > 0, "The stream bitrate ceiling must be positive")
+            control.update(stream_bitrate_kbps=ceiling_kbps)
+        commands.register(Parameter.STREAM_BITRATE, lambda: (control.get().stream_bitrate_kbps,), set_stream_bitrate)
+
+    def get_status():
+        frame_grabber = get_frame_grabber()
+        captured = frame_grabber.get_stats()['captured'] if frame_grabber is not None else 0
+        state = control.get()
+        return (captured, TRACKER is not None and TRACKER.found, state.stream_enabled,
+                recorder is not None and state.recording_enabled)
+    commands.register(Parameter.STATUS, get_status)
+
+# @brief - Seeds the control state with the configuration the run starts with
+# @param control - SharedControlState of the UDP client
+# @param stream - bool - Stream from the start, else streaming waits for the UDP command
+# @param stream_ip - str - IP to stream camera frame over
+# @param stream_port - int - Port to stream camera frame over
+# @param stream_level - int - Pyramid level streamed
+# @param stream_bitrate_kbps - int - Bitrate ceiling of the stream, 0 if not controlled
+# @param publish_rate_hz - float - Rate of the TCP messages
+# @return - the seeded ControlState
+def seed_control(control, stream: bool, stream_ip: str, stream_port: int, stream_level: int, stream_bitrate_kbps: int,
+                 publish_rate_hz: float) -> ControlState:
+    changes = {'stream_host': stream_ip or '', 'stream_port': int(stream_port or 0), 'stream_level': stream_level,
+               'stream_bitrate_kbps': stream_bitrate_kbps, 'publish_rate_hz': publish_rate_hz}
+    if stream:
+        changes['stream_enabled'] = True
+
+    roi_tracker = find_tracker(TRACKER, RoiTracker)
+    blob_tracker = find_tracker(TRACKER, ColorBlobTracker)
+    if roi_tracker is not None:
+        changes['roi'] = (roi_tracker.roi_scale, roi_tracker.min_roi)
+    if blob_tracker is not None:
+        changes['hsv_range'] = (*blob_tracker.hsv_lower.tolist(), *blob_tracker.hsv_upper.tolist())
+        changes['min_area'] = blob_tracker.min_area
+    return control.update(**changes)
+
+# @brief - Applies the controls that changed between two control states, on the frame loop
+# @param previous - ControlState applied so far
+# @param state - ControlState to apply
+# @param publish_scheduler - RateScheduler of the TCP messages
+# @param stream_sink - StreamSink of the stream
+# @param stream_controller - StreamController of the stream, None if the bitrate is not controlled
+# @return - None
+def apply_control(previous: ControlState, state: ControlState, publish_scheduler, stream_sink, stream_controller) -> None:
+    if state.stream_enabled != previous.stream_enabled:
+        stream_sink.set_enabled(state.stream_enabled)
+    if (state.stream_host, state.stream_port, state.stream_level) != (previous.stream_host, previous.stream_port, previous.stream_level):
+        stream_sink.configure(state.stream_host, state.stream_port, state.stream_level)
+    if state.stream_quality != previous.stream_quality:
+        stream_sink.set_quality(state.stream_quality)
+    if state.stream_bitrate_kbps != previous.stream_bitrate_kbps and stream_controller is not None:
+        stream_controller.set_ceiling(state.stream_bitrate_kbps)
+    if state.publish_rate_hz != previous.publish_rate_hz:
+        publish_scheduler.set_rate(state.publish_rate_hz)
+
+    # The track stage reads these attributes on its own thread, each is swapped in whole
+    roi_tracker = find_tracker(TRACKER, RoiTracker)
+    if roi_tracker is not None and state.roi != previous.roi:
+        roi_tracker.roi_scale, roi_tracker.min_roi = state.roi
+    blob_tracker = find_tracker(TRACKER, ColorBlobTracker)
+    if blob_tracker is not None and state.hsv_range != previous.hsv_range:
+        blob_tracker.hsv_lower, blob_tracker.hsv_upper = np.array(state.hsv_range[:3], np.uint8), np.array(state.hsv_range[3:], np.uint8)
+    if blob_tracker is not None and state.min_area != previous.min_area:
+        blob_tracker.min_area = state.min_area
+
+# @brief - Builds the preprocess -> track -> sinks pipeline fed by the capture thread. Each frame
+#          carries the control state the frame loop read for it, the stages act on that one.
+# @param tcp_server - the instance of the tcp server
+# @param save - bool - Flag to save the a frame to a file
+# @param recorder - VideoRecorder encoding the video file, None if not saving
+# @param display - bool - Flag to display video to monitor
+# @param stream_sink - StreamSink opening the stream writer on demand
+# @param queue_size - int - Queue size for every stage
+# @param drop_policy - str - DropPolicy applied by every stage when its queue is full
+# @param encoding - str - TelemetryEncoding for the TCP messages
+# @param schedulers - dict of the 'publish', 'record' and 'stream' RateSchedulers
+# @param record_level - int - Pyramid level written to the video file
+# @param publisher - TelemetryPublisher fed by the tracker, None to publish the raw result of each frame
+# @param tracking_pool - TrackingPool detecting in worker processes, None to track in the track stage
+# @param jpeg_scale - int - Scale passthrough frames are decoded at, 1 is full resolution
+# @param telemetry_log - TelemetryLog of the tracker output of every frame, None if not saving
+# @param stream_controller - StreamController holding the stream under its bitrate ceiling, None to stream as configured
+# @return - the pipeline and its input stage
+def build_pipeline(tcp_server, save: bool, recorder, display: bool, stream_sink, 
+                   queue_size: int, drop_policy: str, encoding: str, schedulers, record_level: int = 0,
+                   publisher = None, tracking_pool = None, jpeg_scale: int = 1, telemetry_log = None, stream_controller = None):
+    # Create the encoder for the telemetry messages
+    encoder = TelemetryEncoder(encoding)
+    publish_scheduler = schedulers['publish']
+    record_scheduler = schedulers['record']
+    stream_scheduler = schedulers['stream']
+    print(f"Configured to sending at {PUBLISH_FREQUENCY_HZ} Hz : {publish_scheduler.mode}")
+
+    def at_level(captured, level):
+        # Passthrough frames are recorded and streamed as the camera's JPEG data
+        if captured.jpeg is not None:
+            return captured.jpeg
+
+        # The pyramid only computes the levels that are asked for
+        if level == 0 or captured.pyramid is None:
+            return captured.image
+        return captured.pyramid.level(level)
+
+    def decode(captured):
+        # Decode at the scale the tracker needs, JPEG DCT scaling is cheaper than decoding and resizing
+        captured.image = decode_jpeg(captured.jpeg, jpeg_scale)
+        if captured.image is None:
+            print(f"Failed to decode camera frame {captured.seq}")
+            return False
+        return True
+
+    def preprocess(captured):
+        # Passthrough frames are decoded once tracking needs them, frames dropped before that never are
+        if captured.image is None:
+            return captured
+
+        # Start the pyramid of the image in the buffer's reusable pyramid
+        if captured.buffer is not None and captured.buffer.pyramid is not None:
+            captured.pyramid = captured.buffer.pyramid.set_frame(captured.image)
+        return captured
+
+    def track(captured):
+        if captured.image is None and TRACKER is not None and not decode(captured):
+            return None
+        captured.result = process_frame(captured.pyramid if captured.pyramid is not None else captured.image)
+        return tracked(captured)
+
+    def track_detections(captured, detections):
+        # Results of the tracking workers arrive here in frame order and go on to the sinks
+        captured.result = process_detections(detections, captured.image)
+        captured = tracked(captured)
+        for stage in track_stage.outputs:
+            stage.put(captured)
+
+    def submit(captured):
+        if captured.image is None and not decode(captured):
+            return None
+        return tracking_pool.submit(captured)
+
+    def tracked(captured):
+        captured.found = TRACKER is not None and TRACKER.found
+        captured.tracks = TRACKER.get_tracks() if TRACKER is not None else ()
+
+        # Log every tracked frame next to the recording, frames reach here in order from one thread
+        if telemetry_log is not None:
+            telemetry_log.append(captured.seq, captured.capture_ns, captured.result, captured.found, len(captured.tracks),
+                                 captured.driver_ms)
+
+        # The publisher sends its own estimate on the publish deadlines
+        if publisher is not None:
+            publisher.add_measurement(captured)
+        return captured
+
+    def show(captured):
+        # Display the frame if enabled
+        if display or captured.control.display_enabled:
+            if captured.image is None and not decode(captured):
+                return
+            cv2.imshow('MiniStrike Video Stream', captured.image)
+            cv2.waitKey(1)
+
+    def record(captured):
+        # Queue the frame for the recorder thread, decimated to the recording rate
+        if recorder is not None and record_scheduler.should_fire(captured.capture_ns):
+            recorder.write(at_level(captured, record_level), captured.seq, captured.capture_ns)
+
+    def send_stream(captured):
+        # Stream the frame, decimated to the stream rate. The stage only gets frames while streaming is enabled.
+        if stream_scheduler.should_fire(captured.capture_ns):
+            # The controller decimates further
+            if stream_controller is not None and not stream_controller.should_send():
+                return
+            stream_sink.write(functools.partial(write_stream, captured))
+
+    def write_stream(captured, udp_stream, level, quality):
+        streams_owned = isinstance(udp_stream, GstStreamer)
+        if stream_controller is not None:
+            # The controller picks the quality, up to the configured one, and how far below the configured level to stream
+            if streams_owned:
+                stream_controller.report_send_queue(udp_stream.send_queue_bytes())
+            stream_controller.update()
+            controlled_quality, downscale, _ = stream_controller.get_operating_point()
+            quality = min(quality, controlled_quality)
+            level += downscale
+        if streams_owned:
+            udp_stream.set_quality(quality)
+
+        frame = at_level(captured, level)
+        if streams_owned:
+            # Timestamped from the capture time
+            udp_stream.write(frame, captured.capture_ns)
+        else:
+            udp_stream.write(frame)
+
+            # Passthrough frames go out as they are, their size is the encoded size
+            if stream_controller is not None and captured.jpeg is not None:
+                stream_controller.add_frame(frame.nbytes)
+
+    def publish(captured):
+        # If its time to send another update mesage, send it
+        if publish_scheduler.should_fire(None, captured.result, captured.seq):
+            azimuth, elevation, distance = captured.result
+
+            # Encode the telemetry in the negotiated format and send it over the socket
+            flags = TelemetryFlags.TRACKING if captured.found else 0
+            tcp_server.send_message(encoder.encode(seconds_since_midnight(), azimuth, elevation, distance, captured.seq,
+                                                   captured.capture_ns, captured.driver_ms, flags=flags, tracks=captured.tracks))
+
+    # Each stage runs on its own worker with a bounded queue, the tracker fans out to the sinks
+    pipeline = Pipeline()
+    preprocess_stage = pipeline.add(Stage('preprocess', preprocess, queue_size, drop_policy))
+    if tracking_pool is None:
+        track_stage = preprocess_stage.connect(pipeline.add(Stage('track', track, queue_size, drop_policy)))
+    else:
+        # The track stage only hands frames to the workers, the pool drains before the sinks stop
+        track_stage = preprocess_stage.connect(pipeline.add(Stage('track', submit, queue_size, drop_policy)))
+        tracking_pool.on_result = track_detections
+        pipeline.add(tracking_pool)
+    if publisher is None:
+        track_stage.connect(pipeline.add(Stage('publish', publish, queue_size, drop_policy)))
+    track_stage.connect(pipeline.add(Stage('display', show, queue_size, drop_policy)))
+    track_stage.connect(pipeline.add(Stage('stream', send_stream, queue_size, drop_policy, lambda captured: captured.control.stream_enabled)))
+    if save:
+        track_stage.connect(pipeline.add(Stage('record', record, queue_size, drop_policy,
+                                                    lambda captured: captured.control.recording_enabled)))
+
+    return pipeline, preprocess_stage
+
 # @brief - A function to handle running of the TCP server 
 # @param camera - the connection to the camera
 # @param udp_client - the instance of the udp client
@@ -93,69 +406,194 @@ def process_frame(frame, save: bool, file_out, display: bool, stream: bool, udp_
 # @param stream_ip - str - IP to stream camera frame over
 # @param stream_port - int - Port to stream camera frame over
 # @param out_file - the filename/location to write video. 
-def run_loop(camera, udp_client, tcp_server, save: bool, display: bool, stream: bool, stream_ip: str, stream_port: int, out_file = None):
-    # Access the global variable for stream being setup
-    global STREAM_SETUP
-
-    # Define the codec and create a VideoWriter object if --save flag is provided
+# @param queue_size - int - Queue size for every pipeline stage
+# @param drop_policy - str - DropPolicy applied by the pipeline stages
+# @param encoding - str - TelemetryEncoding for the TCP messages
+# @param schedulers - dict of the 'publish', 'record' and 'stream' RateSchedulers, None for the defaults
+# @param record_level - int - Pyramid level written to the video file, 0 is full resolution
+# @param stream_level - int - Pyramid level streamed, 0 is full resolution
+# @param predict - bool - Publish a Kalman estimate predicted to each publish deadline instead of the raw result per frame
+# @param workers - int - Number of tracking worker processes, 0 tracks in the pipeline
+# @param segment_secs - float - Capture time per recording segment, 0 for no limit
+# @param segment_mb - float - Size of a recording segment in MB, 0 for no limit
+# @param quota_mb - float - Total size of the recording segments in MB, the oldest are deleted, 0 for no limit
+# @param passthrough - bool - The camera delivers MJPEG that is recorded and streamed without decoding
+# @param jpeg_scale - int - Scale passthrough frames are decoded at for the tracker, 1, 2, 4 or 8
+# @param multicast - bool - The stream IP is a multicast group
+# @param multicast_iface - str - Interface the multicast stream is sent on, None for the default
+# @param stream_encoder - str - StreamEncoder used by the GStreamer stream
+# @param stream_bitrate_kbps - int - Bitrate ceiling the stream adapts to, 0 streams at the configured level and quality
+# @param stream_rtcp_port - int - Port receiving RTCP receiver reports for the stream controller, 0 for none
+def run_loop(camera, udp_client, tcp_server, save: bool, display: bool, stream: bool, stream_ip: str, stream_port: int, out_file = None,
+             queue_size: int = Stage.DEFAULT_QUEUE_SIZE, drop_policy: str = DropPolicy.DROP_OLDEST, encoding: str = TelemetryEncoding.JSON,
+             schedulers = None, record_level: int = 0, stream_level: int = 0, predict: bool = False,
+             workers: int = 0, segment_secs: float = 0, segment_mb: float = 0, quota_mb: float = 0,
+             passthrough: bool = False, jpeg_scale: int = 1, multicast: bool = False, multicast_iface: str = None,
+             stream_encoder: str = StreamEncoder.AUTO, stream_bitrate_kbps: int = 0, stream_rtcp_port: int = 0):
+    # Publish at the configured rate and record/stream every frame unless told otherwise
+    if schedulers is None:
+        schedulers = {'publish': RateScheduler(PUBLISH_FREQUENCY_HZ), 'record': RateScheduler(0), 'stream': RateScheduler(0)}
+
+    # Size everything from the probed camera size, falling back to the requested size
+    frame_width = int(camera.get(cv2.CAP_PROP_FRAME_WIDTH)) or FRAME_WIDTH
+    frame_height = int(camera.get(cv2.CAP_PROP_FRAME_HEIGHT)) or FRAME_HEIGHT
+
+    # Passthrough frames only reach the tracker and display decoded at the JPEG scale
+    if passthrough:
+        frame_width, frame_height = decoded_size(frame_width, frame_height, jpeg_scale)
+
+    # Every consumer picks its level from one pyramid per frame, sized for the deepest level needed
+    tracker_levels = TRACKER.pyramid_levels if TRACKER is not None else 1
+    # The stream can be moved to any level up to STREAM_MAX_LEVEL at runtime, levels cost nothing until they are used
+    stream_max_level = max(stream_level, STREAM_MAX_LEVEL)
+    adaptive_levels = StreamController.DEFAULT_LEVELS if stream_bitrate_kbps > 0 and not passthrough else 0
+    pyramid_levels = max(record_level + 1, stream_max_level + 1 + adaptive_levels, tracker_levels)
+    level_sizes = ImagePyramid(frame_width, frame_height, pyramid_levels)
+
+    # Define the codec and start the recorder thread if --save flag is provided, encoding stays off the pipeline
+    recorder = None
+    telemetry_log = None
     if save:
         fourcc = cv2.VideoWriter_fourcc(*'XVID')
-        file_out = cv2.VideoWriter(out_file, fourcc, CAMERA_FPS, (FRAME_WIDTH,FRAME_HEIGHT))
-        print(f"Writing video to {out_file}")
-    else:
-        file_out = ""    
+        record_fps = schedulers['record'].rate_hz if schedulers['record'].rate_hz > 0 else CAMERA_FPS
+        # The tracker output of every frame goes to a sidecar of each segment, joined with the video on the frame sequence
+        file_out = SegmentedVideoWriter(out_file, fourcc, record_fps, level_sizes.size(record_level), segment_secs, segment_mb, quota_mb,
+                                        passthrough, telemetry=True)
+        if file_out.is_opened():
+            # The JPEG data of each passthrough frame is its own array, the recorder can keep it without a copy
+            recorder = VideoRecorder(file_out, VideoRecorder.DEFAULT_QUEUE_SIZE, drop_policy, not passthrough)
+            recorder.start()
+            print(f"Writing video to {out_file}")
+            telemetry_log = file_out.telemetry_log
+            print(f"Writing telemetry to {telemetry_log.path}")
+        else:
+            file_out.release()
+            print(f"Failed to open video file {out_file}")
+
+    frame_grabber = None
+    pipeline = None
+    publisher = None
+    tracking_pool = None
+    stream_sink = None
+    stream_controller = None
+
+    # @brief - Opens the stream writer, called by the stream sink the first time a frame is streamed
+    # @param host - address to stream to
+    # @param port - port to stream to
+    # @param level - pyramid level streamed
+    # @return - the stream writer
+    def open_streamer(host, port, level):
+        if passthrough:
+            # Packetize the camera's JPEG data as it is
+            return MjpegStreamer(host, port, multicast, multicast_iface)
+
+        stream_width, stream_height = level_sizes.size(level)
+        if gst_available():
+            # Push the frames straight into a GStreamer pipeline, timestamped from their capture time
+            return GstStreamer(host, port, stream_width, stream_height, CAMERA_FPS, multicast, multicast_iface, stream_encoder,
+                               on_encoded=stream_controller.add_frame if stream_controller is not None else None)
+
+        # Set up the Streamer through OpenCV when the GStreamer bindings are missing
+        command = f"appsrc ! videoconvert ! video/x-raw,format=YUY2 ! jpegenc ! rtpjpegpay ! udpsink host={host} port={port}"
+        if multicast:
+            command += " auto-multicast=true" + (f" multicast-iface={multicast_iface}" if multicast_iface else "")
+        print(f"Starting stream: sending -> {command}")
+        return cv2.VideoWriter(command, 0, CAMERA_FPS, (stream_width, stream_height), True)
         
     try:
-        if stream and not STREAM_SETUP: 
-            # Set up the Streamer
-            command = f"appsrc ! videoconvert ! video/jped,format=YUY2 ! jpegenc ! rtpjpegpay ! udpsink host={stream_ip} port={stream_port}"
-            print(f"Starting stream: sending -> {command}")
-            udp_stream = cv2.VideoWriter(command, 0, CAMERA_FPS, (FRAME_WIDTH,FRAME_HEIGHT), True)
-            STREAM_SETUP = True
-        else:
-            udp_stream = None
-
-        # Calculate the time interval between messages
-        time_interval = 1.0 / PUBLISH_FREQUENCY_HZ
-        print(f"Configured to sending at {time_interval} seconds : {PUBLISH_FREQUENCY_HZ} Hz")
-        lastSend = datetime.datetime.now()
-           
-        # While loop to execute while we have a connection
-        while camera.isOpened():
-            # Read a new frame - break if we failed to read
-            good_read, frame = camera.read()
-            if not good_read:
-                print("Failed to read camera frame")
+        # Adapt the stream to its bitrate ceiling, passthrough JPEG can only be decimated
+        if stream_bitrate_kbps > 0 and (passthrough or gst_available()):
+            stream_controller = StreamController(stream_bitrate_kbps, adaptive_levels, not passthrough, stream_rtcp_port)
+            udp_client.set_stream_controller(stream_controller)
+        elif stream_bitrate_kbps > 0:
+            print("The stream bitrate ceiling needs the GStreamer Python bindings, streaming without it")
+
+        # The UDP commands publish control states that the frame loop applies from this one on
+        control = udp_client.control
+        applied = seed_control(control, stream, stream_ip, stream_port, stream_level, stream_bitrate_kbps,
+                               schedulers['publish'].rate_hz)
+
+        # The stream is opened when it is first enabled, by --stream or the UDP command, and released when disabled
+        stream_sink = StreamSink(open_streamer, applied.stream_host, applied.stream_port, applied.stream_level, stream_max_level,
+                                 applied.stream_enabled, applied.stream_quality)
+        udp_client.set_max_stream_level(stream_max_level)
+
+        # Serve the runtime parameters over the extended UDP commands
+        register_parameters(udp_client.commands, control, stream_controller, passthrough, workers > 0, recorder,
+                            lambda: frame_grabber, predict)
+
+        # Preallocate the capture buffers, each with its own pyramid. Passthrough frames are not decoded into them.
+        frame_pool = None if passthrough else FramePool(frame_width, frame_height, pyramid_levels=pyramid_levels)
+        last_stats_time = time.monotonic()
+
+        # Publish on the deadlines from the state estimate rather than once per processed frame
+        if predict:
+            publisher = TelemetryPublisher(schedulers['publish'], ConstantVelocityKalman(), TelemetryEncoder(encoding),
+                                           tcp_server.send_message)
+
+        # Detect in worker processes fed through shared memory, sized for the preprocessed frames
+        if workers > 0 and TRACKER is not None:
+            tracking_pool = TrackingPool(workers, (frame_height, frame_width, 3), TRACKER_FACTORY)
+
+        # Start the processing stages before the capture thread starts feeding them
+        pipeline, pipeline_input = build_pipeline(tcp_server, save, recorder, display, stream_sink,
+                                                  queue_size, drop_policy, encoding, schedulers, record_level,
+                                                  publisher, tracking_pool, jpeg_scale, telemetry_log, stream_controller)
+        pipeline.start()
+        if publisher is not None:
+            publisher.start()
+
+        # Start the capture thread so the driver queue is drained independently of the pipeline
+        frame_grabber = FrameGrabber(camera, frame_pool, passthrough)
+        frame_grabber.start()
+
+        # While loop to execute while the capture thread is running
+        while frame_grabber.is_running():
+            # Take the newest captured frame - older unread frames are dropped by the grabber
+            captured = frame_grabber.read()
+            if captured is None:
+                if not frame_grabber.is_running():
+                    print("Failed to read camera frame")
+                    break
+                continue
+
+            # Read the control state once per frame, it is only looked into when a command changed it
+            state = control.get()
+            if state.generation != applied.generation:
+                apply_control(applied, state, schedulers['publish'], stream_sink, stream_controller)
+                applied = state
+            captured.control = state
+
+            # Hand the frame to the pipeline, each stage keeps its own reference to the buffer
+            pipeline_input.put(captured)
+            captured.release()
+
+            # Periodically report capture, pool and per-stage statistics
+            if time.monotonic() - last_stats_time >= STATS_INTERVAL_SECS:
+                last_stats_time = time.monotonic()
+                print(f"Capture stats: {frame_grabber.get_stats()} pool {frame_pool.get_stats() if frame_pool is not None else None}")
+                for name, stats in pipeline.get_stats().items():
+                    print(f"\tStage {name}: {stats}")
+                for stats in tcp_server.get_client_stats():
+                    print(f"\tTCP client: {stats}")
+                for name, scheduler in schedulers.items():
+                    print(f"\tSchedule {name}: {scheduler.get_stats()}")
+                if TRACKER is not None:
+                    print(f"\tTracker: {TRACKER.get_stats()}")
+                if publisher is not None:
+                    print(f"\tPublisher: {publisher.get_stats()}")
+                if recorder is not None:
+                    print(f"\tRecorder: {recorder.get_stats()}")
+                if telemetry_log is not None:
+                    print(f"\tTelemetry log: {telemetry_log.get_stats()}")
+                print(f"\tStream: {stream_sink.get_stats()}")
+                if stream_controller is not None:
+                    print(f"\tStream control: {stream_controller.get_stats()}")
+
+            # Exit if MiniStrike asks to stop, so the recording is finalized
+            if QUIT_COMMAND in tcp_server.receive_message():
+                print("Quit received")
                 break
-
-            # Send resized frame for image processing and receive an azimuth, elevation, and distance
-            azimuth, elevation, distance = process_frame(frame, save, file_out, (display or udp_client.is_display_enabled()), 
-                                                         (stream or udp_client.is_stream_enabled()), udp_stream)
-
-            # Get the current timestamp of the day
-            now = datetime.datetime.now()
-
-            # If its time to send another update mesage, send it
-            if (now - lastSend).total_seconds() >= time_interval:
-                lastSend = now
-                midnight = datetime.datetime.combine(now.date(), datetime.time())
-
-                # Get the microseconds and then convert to seconds so we have msec precision. 
-                microseconds = (now - midnight).microseconds 
-                seconds = (now - midnight).seconds + microseconds / 1_000_000  
-
-                data = {
-                    'timestamp': seconds,           # timestamp of message sending
-                    'azimuth': azimuth,             # Azimuth of the tracked item 
-                    'elevation': elevation,         # Elevation of the tracked item 
-                    'distance': distance            # Disatnce of the tracked item
-                }
-
-                # Convert data to JSON format
-                json_data = json.dumps(data)
-
-                # Send JSON data over the socket
-                tcp_server.send_message(json_data.encode('utf-8'))
         
             # Check if user wants to quit
             if sys.stdin in select.select([sys.stdin], [], [], 0)[0]:
@@ -171,9 +609,43 @@ def run_loop(camera, udp_client, tcp_server, save: bool, display: bool, stream:
         print(f"An error occurred: {e}")
 
     finally:       
-        # if we were saving to file, release the file 
-        if save:
-            file_out.release()
+        # Stop the capture thread and report how many frames it had to drop
+        if frame_grabber is not None:
+            frame_grabber.stop()
+            frame_grabber.join()
+            print(f"Capture stats: {frame_grabber.get_stats()}")
+
+        # Let the stages drain what was already captured before releasing the sinks
+        if pipeline is not None:
+            pipeline.stop()
+            for name, stats in pipeline.get_stats().items():
+                print(f"\tStage {name}: {stats}")
+
+        # Write out the last logged frames once the stages stopped
+        if telemetry_log is not None:
+            telemetry_log.close()
+            print(f"\tTelemetry log: {telemetry_log.get_stats()}")
+
+        # Close the stream once the stages stopped writing to it
+        if stream_sink is not None:
+            stream_sink.close()
+            print(f"\tStream: {stream_sink.get_stats()}")
+
+        if stream_controller is not None:
+            udp_client.set_stream_controller(None)
+            stream_controller.close()
+            print(f"\tStream control: {stream_controller.get_stats()}")
+
+        # Stop publishing once nothing new can reach the estimator
+        if publisher is not None:
+            publisher.stop()
+            publisher.join()
+            print(f"\tPublisher: {publisher.get_stats()}")
+
+        # if we were saving to file, encode what is queued and finalize the file
+        if recorder is not None:
+            recorder.close()
+            print(f"\tRecorder: {recorder.get_stats()}")
 
 # @brief - Prints out the received args
 # @param args - list of program received arguments
@@ -200,7 +672,7 @@ def print_arguments(args) -> None:
             print(f"\tStream: {args.stream}")
 
             if args.multicast:
-                print("\tMulticast Enabled")
+                print(f"\tMulticast Enabled{f' on {args.multicast_iface}' if args.multicast_iface else ''}")
 
     print("\n")
    
@@ -267,6 +739,8 @@ def main():
     global DEFAULT_TCP_SERVER_PORT
     global DEFAULT_UDP_CLIENT_IP
     global DEFAULT_UDP_CLIENT_PORT
+    global TRACKER
+    global TRACKER_FACTORY
     
     # Stream items
     stream_enabled = False
@@ -289,12 +763,47 @@ def main():
     parser.add_argument('--device', '-d',nargs=1, metavar='DEVICE_PATH', help='Specify the device location for the camera connection')
     parser.add_argument('--save', '-f', nargs=1, metavar='OUTPUT_FILE', help='Specify the output file for saving data')
     parser.add_argument('--rate', '-r', default=1, type=int, metavar='RATE_HZ', help='Specify the TCP message rate in Hz')
+    parser.add_argument('--tracker', default='blob', choices=['none', *TRACKERS], help='Specify the tracker that finds the target in each frame')
+    parser.add_argument('--fov', nargs=2, type=float, default=[CameraModel.DEFAULT_HFOV_DEG, CameraModel.DEFAULT_VFOV_DEG], metavar=('H_DEG', 'V_DEG'), help='Specify the horizontal and vertical field of view of the camera')
+    parser.add_argument('--target-size', default=0.0, type=float, metavar='METERS', help='Specify the size of the target used to estimate distance, 0 disables it')
+    parser.add_argument('--target-hsv', nargs=6, type=int, default=[*ColorBlobTracker.DEFAULT_HSV_LOWER, *ColorBlobTracker.DEFAULT_HSV_UPPER], metavar=('H_LOW', 'S_LOW', 'V_LOW', 'H_HIGH', 'S_HIGH', 'V_HIGH'), help='Specify the HSV color range of the target for the blob tracker')
+    parser.add_argument('--max-tracks', default=0, type=int, metavar='TRACKS', help='Specify the most targets tracked at once, 0 tracks a single target')
+    parser.add_argument('--full-frame', action='store_true', help='Disable region of interest tracking and search the whole frame every frame')
+    parser.add_argument('--workers', default=0, type=int, metavar='PROCESSES', help='Specify the tracking worker processes, 0 tracks in the pipeline, workers search the whole frame')
+    parser.add_argument('--publish-mode', default=ScheduleMode.FIXED_RATE, choices=ScheduleMode.ALL, help='Specify when TCP messages are sent, the rate is a ceiling for the event modes')
+    parser.add_argument('--predict', action='store_true', help='Publish a Kalman filtered estimate predicted to each publish deadline, needs the fixed publish mode')
+    parser.add_argument('--change-threshold', default=0.0, type=float, metavar='VALUE', help='Specify the smallest change that is published in change mode')
+    parser.add_argument('--record-rate', default=0, type=float, metavar='RATE_HZ', help='Specify the recording frame rate, 0 records every frame')
+    parser.add_argument('--stream-rate', default=0, type=float, metavar='RATE_HZ', help='Specify the streaming frame rate, 0 streams every frame')
+    parser.add_argument('--segment-secs', default=0, type=float, metavar='SECS', help='Specify the capture time per recording segment, 0 for no limit')
+    parser.add_argument('--segment-mb', default=0, type=float, metavar='MB', help='Specify the size of a recording segment, 0 for no limit')
+    parser.add_argument('--quota-mb', default=0, type=float, metavar='MB', help='Specify the disk quota of the recording segments, the oldest are deleted, 0 for no limit')
+    parser.add_argument('--record-level', default=0, type=int, metavar='LEVEL', help='Specify the pyramid level recorded, each level halves the resolution')
+    parser.add_argument('--stream-level', default=0, type=int, metavar='LEVEL', help='Specify the pyramid level streamed, each level halves the resolution')
+    parser.add_argument('--batch-count', default=1, type=int, metavar='MESSAGES', help='Specify the TCP messages to batch per client send, 1 disables batching')
+    parser.add_argument('--batch-window-us', default=0, type=int, metavar='USEC', help='Specify the longest time a TCP message waits for its batch')
+    parser.add_argument('--encoding', '-e', default=TelemetryEncoding.JSON, choices=TelemetryEncoding.ALL, help='Specify the encoding of the TCP messages')
+    parser.add_argument('--mjpeg-passthrough', action='store_true', help='Capture MJPEG and record/stream the JPEG data without decoding, only the tracker decodes')
+    parser.add_argument('--jpeg-scale', default=1, type=int, choices=list(JPEG_DECODE_FLAGS), help='Specify the reduction the tracker decodes passthrough frames at')
     parser.add_argument('--visual', '-v', action='store_true', help='Enable video output showing to screen')
     parser.add_argument('--stream', '-s', nargs=2, metavar=('IP', 'PORT'), help='Enable streaming to the specified IP address and port')
     parser.add_argument('--multicast', '-m', action='store_true', help='Enable multicast for steaming')
+    parser.add_argument('--multicast-iface', metavar='INTERFACE', help='Specify the interface the multicast stream is sent on')
+    parser.add_argument('--stream-bitrate', default=0, type=int, metavar='KBPS', help='Specify the bitrate ceiling the stream adapts its quality, resolution and rate to, 0 disables it')
+    parser.add_argument('--stream-rtcp-port', default=0, type=int, metavar='PORT', help='Specify the port receiving RTCP receiver reports for the stream bitrate control')
+    parser.add_argument('--stream-encoder', default=StreamEncoder.AUTO, choices=StreamEncoder.ALL, help='Specify the JPEG encoder of the stream, auto prefers a hardware encoder')
+    parser.add_argument('--queue-size', '-q', default=Stage.DEFAULT_QUEUE_SIZE, type=int, metavar='FRAMES', help='Specify the queue size of each pipeline stage')
+    parser.add_argument('--drop-policy', '-p', default=DropPolicy.DROP_OLDEST, choices=DropPolicy.ALL, help='Specify what a pipeline stage does when its queue is full')
+    parser.add_argument('--client-queue', default=TCPServer.DEFAULT_MAX_QUEUE, type=int, metavar='MESSAGES', help='Specify the outbound queue size of each TCP client')
+    parser.add_argument('--slow-client-policy', default=OverflowPolicy.COALESCE, choices=OverflowPolicy.ALL, help='Specify what happens to a TCP client whose queue is full')
+    parser.add_argument('--disconnect-ms', default=TCPServer.DEFAULT_DISCONNECT_AFTER_MS, type=int, metavar='MSEC', help='Specify the backlog age that disconnects a slow TCP client')
 
     # Parse the command-line arguments
     args = parser.parse_args()
+
+    # Predictions are made for deadlines, the event driven modes have none
+    if args.predict and (args.publish_mode != ScheduleMode.FIXED_RATE or args.rate <= 0):
+        parser.error("--predict needs the fixed publish mode and a rate above 0")
     
     #  Print the arguments
     print_arguments(args)
@@ -302,7 +811,7 @@ def main():
     # Check if any arguments were received
     if any(arg != parser.get_default(key) for key, arg in vars(args).items()):
         if args.save:
-            out_file = args.save[0] + ".avi"  # Ensure the file extension is included
+            out_file = args.save[0] + (".mjpeg" if args.mjpeg_passthrough else ".avi")  # Ensure the file extension is included
 
         if args.rate:
             PUBLISH_FREQUENCY_HZ = float(args.rate)
@@ -315,7 +824,7 @@ def main():
                 
     # If a device was received, use it, else attempt to find a camera 
     if args.device:
-        camera_path = args.device
+        camera_path = args.device[0]
     else:
         camera_path = find_camera_device_path()
 
@@ -324,8 +833,13 @@ def main():
         print("Error: No camera path received or found. Exiting")
         sys.exit(1)
 
+    # Create the tracker used by process_frame, tracking workers create their own detector from the factory
+    TRACKER_FACTORY = functools.partial(create_tracker, args.tracker, CameraModel(*args.fov), target_size_m=args.target_size,
+                                        hsv_lower=args.target_hsv[:3], hsv_upper=args.target_hsv[3:])
+    TRACKER = TRACKER_FACTORY(not args.full_frame and args.workers == 0, args.max_tracks)
+
     # Attempt to connect the camera
-    camera = connect_camera(camera_path)
+    camera = connect_camera(camera_path, args.mjpeg_passthrough)
 
     try:
         # Check if the camera connection is open
@@ -340,11 +854,23 @@ def main():
         udp_client.start()
         
         # Start the TCP Server
-        tcp_server = TCPServer('0.0.0.0', int(DEFAULT_TCP_SERVER_PORT), None)
+        tcp_server = TCPServer('0.0.0.0', int(DEFAULT_TCP_SERVER_PORT), None, args.client_queue,
+                               args.slow_client_policy, args.disconnect_ms, args.batch_count, args.batch_window_us)
         tcp_server.start()
 
+        # Create the schedulers for publishing and for decimating the recording and stream
+        schedulers = {
+            'publish': RateScheduler(PUBLISH_FREQUENCY_HZ, args.publish_mode, args.change_threshold),
+            'record': RateScheduler(args.record_rate),
+            'stream': RateScheduler(args.stream_rate),
+        }
+
         # Run the main loop
-        run_loop(camera, udp_client, tcp_server, args.save, out_file, args.visual, stream_enabled, stream_ip, stream_port)
+        run_loop(camera, udp_client, tcp_server, args.save, args.visual, stream_enabled, stream_ip, stream_port, out_file,
+                 args.queue_size, args.drop_policy, args.encoding, schedulers, args.record_level, args.stream_level,
+                 args.predict, args.workers, args.segment_secs, args.segment_mb, args.quota_mb, args.mjpeg_passthrough,
+                 args.jpeg_scale, args.multicast, args.multicast_iface, args.stream_encoder, args.stream_bitrate,
+                 args.stream_rtcp_port)
 
     finally:
         # Clean up
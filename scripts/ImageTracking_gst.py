@@ -16,9 +16,9 @@ import os
 import subprocess
 from modules.udp_client import UDPClient
 from modules.tcp_server import TCPServer
-import gi
-gi.require_version('Gst', '1.0')
-from gi.repository import GObject, Gst
+from modules.tracker import CameraModel, ColorBlobTracker, TRACKERS, create_tracker
+from modules.gst_streamer import GstStreamer, StreamEncoder
+from modules.stream_sink import StreamSink
 import numpy as np
 
 # Define the version number
@@ -29,6 +29,7 @@ VERSION = f"{MAJOR_VERSION}.{MINOR_VERSION}.{BUILD_NUMBER}"
 DEFAULT_UDP_CLIENT_PORT = 2468  # Default udp client port
 DEFAULT_TCP_SERVER_PORT = 3456  # Default tcp server port
 PUBLISH_FREQUENCY_HZ = 1        # Desired message rate from the TCP server
+TRACKER = None                  # Tracker behind process_frame, created in main
 
 # @brief - A function to handle connecting to the camera 
 # @param device - device location for the camera
@@ -49,17 +50,19 @@ def connect_camera(device: str):
 # @param frame - video frame to be processed
 # @param save - Boolean for if the frame is being written to a file
 # @param file_out - file handle for writing out the video
-# @param display - flag to display video to monitor
+# @param display - flag to display video to monitor, from the command line or the UDP command
 # @return azimuth, elevation, distance of the tracked item
-def process_frame(frame, save: bool, file_out, display: bool, udp_client: UDPClient):
+def process_frame(frame, save: bool, file_out, display: bool):
     azimuth = float(0.0)
     elevation = float(0.0)
     distance = float(0.0)
  
-    # @TODO process frame for desired items and draw box. 
+    # Track the target if a tracker is configured
+    if TRACKER is not None:
+        azimuth, elevation, distance = TRACKER.track(frame)
 
     # Display the frame if enabled
-    if display | udp_client.is_display_enabled():
+    if display:
         cv2.imshow('MiniStrike Video Stream', frame)
     
     # Write the frame to the output video file if --save flag is provided
@@ -76,7 +79,14 @@ def process_frame(frame, save: bool, file_out, display: bool, udp_client: UDPCli
 # @param save - the program args.save 
 # @param out_file - the filename/location to write video. 
 # @param display - flag to display video to monitor
-def run_loop(camera, udp_client, tcp_server, save = False, out_file = None, display = False):
+# @param stream - flag to stream the resized frames over RTP
+# @param stream_ip - IP or multicast group to stream to
+# @param stream_port - port to stream to
+# @param multicast - flag for streaming to a multicast group
+# @param multicast_iface - interface the multicast stream is sent on, None for the default
+# @param stream_encoder - StreamEncoder of the stream
+def run_loop(camera, udp_client, tcp_server, save = False, out_file = None, display = False, stream = False, stream_ip = "",
+             stream_port = 0, multicast = False, multicast_iface = None, stream_encoder = StreamEncoder.AUTO):
     # Get camera properties
     frame_width = int(camera.get(cv2.CAP_PROP_FRAME_WIDTH))
     frame_height = int(camera.get(cv2.CAP_PROP_FRAME_HEIGHT))
@@ -94,7 +104,20 @@ def run_loop(camera, udp_client, tcp_server, save = False, out_file = None, disp
     else:
         file_out = ""    
 
+    # Push the resized frames into a GStreamer stream pipeline, opened once streaming is enabled
+    def open_streamer(host, port, level):
+        return GstStreamer(host, port, resized_width, resized_height, fps or 30, multicast, multicast_iface, stream_encoder)
+
+    def write_stream(streamer, quality, frame):
+        streamer.set_quality(quality)
+        streamer.write(frame, time.monotonic_ns())
+
+    # The UDP commands publish control states that the frame loop applies from this one on
+    control = udp_client.control
+    applied = control.update(stream_enabled=True) if stream else control.get()
+    stream_sink = StreamSink(open_streamer, stream_ip, stream_port, 0, 0, applied.stream_enabled)
     try:
+
         # Calculate the time interval between messages
         time_interval = 1.0 / PUBLISH_FREQUENCY_HZ
         print(f"Configured to sending at {time_interval} seconds : {PUBLISH_FREQUENCY_HZ} Hz")
@@ -112,11 +135,26 @@ def run_loop(camera, udp_client, tcp_server, save = False, out_file = None, disp
                 print("Failed to read camera frame")
                 break
             
+            # Read the control state once per frame, it is only looked into when a command changed it
+            state = control.get()
+            if state.generation != applied.generation:
+                if state.stream_enabled != applied.stream_enabled:
+                    stream_sink.set_enabled(state.stream_enabled)
+                if (state.stream_host, state.stream_port) != (applied.stream_host, applied.stream_port):
+                    stream_sink.configure(state.stream_host, state.stream_port)
+                if state.stream_quality != applied.stream_quality:
+                    stream_sink.set_quality(state.stream_quality)
+                applied = state
+
              # Resize the frame
             resized_frame = cv2.resize(frame, (resized_width, resized_height))
 
             # Send resized frame for image processing and receive an azimuth, elevation, and distance
-            azimuth, elevation, distance = process_frame(resized_frame, save, file_out, display, udp_client)
+            azimuth, elevation, distance = process_frame(resized_frame, save, file_out, display or state.display_enabled)
+
+            # Stream the resized frame, timestamped with its read time
+            if state.stream_enabled:
+                stream_sink.write(lambda streamer, level, quality: write_stream(streamer, quality, resized_frame))
 
             # Get the current timestamp of the day
             now = datetime.datetime.now()
@@ -151,6 +189,9 @@ def run_loop(camera, udp_client, tcp_server, save = False, out_file = None, disp
         if save:
             file_out.release()
 
+        stream_sink.close()
+        print(f"Stream stats: {stream_sink.get_stats()}")
+
 # @brief - Prints out the received args
 def print_arguments(args):
     print("Received arguments:")
@@ -239,6 +280,7 @@ def find_camera_device_path():
 def main():
     # Declare PUBLISH_FREQUENCY_HZ as global
     global PUBLISH_FREQUENCY_HZ  
+    global TRACKER
     
     # Stream items
     stream_enabled = False
@@ -261,9 +303,16 @@ def main():
     parser.add_argument('--device', '-d',nargs=1, metavar='DEVICE_PATH', help='Specify the device location for the camera connection')
     parser.add_argument('--save', '-s', nargs=1, metavar='OUTPUT_FILE', help='Specify the output file for saving data')
     parser.add_argument('--rate', '-r', default=1, type=int, metavar='RATE_HZ', help='Specify the TCP message rate in Hz')
+    parser.add_argument('--tracker', default='blob', choices=['none', *TRACKERS], help='Specify the tracker that finds the target in each frame')
+    parser.add_argument('--fov', nargs=2, type=float, default=[CameraModel.DEFAULT_HFOV_DEG, CameraModel.DEFAULT_VFOV_DEG], metavar=('H_DEG', 'V_DEG'), help='Specify the horizontal and vertical field of view of the camera')
+    parser.add_argument('--target-size', default=0.0, type=float, metavar='METERS', help='Specify the size of the target used to estimate distance, 0 disables it')
+    parser.add_argument('--target-hsv', nargs=6, type=int, default=[*ColorBlobTracker.DEFAULT_HSV_LOWER, *ColorBlobTracker.DEFAULT_HSV_UPPER], metavar=('H_LOW', 'S_LOW', 'V_LOW', 'H_HIGH', 'S_HIGH', 'V_HIGH'), help='Specify the HSV color range of the target for the blob tracker')
+    parser.add_argument('--full-frame', action='store_true', help='Disable region of interest tracking and search the whole frame every frame')
     parser.add_argument('--visual', '-v', action='store_true', help='Enable video output showing to screen')
     parser.add_argument('--stream', '-t', nargs=2, metavar=('IP', 'PORT'), help='Enable streaming to the specified IP address and port')
     parser.add_argument('--multicast', '-m', action='store_true', help='Enable multicast for steaming')
+    parser.add_argument('--multicast-iface', metavar='INTERFACE', help='Specify the interface the multicast stream is sent on')
+    parser.add_argument('--stream-encoder', default=StreamEncoder.AUTO, choices=StreamEncoder.ALL, help='Specify the JPEG encoder of the stream, auto prefers a hardware encoder')
 
     # Parse the command-line arguments
     args = parser.parse_args()
@@ -296,6 +345,10 @@ def main():
         print("Error: No camera path received or found. Exiting")
         sys.exit(1)
 
+    # Create the tracker used by process_frame
+    TRACKER = create_tracker(args.tracker, CameraModel(*args.fov), not args.full_frame, target_size_m=args.target_size,
+                             hsv_lower=args.target_hsv[:3], hsv_upper=args.target_hsv[3:])
+
     # Attempt to connect the camera
     camera = connect_camera(camera_path)
 
@@ -316,7 +369,8 @@ def main():
         tcp_server.start()
 
         # Run the main loop
-        run_loop(camera, udp_client, tcp_server, args.save, out_file, args.visual)
+        run_loop(camera, udp_client, tcp_server, args.save, out_file, args.visual, stream_enabled, stream_ip, stream_port,
+                 args.multicast, args.multicast_iface, args.stream_encoder)
 
     finally:
         # Clean up
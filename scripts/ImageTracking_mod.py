@@ -16,6 +16,7 @@ import os
 import subprocess
 from modules.udp_client import UDPClient
 from modules.tcp_server import TCPServer
+from modules.tracker import CameraModel, ColorBlobTracker, TRACKERS, create_tracker
 
 # Define the version number
 MAJOR_VERSION = 0
@@ -25,6 +26,7 @@ VERSION = f"{MAJOR_VERSION}.{MINOR_VERSION}.{BUILD_NUMBER}"
 DEFAULT_UDP_CLIENT_PORT = 2468  # Default udp client port
 DEFAULT_TCP_SERVER_PORT = 3456  # Default tcp server port
 PUBLISH_FREQUENCY_HZ = 1        # Desired message rate from the TCP server
+TRACKER = None                  # Tracker behind process_frame, created in main
 
 # @brief - A function to handle connecting to the camera 
 # @param device - device location for the camera
@@ -52,7 +54,9 @@ def process_frame(frame, save: bool, file_out, display: bool, udp_client: UDPCli
     elevation = float(0.0)
     distance = float(0.0)
  
-    # @TODO process frame for desired items and draw box. 
+    # Track the target if a tracker is configured
+    if TRACKER is not None:
+        azimuth, elevation, distance = TRACKER.track(frame)
 
     # Display the frame if enabled
     if display | udp_client.is_display_enabled():
@@ -235,6 +239,7 @@ def find_camera_device_path():
 def main():
     # Declare PUBLISH_FREQUENCY_HZ as global
     global PUBLISH_FREQUENCY_HZ  
+    global TRACKER
     
     # Stream items
     stream_enabled = False
@@ -257,6 +262,11 @@ def main():
     parser.add_argument('--device', '-d',nargs=1, metavar='DEVICE_PATH', help='Specify the device location for the camera connection')
     parser.add_argument('--save', '-s', nargs=1, metavar='OUTPUT_FILE', help='Specify the output file for saving data')
     parser.add_argument('--rate', '-r', default=1, type=int, metavar='RATE_HZ', help='Specify the TCP message rate in Hz')
+    parser.add_argument('--tracker', default='blob', choices=['none', *TRACKERS], help='Specify the tracker that finds the target in each frame')
+    parser.add_argument('--fov', nargs=2, type=float, default=[CameraModel.DEFAULT_HFOV_DEG, CameraModel.DEFAULT_VFOV_DEG], metavar=('H_DEG', 'V_DEG'), help='Specify the horizontal and vertical field of view of the camera')
+    parser.add_argument('--target-size', default=0.0, type=float, metavar='METERS', help='Specify the size of the target used to estimate distance, 0 disables it')
+    parser.add_argument('--target-hsv', nargs=6, type=int, default=[*ColorBlobTracker.DEFAULT_HSV_LOWER, *ColorBlobTracker.DEFAULT_HSV_UPPER], metavar=('H_LOW', 'S_LOW', 'V_LOW', 'H_HIGH', 'S_HIGH', 'V_HIGH'), help='Specify the HSV color range of the target for the blob tracker')
+    parser.add_argument('--full-frame', action='store_true', help='Disable region of interest tracking and search the whole frame every frame')
     parser.add_argument('--visual', '-v', action='store_true', help='Enable video output showing to screen')
     parser.add_argument('--stream', '-t', nargs=2, metavar=('IP', 'PORT'), help='Enable streaming to the specified IP address and port')
     parser.add_argument('--multicast', '-m', action='store_true', help='Enable multicast for steaming')
@@ -292,6 +302,10 @@ def main():
         print("Error: No camera path received or found. Exiting")
         sys.exit(1)
 
+    # Create the tracker used by process_frame
+    TRACKER = create_tracker(args.tracker, CameraModel(*args.fov), not args.full_frame, target_size_m=args.target_size,
+                             hsv_lower=args.target_hsv[:3], hsv_upper=args.target_hsv[3:])
+
     # Attempt to connect the camera
     camera = connect_camera(camera_path)
 
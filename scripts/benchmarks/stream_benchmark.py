@@ -0,0 +1,61 @@
+#///////////////////////////////////////////////////////////////////////////////
+# @file            stream_benchmark.py
+# @brief           Streams synthetic frames through the GStreamer RTP sender to
+#                  a local receiver and reports push cost, latency and drops
+# @author          Chip Brommer
+#///////////////////////////////////////////////////////////////////////////////
+
+import argparse
+import os
+import sys
+import time
+import numpy as np
+
+# Make the script folder importable when run from anywhere
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.gst_streamer import GstStreamer, StreamEncoder, StreamReceiver, gst_available
+
+# Let the receiver deliver the frames still in flight
+SETTLE_SECS = 0.5
+
+# @brief - Main function for the benchmark
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the GStreamer RTP stream against a local receiver")
+    parser.add_argument('--frames', '-n', default=600, type=int, help='Specify the number of frames to stream')
+    parser.add_argument('--size', nargs=2, type=int, default=[640, 480], metavar=('WIDTH', 'HEIGHT'), help='Specify the frame size')
+    parser.add_argument('--fps', default=60, type=int, help='Specify the frame rate streamed at')
+    parser.add_argument('--port', default=5305, type=int, help='Specify the local port streamed to')
+    parser.add_argument('--encoder', default=StreamEncoder.AUTO, choices=StreamEncoder.ALL, help='Specify the JPEG encoder')
+    args = parser.parse_args()
+
+    if not gst_available():
+        print("The GStreamer Python bindings (gi) are not installed")
+        sys.exit(1)
+
+    width, height = args.size
+    receiver = StreamReceiver(args.port)
+    streamer = GstStreamer('127.0.0.1', args.port, width, height, args.fps, encoder=args.encoder)
+
+    # A few frames cycled like a buffer pool, with a moving bar so every JPEG differs
+    frames = [np.random.randint(0, 255, (height, width, 3), np.uint8) for _ in range(8)]
+    interval_ns = 1_000_000_000 // args.fps
+    start_ns = time.monotonic_ns()
+    for index in range(args.frames):
+        frame = frames[index % len(frames)]
+        frame[:, index % width] = 255
+        capture_ns = start_ns + index * interval_ns
+        time.sleep(max(0.0, (capture_ns - time.monotonic_ns()) / 1e9))
+        streamer.write(frame, capture_ns)
+
+    time.sleep(SETTLE_SECS)
+    streamer.release()
+    receiver.release()
+
+    stats = streamer.get_stats()
+    print(f"Streamer: {stats}")
+    print(f"Receiver: {receiver.get_stats()}")
+
+# @brief - Entry point - calls main function
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+#///////////////////////////////////////////////////////////////////////////////
+# @file            telemetry_encoding.py
+# @brief           Compares encode+decode cost and bytes on the wire of the
+#                  JSON and binary telemetry encodings
+# @author          Chip Brommer
+#///////////////////////////////////////////////////////////////////////////////
+
+import argparse
+import os
+import sys
+import timeit
+
+# Make the script folder importable when run from anywhere
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.framing import HEADER, encode_frame
+from modules.telemetry import TelemetryEncoder, TelemetryEncoding, decode_telemetry
+
+# Representative values for a tracked item
+SAMPLE = (45296.123456, -12.3456789, 3.21098765, 1523.75)
+
+# @brief - Times encode and decode of one encoding
+# @param encoding - the TelemetryEncoding to benchmark
+# @param iterations - number of messages to time
+# @return - encode usec, decode usec and bytes on the wire per message
+def benchmark(encoding: str, iterations: int):
+    encoder = TelemetryEncoder(encoding)
+    payload = encoder.encode(*SAMPLE)
+
+    encode_secs = timeit.timeit(lambda: encode_frame(encoder.encode(*SAMPLE)), number=iterations)
+    decode_secs = timeit.timeit(lambda: decode_telemetry(payload), number=iterations)
+
+    return (encode_secs / iterations * 1e6, decode_secs / iterations * 1e6, HEADER.size + len(payload))
+
+# @brief - Main function for the benchmark
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the telemetry encodings")
+    parser.add_argument('--iterations', '-n', default=200000, type=int, help='Specify the number of messages to time')
+    args = parser.parse_args()
+
+    print(f"{'encoding':<10}{'encode us':>12}{'decode us':>12}{'wire bytes':>12}")
+    for encoding in TelemetryEncoding.ALL:
+        encode_us, decode_us, wire_bytes = benchmark(encoding, args.iterations)
+        print(f"{encoding:<10}{encode_us:>12.3f}{decode_us:>12.3f}{wire_bytes:>12}")
+
+# @brief - Entry point - calls main function
+if __name__ == "__main__":
+    main()
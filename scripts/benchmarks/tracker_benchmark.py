@@ -0,0 +1,121 @@
+#///////////////////////////////////////////////////////////////////////////////
+# @file            tracker_benchmark.py
+# @brief           Measures the per-frame cost of the trackers behind
+#                  process_frame on synthetic frames with a moving target
+# @author          Chip Brommer
+#///////////////////////////////////////////////////////////////////////////////
+
+import argparse
+import math
+import os
+import sys
+import time
+import cv2
+import numpy as np
+
+# Make the script folder importable when run from anywhere
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.tracker import CameraModel, MultiTargetTracker, TRACKERS, create_tracker
+
+TARGET_COLOR = (0, 80, 255)     # BGR, inside the default blob tracker HSV range
+TARGET_RADIUS = 12
+HIDDEN_EVERY = 100              # The target is hidden for HIDDEN_FRAMES out of every HIDDEN_EVERY frames
+HIDDEN_FRAMES = 5
+
+# @brief - Creates frames with targets moving on circles over a noisy background,
+#          hidden now and then so reacquisition is exercised. A single target circles
+#          the whole frame, several targets each circle their own cell of a grid.
+# @param width, height - frame size
+# @param count - number of frames
+# @param targets - number of targets
+# @return - list of frames and list of arrays of the true target centers, None while hidden
+def make_frames(width: int, height: int, count: int, targets: int = 1):
+    rng = np.random.default_rng(0)
+    background = rng.integers(0, 90, (height, width, 3), dtype=np.uint8)
+    columns = math.ceil(math.sqrt(targets))
+    rows = math.ceil(targets / columns)
+    cell_width, cell_height = width / columns, height / rows
+    orbit = min(width / 3, height / 3) if targets == 1 else min(cell_width, cell_height) / 2 - TARGET_RADIUS - 2
+    frames = []
+    centers = []
+    for index in range(count):
+        frame = background.copy()
+        if index % HIDDEN_EVERY >= HIDDEN_FRAMES:
+            frame_centers = []
+            for target in range(targets):
+                angle = 2 * math.pi * index / count + target
+                center = (int((target % columns + 0.5) * cell_width + orbit * math.cos(angle)),
+                          int((target // columns + 0.5) * cell_height + orbit * math.sin(angle)))
+                cv2.circle(frame, center, TARGET_RADIUS, TARGET_COLOR, -1)
+                frame_centers.append(center)
+            centers.append(np.array(frame_centers, dtype=float))
+        else:
+            centers.append(None)
+        frames.append(frame)
+    return frames, centers
+
+# @brief - Times a tracker over the frames
+# @param tracker - the tracker to time
+# @param frames - frames to track
+# @param centers - true target centers for the accuracy check
+# @return - array of per-frame ms and the share of visible targets found within 2 pixels
+def benchmark(tracker, frames, centers):
+    times_ms = np.empty(len(frames))
+    found = 0
+    visible = 0
+    for index, (frame, frame_centers) in enumerate(zip(frames, centers)):
+        start_ns = time.perf_counter_ns()
+        detections = tracker.detect(frame)
+        times_ms[index] = (time.perf_counter_ns() - start_ns) / 1e6
+        if frame_centers is not None:
+            visible += len(frame_centers)
+            if detections:
+                detected = np.array([(detection.cx, detection.cy) for detection in detections])
+                distances = np.linalg.norm(frame_centers[:, None] - detected[None], axis=2)
+                found += int((distances.min(axis=1) <= 2).sum())
+    return times_ms, found / visible
+
+# @brief - Main function for the benchmark
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the trackers on synthetic frames")
+    parser.add_argument('--tracker', nargs='+', default=list(TRACKERS), choices=list(TRACKERS), help='Specify the trackers to time')
+    parser.add_argument('--size', nargs=2, default=[640, 480], type=int, metavar=('WIDTH', 'HEIGHT'), help='Specify the frame size')
+    parser.add_argument('--frames', '-n', default=500, type=int, help='Specify the number of frames to time')
+    parser.add_argument('--full-frame', action='store_true', help='Only time full frame tracking, not region of interest tracking')
+    parser.add_argument('--targets', default=1, type=int, help='Specify the number of targets, more than 1 also times multi-target tracking')
+    parser.add_argument('--budget-ms', default=1000 / 60, type=float, help='Specify the per-frame budget to check against')
+    args = parser.parse_args()
+
+    # Measure a single core like the tracking stage gets
+    cv2.setNumThreads(1)
+
+    frames, centers = make_frames(args.size[0], args.size[1], args.frames, args.targets)
+
+    print(f"{args.size[0]}x{args.size[1]}, {args.frames} frames, {args.targets} targets, budget {args.budget_ms:.2f} ms")
+    print(f"{'tracker':<10}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}{'found':>8}{'budget':>8}")
+    variants = [('', False, 0)]
+    if not args.full_frame:
+        variants.append(('+roi', True, 0))
+    if args.targets > 1:
+        variants.append(('+multi', False, max(args.targets, MultiTargetTracker.DEFAULT_MAX_TRACKS)))
+
+    variant_stats = {}
+    for name in args.tracker:
+        for suffix, roi, max_tracks in variants:
+            label = name + suffix
+            tracker = create_tracker(name, CameraModel(), roi, max_tracks)
+            times_ms, found = benchmark(tracker, frames, centers)
+            p50, p95 = np.percentile(times_ms, [50, 95])
+            verdict = 'ok' if p95 <= args.budget_ms else 'over'
+            print(f"{label:<10}{times_ms.mean():>10.3f}{p50:>10.3f}{p95:>10.3f}{times_ms.max():>10.3f}"
+                  f"{found:>8.0%}{verdict:>8}")
+            if suffix:
+                variant_stats[label] = tracker.get_stats()
+
+    for label, stats in variant_stats.items():
+        print(f"{label}: {stats}")
+
+# @brief - Entry point - calls main function
+if __name__ == "__main__":
+    main()
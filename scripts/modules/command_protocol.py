@@ -0,0 +1,242 @@
+import binascii
+import struct
+
+# Extended UDP command packets. The legacy commands start with SYNC_1, LEGACY_SYNC_2 and are
+# five bytes long, extended packets use their own second sync byte so both can share the port:
+#
+#   sync_1 u8 | sync_2 u8 | version u8 | type u8 | sequence u16 | parameter u8 | length u8 |
+#   payload [length] | crc u16
+#
+# Little endian. The CRC is CRC-16/CCITT-FALSE over everything before it. Every SET and GET
+# is answered to the sender with an ACK carrying the parameter's current value or a NACK
+# carrying an error code, both with the request's sequence number. Packets failing the length
+# or CRC check have no trustworthy sequence number and are dropped, the sender retries.
+SYNC_1 = 0xA5
+LEGACY_SYNC_2 = 0xE1
+SYNC_2 = 0xE2
+PROTOCOL_VERSION = 1
+HEADER = struct.Struct('<BBBBHBB')
+CRC = struct.Struct('<H')
+MAX_PAYLOAD = 255
+
+
+class MessageType:
+    SET = 0x01      # Set a parameter, answered with its new value
+    GET = 0x02      # Query a parameter
+    ACK = 0x80
+    NACK = 0x81
+
+
+class Parameter:
+    PUBLISH_RATE = 0x01     # f32 TCP message rate in Hz
+    ROI = 0x02              # f32 ROI side as a multiple of the target size, u16 smallest ROI side in pixels
+    HSV_RANGE = 0x03        # 6 x u8 inclusive HSV range of the blob tracker, lower then upper
+    MIN_AREA = 0x04         # u32 smallest blob in pixels
+    STREAM_QUALITY = 0x05   # u8 JPEG quality, the ceiling of the quality when the bitrate is controlled
+    STREAM_BITRATE = 0x06   # u32 stream bitrate ceiling in kbps
+    STREAM = 0x07           # u8 streaming on/off
+    DISPLAY = 0x08          # u8 display on/off
+    RECORDING = 0x09        # u8 recording on/off
+    STREAM_CONFIG = 0x0A    # 4 x u8 IPv4 address, u16 port, u8 pyramid level of the stream
+    STATUS = 0x20           # Read only: u32 frames processed, u8 tracking, u8 streaming, u8 recording
+
+
+# Payload layout of every parameter, compiled once
+PARAMETER_FORMATS = {
+    Parameter.PUBLISH_RATE: struct.Struct('<f'),
+    Parameter.ROI: struct.Struct('<fH'),
+    Parameter.HSV_RANGE: struct.Struct('<6B'),
+    Parameter.MIN_AREA: struct.Struct('<I'),
+    Parameter.STREAM_QUALITY: struct.Struct('<B'),
+    Parameter.STREAM_BITRATE: struct.Struct('<I'),
+    Parameter.STREAM: struct.Struct('<B'),
+    Parameter.DISPLAY: struct.Struct('<B'),
+    Parameter.RECORDING: struct.Struct('<B'),
+    Parameter.STREAM_CONFIG: struct.Struct('<4sHB'),
+    Parameter.STATUS: struct.Struct('<IBBB'),
+}
+READ_ONLY_PARAMETERS = frozenset((Parameter.STATUS,))
+
+
+class ErrorCode:
+    BAD_CRC = 0x01
+    BAD_VERSION = 0x02
+    BAD_TYPE = 0x03
+    UNKNOWN_PARAMETER = 0x04
+    BAD_LENGTH = 0x05
+    READ_ONLY = 0x06
+    INVALID_VALUE = 0x07
+    UNAVAILABLE = 0x08      # The parameter does not apply to this configuration, e.g. no tracker
+    INTERNAL_ERROR = 0x09   # The command failed in this process, the parameter may be unchanged
+
+
+NACK_PAYLOAD = struct.Struct('<B')     # ErrorCode
+
+
+class CommandError(Exception):
+    # @param code - ErrorCode sent back in the NACK
+    # @param message - text for the log
+    # @param sequence - sequence number of the request, None if the packet could not be trusted
+    def __init__(self, code, message, sequence=None):
+        super().__init__(message)
+        self.code = code
+        self.sequence = sequence
+
+
+class Command:
+    def __init__(self, message_type, sequence, parameter, values):
+        self.message_type = message_type
+        self.sequence = sequence
+        self.parameter = parameter
+        self.values = values        # Tuple of the decoded payload, empty for a GET
+
+
+# @brief - Computes the packet CRC
+# @param data - bytes covered by the CRC
+# @return - CRC-16/CCITT-FALSE
+def crc16(data) -> int:
+    return binascii.crc_hqx(data, 0xFFFF)
+
+
+# @brief - Checks if a datagram is an extended packet rather than a legacy command
+# @param data - the datagram
+def is_extended(data) -> bool:
+    return len(data) >= 2 and data[0] == SYNC_1 and data[1] == SYNC_2
+
+
+# @brief - Decodes an extended packet
+# @param data - the datagram
+# @return - the Command
+# @raises CommandError - with the request's sequence number, None if the packet could not be trusted
+def decode_command(data) -> Command:
+    if len(data) < HEADER.size + CRC.size:
+        raise CommandError(ErrorCode.BAD_LENGTH, f"Packet of {len(data)} bytes is too short")
+    _, _, version, message_type, sequence, parameter, length = HEADER.unpack_from(data)
+    if len(data) != HEADER.size + length + CRC.size:
+        raise CommandError(ErrorCode.BAD_LENGTH, f"Packet of {len(data)} bytes has a payload of {length}")
+    (crc,) = CRC.unpack_from(data, HEADER.size + length)
+    if crc != crc16(memoryview(data)[:HEADER.size + length]):
+        raise CommandError(ErrorCode.BAD_CRC, "CRC mismatch")
+    if version != PROTOCOL_VERSION:
+        raise CommandError(ErrorCode.BAD_VERSION, f"Unsupported protocol version {version}", sequence)
+
+    layout = PARAMETER_FORMATS.get(parameter)
+    if layout is None:
+        raise CommandError(ErrorCode.UNKNOWN_PARAMETER, f"Unknown parameter {parameter:#04x}", sequence)
+    if message_type == MessageType.GET:
+        return Command(message_type, sequence, parameter, ())
+    if message_type != MessageType.SET:
+        raise CommandError(ErrorCode.BAD_TYPE, f"Unexpected message type {message_type:#04x}", sequence)
+    if parameter in READ_ONLY_PARAMETERS:
+        raise CommandError(ErrorCode.READ_ONLY, f"Parameter {parameter:#04x} is read only", sequence)
+    if length != layout.size:
+        raise CommandError(ErrorCode.BAD_LENGTH, f"Parameter {parameter:#04x} takes {layout.size} bytes, got {length}", sequence)
+    return Command(message_type, sequence, parameter, layout.unpack_from(data, HEADER.size))
+
+
+# @brief - Encodes an extended packet
+# @param message_type - one of MessageType
+# @param sequence - sequence number, a reply carries the request's
+# @param parameter - one of Parameter
+# @param payload - bytes of the payload
+# @return - the packet
+def encode_packet(message_type, sequence, parameter, payload=b'') -> bytes:
+    if len(payload) > MAX_PAYLOAD:
+        raise ValueError(f"Payload of {len(payload)} bytes exceeds {MAX_PAYLOAD} bytes")
+    packet = HEADER.pack(SYNC_1, SYNC_2, PROTOCOL_VERSION, message_type, sequence & 0xFFFF, parameter, len(payload)) + payload
+    return packet + CRC.pack(crc16(packet))
+
+
+# @brief - Encodes a SET or GET request, the sending side of the protocol
+# @param sequence - sequence number of the request
+# @param parameter - one of Parameter
+# @param values - values of a SET, none for a GET
+# @return - the packet
+def encode_request(sequence, parameter, *values) -> bytes:
+    if not values:
+        return encode_packet(MessageType.GET, sequence, parameter)
+    return encode_packet(MessageType.SET, sequence, parameter, PARAMETER_FORMATS[parameter].pack(*values))
+
+
+# @brief - Encodes an ACK with a parameter's value
+# @param sequence - sequence number of the request
+# @param parameter - one of Parameter
+# @param values - the parameter's current values
+# @return - the packet
+def encode_ack(sequence, parameter, values) -> bytes:
+    return encode_packet(MessageType.ACK, sequence, parameter, PARAMETER_FORMATS[parameter].pack(*values))
+
+
+# @brief - Encodes a NACK
+# @param sequence - sequence number of the request
+# @param parameter - the requested parameter
+# @param code - one of ErrorCode
+# @return - the packet
+def encode_nack(sequence, parameter, code) -> bytes:
+    return encode_packet(MessageType.NACK, sequence, parameter, NACK_PAYLOAD.pack(code))
+
+
+# @brief - Decodes an ACK or NACK, the sending side of the protocol
+# @param data - the reply datagram
+# @return - message type, sequence, parameter, and the values of an ACK or the error code of a NACK
+# @raises ValueError - if the reply is malformed or corrupted
+def decode_reply(data):
+    if len(data) < HEADER.size + CRC.size:
+        raise ValueError(f"Reply of {len(data)} bytes is too short")
+    _, _, version, message_type, sequence, parameter, length = HEADER.unpack_from(data)
+    if len(data) != HEADER.size + length + CRC.size:
+        raise ValueError(f"Reply of {len(data)} bytes has a payload of {length}")
+    (crc,) = CRC.unpack_from(data, HEADER.size + length)
+    if crc != crc16(memoryview(data)[:HEADER.size + length]):
+        raise ValueError("CRC mismatch")
+    if message_type == MessageType.NACK:
+        return message_type, sequence, parameter, NACK_PAYLOAD.unpack_from(data, HEADER.size)[0]
+    return message_type, sequence, parameter, PARAMETER_FORMATS[parameter].unpack_from(data, HEADER.size)
+
+
+class CommandTable:
+    # @brief - Dispatch table of the parameters a process serves. Each parameter has a getter
+    #          returning its values and, unless it is read only, a setter taking them. A setter
+    #          rejects a value by raising CommandError, e.g. with INVALID_VALUE. Any other
+    #          error is answered with INTERNAL_ERROR so it cannot end the command thread.
+    def __init__(self):
+        self.getters = {}
+        self.setters = {}
+
+    # @brief - Serves a parameter
+    # @param parameter - one of Parameter
+    # @param getter - callable returning the tuple of values
+    # @param setter - callable taking the values, None for read only
+    def register(self, parameter, getter, setter=None):
+        if parameter not in PARAMETER_FORMATS:
+            raise ValueError(f"Unknown parameter {parameter:#04x}")
+        self.getters[parameter] = getter
+        if setter is not None:
+            self.setters[parameter] = setter
+
+    # @brief - Runs a command and builds the reply
+    # @param data - the datagram of an extended packet
+    # @return - the ACK or NACK packet, None if the packet was too damaged to answer
+    def handle(self, data):
+        try:
+            command = decode_command(data)
+        except CommandError as e:
+            print(f"[Command Protocol] Rejected packet: {e}")
+            return None if e.sequence is None else encode_nack(e.sequence, data[HEADER.size - 2], e.code)
+
+        try:
+            getter = self.getters.get(command.parameter)
+            if getter is None:
+                raise CommandError(ErrorCode.UNAVAILABLE, f"Parameter {command.parameter:#04x} is not served")
+            if command.message_type == MessageType.SET:
+                setter = self.setters.get(command.parameter)
+                if setter is None:
+                    raise CommandError(ErrorCode.READ_ONLY, f"Parameter {command.parameter:#04x} is read only")
+                setter(*command.values)
+            return encode_ack(command.sequence, command.parameter, tuple(getter()))
+        except CommandError as e:
+            print(f"[Command Protocol] Rejected command {command.sequence}: {e}")
+            return encode_nack(command.sequence, command.parameter, e.code)
+        except Exception as e:
+            print(f"[Command Protocol] Error in command {command.sequence}: {e}")
+            return encode_nack(command.sequence, command.parameter, ErrorCode.INTERNAL_ERROR)
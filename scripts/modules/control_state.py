@@ -0,0 +1,47 @@
+import collections
+import threading
+
+
+class ControlState(collections.namedtuple('ControlState', [
+        'generation',           # Incremented by every update, equal generations hold equal values
+        'stream_enabled',
+        'display_enabled',
+        'recording_enabled',
+        'stream_host',          # Stream destination and pyramid level
+        'stream_port',
+        'stream_level',
+        'stream_quality',       # JPEG quality, the ceiling of the quality when the bitrate is controlled
+        'stream_bitrate_kbps',  # Bitrate ceiling of the stream, 0 if not controlled
+        'publish_rate_hz',
+        'roi',                  # ROI scale and smallest ROI side of the ROI tracker, None without one
+        'hsv_range',            # Lower and upper HSV bounds of the blob tracker, None without one
+        'min_area',             # Smallest blob of the blob tracker, None without one
+    ], defaults=(0, False, False, True, '', 0, 0, 85, 0, 0.0, None, None, None))):
+    # @brief - Immutable snapshot of the runtime controls. A new snapshot replaces the old
+    #          one on every change, so a reader holding one sees a consistent set of values.
+    __slots__ = ()
+
+
+class SharedControlState:
+    # @brief - The current ControlState, written by the command thread and read by the frame
+    #          loop. Updates build a new snapshot under a lock and publish it with a single
+    #          reference assignment, reads take no lock: a reader gets the old or the new
+    #          snapshot, never a mix. The frame loop reads it once per frame and only looks
+    #          at the values when the generation changed.
+    # @param state - the initial ControlState
+    def __init__(self, state=None):
+        self.lock = threading.Lock()
+        self.state = state if state is not None else ControlState()
+
+    # @brief - Gets the current snapshot
+    # @return - ControlState
+    def get(self) -> ControlState:
+        return self.state
+
+    # @brief - Publishes a snapshot with some values changed
+    # @param changes - ControlState fields and their new values
+    # @return - the new ControlState
+    def update(self, **changes) -> ControlState:
+        with self.lock:
+            self.state = self.state._replace(generation=self.state.generation + 1, **changes)
+            return self.state
@@ -0,0 +1,150 @@
+import threading
+import time
+import cv2
+
+
+class CapturedFrame:
+    def __init__(self, image, seq, capture_ns, buffer=None, driver_ms=-1.0, jpeg=None):
+        self.image = image              # Decoded camera image, None until a passthrough frame is decoded
+        self.jpeg = jpeg                # JPEG bytes as the camera sent them in passthrough mode, else None
+        self.seq = seq                  # Sequence number assigned by the grabber, starting at 1
+        self.capture_ns = capture_ns    # time.monotonic_ns() taken as soon as grab() returned
+        self.driver_ms = driver_ms      # CAP_PROP_POS_MSEC reported by the backend, -1 if unavailable
+        self.buffer = buffer            # PooledFrame backing the image, None if not pooled
+        self.pyramid = None             # ImagePyramid of the image, set by the preprocess stage
+        self.result = None              # Tracker output filled in by the processing pipeline
+        self.found = False              # If the tracker found the target in this frame
+        self.tracks = ()                # Rows of track id, azimuth, elevation, distance of every tracked target
+        self.control = None             # ControlState read for this frame by the frame loop
+
+    def retain(self):
+        if self.buffer is not None:
+            self.buffer.retain()
+        return self
+
+    def release(self):
+        if self.buffer is not None:
+            self.buffer.release()
+
+
+class FrameGrabber(threading.Thread):
+    DEFAULT_TIMEOUT_SECS = 3
+
+    # @param camera - the opened cv2.VideoCapture
+    # @param frame_pool - FramePool the frames are decoded into, None to let OpenCV allocate
+    # @param passthrough - keep the camera's JPEG data undecoded, the camera must be opened with
+    #                      CAP_PROP_CONVERT_RGB off
+    def __init__(self, camera, frame_pool=None, passthrough=False):
+        super().__init__(daemon=True)
+        self.camera = camera
+        self.frame_pool = frame_pool
+        self.passthrough = passthrough
+        self.condition = threading.Condition()
+        self.latest = None
+        self.last_read_seq = 0
+        self.captured_count = 0
+        self.dropped_count = 0
+        self.running = True
+
+    def run(self):
+        print("[Frame Grabber] Started")
+        try:
+            while self.running and self.camera.isOpened():
+                # Grab as fast as the driver delivers so its queue never backs up
+                if not self.camera.grab():
+                    print("[Frame Grabber] Failed to grab camera frame")
+                    break
+                capture_ns = time.monotonic_ns()
+
+                # Decode into a pooled buffer when a pool was provided, passthrough frames are not decoded
+                if self.frame_pool is not None and not self.passthrough:
+                    buffer = self.frame_pool.acquire()
+                    good_read, image = self.camera.retrieve(image=buffer.array)
+                else:
+                    buffer = None
+                    good_read, image = self.camera.retrieve()
+
+                if not good_read:
+                    if buffer is not None:
+                        buffer.release()
+                    print("[Frame Grabber] Failed to retrieve camera frame")
+                    break
+
+                if buffer is not None:
+                    image = buffer.accept(image)
+
+                # Backends without a driver timestamp report 0
+                driver_ms = self.camera.get(cv2.CAP_PROP_POS_MSEC) or -1.0
+
+                # Backends that ignore CONVERT_RGB still hand back decoded frames, use those as they are
+                if self.passthrough and image.ndim < 3:
+                    self.publish(None, capture_ns, buffer, driver_ms, image.reshape(-1))
+                else:
+                    self.publish(image, capture_ns, buffer, driver_ms)
+        except Exception as e:
+            print(f"[Frame Grabber] An error occurred: {e}")
+        finally:
+            # Wake any reader so it can see the grabber has stopped, a frame published after stop() is released here
+            with self.condition:
+                self.running = False
+                self.release_latest()
+                self.condition.notify_all()
+
+    # @brief - Replaces the latest-frame slot, counting the previous frame as
+    #          dropped if the consumer never picked it up
+    # @param image - the decoded camera image
+    # @param capture_ns - monotonic capture timestamp of the image
+    # @param buffer - the PooledFrame holding the image, the slot takes over its reference
+    # @param driver_ms - the driver timestamp of the image, -1 if unavailable
+    # @param jpeg - the undecoded JPEG data in passthrough mode
+    def publish(self, image, capture_ns, buffer=None, driver_ms=-1.0, jpeg=None):
+        with self.condition:
+            self.captured_count += 1
+            if self.latest is not None:
+                if self.latest.seq > self.last_read_seq:
+                    self.dropped_count += 1
+                self.latest.release()
+            self.latest = CapturedFrame(image, self.captured_count, capture_ns, buffer, driver_ms, jpeg)
+            self.condition.notify_all()
+
+    # @brief - Waits for a frame newer than the last one returned
+    # @param timeout - seconds to wait for a new frame
+    # @return - the newest CapturedFrame, or None on timeout or once stopped.
+    #           The caller must release() the frame once it is done with it.
+    def read(self, timeout=DEFAULT_TIMEOUT_SECS):
+        with self.condition:
+            self.condition.wait_for(self.has_new_frame_or_stopped, timeout)
+            if not self.has_new_frame():
+                return None
+            self.last_read_seq = self.latest.seq
+            return self.latest.retain()
+
+    def has_new_frame(self) -> bool:
+        return self.latest is not None and self.latest.seq > self.last_read_seq
+
+    def has_new_frame_or_stopped(self) -> bool:
+        return self.has_new_frame() or not self.running
+
+    def is_running(self) -> bool:
+        return self.running
+
+    # @brief - Stops capturing and hands the frame left in the slot back to its pool
+    def stop(self):
+        print("[Frame Grabber] Stopping")
+        with self.condition:
+            self.running = False
+            self.release_latest()
+            self.condition.notify_all()
+
+    # @brief - Releases the slot's reference to the latest frame, with the lock held
+    def release_latest(self):
+        if self.latest is not None:
+            self.latest.release()
+            self.latest = None
+
+    def get_stats(self):
+        with self.condition:
+            return {
+                'captured': self.captured_count,
+                'dropped': self.dropped_count,
+            }
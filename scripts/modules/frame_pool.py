@@ -0,0 +1,104 @@
+import threading
+import time
+import numpy as np
+from modules.pyramid import ImagePyramid
+
+
+class PooledFrame:
+    def __init__(self, pool, array, pyramid=None):
+        self.pool = pool
+        self.array = array
+        self.pyramid = pyramid      # ImagePyramid kept with the buffer so its levels are reused too
+        self.ref_count = 0
+
+    # @brief - Adds a reference for another consumer of this buffer
+    # @return - self so it can be chained when handing the buffer off
+    def retain(self):
+        self.pool.retain(self)
+        return self
+
+    # @brief - Drops a reference, returning the buffer to the pool on the last one
+    def release(self):
+        self.pool.release(self)
+
+    # @brief - Takes the array OpenCV returned for a read/resize into this buffer.
+    #          OpenCV only writes in place when the destination matches, otherwise
+    #          it allocates a new array which is counted and kept for next time.
+    # @param image - the array returned by the OpenCV call
+    # @return - the array holding the image
+    def accept(self, image):
+        if image is not self.array:
+            self.pool.note_allocation()
+            self.array = image
+        return self.array
+
+
+class FramePool:
+    DEFAULT_POOL_SIZE = 8
+
+    # @param width, height, channels - shape of the buffers
+    # @param size - number of buffers to preallocate
+    # @param pyramid_levels - give every buffer an ImagePyramid with this many levels, 0 for none
+    def __init__(self, width, height, channels=3, size=DEFAULT_POOL_SIZE, pyramid_levels=0):
+        self.shape = (height, width, channels)
+        self.pyramid_levels = pyramid_levels
+        self.lock = threading.Lock()
+        self.free = [self.create_buffer() for _ in range(size)]
+        self.size = size
+        self.allocations = 0
+        self.last_stats_time = time.monotonic()
+        self.last_stats_allocations = 0
+
+    # @brief - Takes a free buffer from the pool with a single reference held by the caller.
+    #          If every buffer is in use the pool grows by one instead of stalling capture.
+    # @return - a PooledFrame
+    def acquire(self):
+        with self.lock:
+            if self.free:
+                buffer = self.free.pop()
+            else:
+                buffer = self.create_buffer()
+                self.size += 1
+                self.allocations += 1
+            buffer.ref_count = 1
+            return buffer
+
+    def create_buffer(self):
+        height, width = self.shape[:2]
+        pyramid = ImagePyramid(width, height, self.pyramid_levels) if self.pyramid_levels > 0 else None
+        return PooledFrame(self, np.empty(self.shape, dtype=np.uint8), pyramid)
+
+    def retain(self, buffer):
+        with self.lock:
+            buffer.ref_count += 1
+
+    def release(self, buffer):
+        with self.lock:
+            buffer.ref_count -= 1
+            if buffer.ref_count == 0:
+                self.free.append(buffer)
+            elif buffer.ref_count < 0:
+                print("[Frame Pool] Buffer released more times than it was retained")
+                buffer.ref_count = 0
+
+    def note_allocation(self):
+        with self.lock:
+            self.allocations += 1
+
+    # @brief - Gets the pool statistics. allocations_per_sec covers the time since
+    #          the previous call and should settle at zero in steady state.
+    # @return - dict of statistics
+    def get_stats(self):
+        with self.lock:
+            now = time.monotonic()
+            elapsed = now - self.last_stats_time
+            new_allocations = self.allocations - self.last_stats_allocations
+            self.last_stats_time = now
+            self.last_stats_allocations = self.allocations
+
+            return {
+                'size': self.size,
+                'free': len(self.free),
+                'allocations': self.allocations,
+                'allocations_per_sec': new_allocations / elapsed if elapsed > 0 else 0.0,
+            }
@@ -0,0 +1,45 @@
+import struct
+
+# Every message on the TCP stream is prefixed with its length as a 32 bit unsigned
+# integer in network byte order. Must match FRAME_HEADER_SIZE in eo_interface.h.
+HEADER = struct.Struct('!I')
+MAX_MESSAGE_SIZE = 64 * 1024
+
+
+# @brief - Prefixes a payload with its length
+# @param payload - bytes to frame
+# @return - the framed message
+def encode_frame(payload) -> bytes:
+    if len(payload) > MAX_MESSAGE_SIZE:
+        raise ValueError(f"Message of {len(payload)} bytes exceeds {MAX_MESSAGE_SIZE} bytes")
+    return HEADER.pack(len(payload)) + payload
+
+
+class FrameDecoder:
+    def __init__(self, max_message_size=MAX_MESSAGE_SIZE):
+        self.max_message_size = max_message_size
+        self.buffer = bytearray()
+
+    # @brief - Adds received bytes and extracts every complete message
+    # @param data - bytes as received from the socket, may hold partial or several messages
+    # @return - list of message payloads
+    def feed(self, data):
+        self.buffer += data
+        messages = []
+        offset = 0
+
+        while len(self.buffer) - offset >= HEADER.size:
+            (length,) = HEADER.unpack_from(self.buffer, offset)
+            if length > self.max_message_size:
+                # The stream is out of sync, there is no way to find the next message
+                self.buffer.clear()
+                raise ValueError(f"Invalid frame length {length}")
+
+            end = offset + HEADER.size + length
+            if end > len(self.buffer):
+                break
+            messages.append(bytes(self.buffer[offset + HEADER.size:end]))
+            offset = end
+
+        del self.buffer[:offset]
+        return messages
@@ -0,0 +1,295 @@
+import threading
+import time
+
+try:
+    import fcntl
+    import termios
+except ImportError:
+    fcntl = None
+
+try:
+    import gi
+    gi.require_version('Gst', '1.0')
+    from gi.repository import Gst
+except (ImportError, ValueError):
+    Gst = None
+
+
+class StreamEncoder:
+    AUTO = 'auto'               # First hardware encoder found, else software
+    JPEGENC = 'jpegenc'         # Software libjpeg
+    NVJPEGENC = 'nvjpegenc'     # NVIDIA Jetson
+    VAAPIJPEGENC = 'vaapijpegenc'   # Intel VA-API
+    V4L2JPEGENC = 'v4l2jpegenc'     # V4L2 M2M, e.g. Raspberry Pi
+    ALL = (AUTO, JPEGENC, NVJPEGENC, VAAPIJPEGENC, V4L2JPEGENC)
+    HARDWARE = (NVJPEGENC, VAAPIJPEGENC, V4L2JPEGENC)
+
+
+RTP_JPEG_CAPS = "application/x-rtp, media=(string)video, clock-rate=(int)90000, encoding-name=(string)JPEG"
+
+
+# @brief - Initializes GStreamer once
+# @return - True if the Python GStreamer bindings are available
+def gst_available():
+    if Gst is None:
+        return False
+    if not Gst.is_initialized():
+        Gst.init(None)
+    return True
+
+
+# @brief - Picks the encoder element to use
+# @param encoder - one of StreamEncoder
+# @return - the element factory name
+def select_encoder(encoder):
+    if encoder != StreamEncoder.AUTO:
+        if Gst.ElementFactory.find(encoder) is None:
+            raise RuntimeError(f"GStreamer encoder {encoder} is not installed")
+        return encoder
+    for name in StreamEncoder.HARDWARE:
+        if Gst.ElementFactory.find(name) is not None:
+            return name
+    return StreamEncoder.JPEGENC
+
+
+# @brief - Creates an element, failing with its name when the plugin is missing
+def make_element(factory, name=None, **properties):
+    element = Gst.ElementFactory.make(factory, name)
+    if element is None:
+        raise RuntimeError(f"GStreamer element {factory} is not installed")
+    for key, value in properties.items():
+        element.set_property(key.replace('_', '-'), value)
+    return element
+
+
+class GstStreamer:
+    DEFAULT_QUALITY = 85
+    DEFAULT_QUEUE_BUFFERS = 2   # Frames waiting for the encoder before the oldest is dropped
+    DEFAULT_TTL = 1
+
+    # @brief - RTP/JPEG sender built with the GStreamer API, the same chain as the README
+    #          sender: appsrc ! videoconvert ! jpegenc ! rtpjpegpay ! udpsink. Frames are pushed
+    #          as buffers holding a copy of the frame, timestamped from their capture time.
+    #          A leaky queue ahead of the encoder drops the oldest frame when it falls behind.
+    # @param host - address to stream to, a multicast group when multicast is set
+    # @param port - port to stream to
+    # @param width, height - size of the frames pushed
+    # @param fps - nominal frame rate, used for the caps and buffer durations
+    # @param multicast - stream to a multicast group
+    # @param multicast_iface - interface to send multicast on, None for the default route
+    # @param encoder - one of StreamEncoder
+    # @param quality - JPEG quality of the software encoder
+    # @param queue_buffers - frames queued ahead of the encoder
+    # @param on_encoded - called with the size of each encoded frame from the encoder's thread, None for no callback
+    def __init__(self, host, port, width, height, fps, multicast=False, multicast_iface=None,
+                 encoder=StreamEncoder.AUTO, quality=DEFAULT_QUALITY, queue_buffers=DEFAULT_QUEUE_BUFFERS, on_encoded=None):
+        if not gst_available():
+            raise RuntimeError("The GStreamer Python bindings (gi) are not installed")
+        self.width = width
+        self.height = height
+        self.fps = max(1, int(fps))
+        self.encoder_name = select_encoder(encoder)
+        self.lock = threading.Lock()
+        self.base_ns = None         # Capture time of the first frame, timestamps count from it
+        self.frame_duration = Gst.SECOND // self.fps
+        self.error = None
+
+        self.pipeline = Gst.Pipeline.new('stream')
+        self.source = make_element('appsrc', 'source', is_live=True, format=Gst.Format.TIME, do_timestamp=False,
+                                   block=False, caps=Gst.Caps.from_string(
+                                       f"video/x-raw, format=BGR, width={width}, height={height}, framerate={self.fps}/1"))
+        self.queue = make_element('queue', 'queue', leaky=2, max_size_buffers=queue_buffers, max_size_bytes=0,
+                                  max_size_time=0)
+        self.encoder = make_element(self.encoder_name, 'encoder')
+        self.quality = None
+        self.set_quality(quality)
+        self.on_encoded = on_encoded
+        self.sink = sink = make_element('udpsink', 'sink', host=host, port=int(port), sync=False, async_=False)
+        if multicast:
+            sink.set_property('auto-multicast', True)
+            sink.set_property('ttl-mc', self.DEFAULT_TTL)
+            if multicast_iface:
+                sink.set_property('multicast-iface', multicast_iface)
+
+        elements = [self.source, self.queue, make_element('videoconvert'), self.encoder, make_element('rtpjpegpay'), sink]
+        for element in elements:
+            self.pipeline.add(element)
+        for upstream, downstream in zip(elements, elements[1:]):
+            if not upstream.link(downstream):
+                raise RuntimeError(f"Failed to link {upstream.get_name()} to {downstream.get_name()}")
+
+        self.queue.connect('overrun', self.on_overrun)
+        self.encoder.get_static_pad('src').add_probe(Gst.PadProbeType.BUFFER, self.on_encoded_buffer)
+        sink.get_static_pad('sink').add_probe(Gst.PadProbeType.BUFFER, self.on_sent)
+        self.bus = self.pipeline.get_bus()
+
+        # Statistics
+        self.pushed_count = 0
+        self.dropped_count = 0
+        self.sent_count = 0
+        self.last_sent_pts = None
+        self.total_push_ns = 0
+        self.max_push_ns = 0
+        self.total_latency_ns = 0
+        self.max_latency_ns = 0
+
+        if self.pipeline.set_state(Gst.State.PLAYING) == Gst.StateChangeReturn.FAILURE:
+            raise RuntimeError("Failed to start the stream pipeline")
+        print(f"[GStreamer Streamer] Streaming {width}x{height} to {host}:{port} with {self.encoder_name}"
+              + (" (multicast)" if multicast else ""))
+
+    def isOpened(self):
+        return self.error is None
+
+    # @brief - Pushes a copy of a frame, the caller keeps its buffer
+    # @param frame - BGR frame of the streamer's size
+    # @param capture_ns - monotonic capture time, 0 for now
+    def write(self, frame, capture_ns=0):
+        if self.error is not None:
+            return
+        self.poll_bus()
+        capture_ns = capture_ns or time.monotonic_ns()
+
+        start_ns = time.monotonic_ns()
+        # A frame of another size, like a lower pyramid level, renegotiates the pipeline
+        height, width = frame.shape[:2]
+        if (width, height) != (self.width, self.height):
+            self.width, self.height = width, height
+            self.source.set_property('caps', Gst.Caps.from_string(
+                f"video/x-raw, format=BGR, width={width}, height={height}, framerate={self.fps}/1"))
+
+        # PyGObject hands the bindings a temporary copy of an array argument, so wrapping the
+        # frame memory is not safe. The buffer owns its own bytes, the capture buffer is freed.
+        buffer = Gst.Buffer.new_wrapped(frame.tobytes())
+
+        with self.lock:
+            if self.base_ns is None:
+                self.base_ns = capture_ns
+            buffer.pts = capture_ns - self.base_ns
+            buffer.duration = self.frame_duration
+
+        result = self.source.emit('push-buffer', buffer)
+        push_ns = time.monotonic_ns() - start_ns
+        with self.lock:
+            self.pushed_count += 1
+            self.total_push_ns += push_ns
+            self.max_push_ns = max(self.max_push_ns, push_ns)
+        if result != Gst.FlowReturn.OK:
+            self.fail(f"push returned {result}")
+
+    # @brief - Sets the JPEG quality, where the encoder has one
+    # @param quality - 1 to 100
+    def set_quality(self, quality):
+        if quality != self.quality and self.encoder.find_property('quality') is not None:
+            self.encoder.set_property('quality', int(quality))
+        self.quality = quality
+
+    # @brief - Bytes waiting in the send socket, a full queue means the link is behind
+    # @return - the queued bytes, None if the socket is not open or the OS does not report it
+    def send_queue_bytes(self):
+        used_socket = self.sink.get_property('used-socket')
+        if used_socket is None or fcntl is None:
+            return None
+        try:
+            queued = fcntl.ioctl(used_socket.get_fd(), termios.TIOCOUTQ, b'\0' * 4)
+        except OSError:
+            return None
+        return int.from_bytes(queued, 'little')
+
+    def on_encoded_buffer(self, pad, info):
+        if self.on_encoded is not None:
+            buffer = info.get_buffer()
+            if buffer is not None:
+                self.on_encoded(buffer.get_size())
+        return Gst.PadProbeReturn.OK
+
+    def on_overrun(self, queue):
+        with self.lock:
+            self.dropped_count += 1
+
+    # @brief - Measures capture to send latency on the first RTP packet of each frame
+    def on_sent(self, pad, info):
+        buffer = info.get_buffer()
+        with self.lock:
+            if buffer is not None and buffer.pts != self.last_sent_pts and self.base_ns is not None:
+                self.last_sent_pts = buffer.pts
+                latency_ns = time.monotonic_ns() - (self.base_ns + buffer.pts)
+                self.sent_count += 1
+                self.total_latency_ns += latency_ns
+                self.max_latency_ns = max(self.max_latency_ns, latency_ns)
+        return Gst.PadProbeReturn.OK
+
+    def poll_bus(self):
+        message = self.bus.pop_filtered(Gst.MessageType.ERROR | Gst.MessageType.EOS)
+        if message is None:
+            return
+        if message.type == Gst.MessageType.ERROR:
+            error, debug = message.parse_error()
+            self.fail(f"{error.message} ({debug})")
+        else:
+            self.fail("end of stream")
+
+    def fail(self, reason):
+        if self.error is None:
+            self.error = reason
+            print(f"[GStreamer Streamer] Stream stopped: {reason}")
+
+    # @brief - Stops the pipeline
+    def release(self):
+        if self.pipeline is None:
+            return
+        self.source.emit('end-of-stream')
+        self.pipeline.set_state(Gst.State.NULL)
+        self.pipeline = None
+
+    # @brief - Gets the streamer statistics. Latency is from capture to the first packet of
+    #          the frame reaching the socket, dropped frames were discarded ahead of the encoder.
+    # @return - dict of statistics
+    def get_stats(self):
+        with self.lock:
+            return {
+                'encoder': self.encoder_name,
+                'pushed': self.pushed_count,
+                'dropped': self.dropped_count,
+                'sent': self.sent_count,
+                'avg_push_us': self.total_push_ns / self.pushed_count / 1e3 if self.pushed_count else 0.0,
+                'max_push_us': self.max_push_ns / 1e3,
+                'avg_latency_ms': self.total_latency_ns / self.sent_count / 1e6 if self.sent_count else 0.0,
+                'max_latency_ms': self.max_latency_ns / 1e6,
+                'error': self.error,
+            }
+
+
+class StreamReceiver:
+    # @brief - Local receiver of an RTP/JPEG stream for testing the sender, the README
+    #          receiver with an appsink that counts and decodes nothing but the RTP
+    # @param port - port to receive on
+    # @param multicast_group - group to join, None for unicast
+    def __init__(self, port, multicast_group=None):
+        if not gst_available():
+            raise RuntimeError("The GStreamer Python bindings (gi) are not installed")
+        source = f"udpsrc port={port}" + (f" multicast-group={multicast_group} auto-multicast=true" if multicast_group else "")
+        self.pipeline = Gst.parse_launch(f'{source} caps="{RTP_JPEG_CAPS}" ! rtpjpegdepay ! jpegparse ! '
+                                         f'appsink name=sink emit-signals=true sync=false')
+        self.lock = threading.Lock()
+        self.frame_count = 0
+        self.byte_count = 0
+        self.pipeline.get_by_name('sink').connect('new-sample', self.on_sample)
+        self.pipeline.set_state(Gst.State.PLAYING)
+
+    def on_sample(self, sink):
+        sample = sink.emit('pull-sample')
+        with self.lock:
+            self.frame_count += 1
+            self.byte_count += sample.get_buffer().get_size()
+        return Gst.FlowReturn.OK
+
+    def release(self):
+        self.pipeline.set_state(Gst.State.NULL)
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                'frames': self.frame_count,
+                'avg_frame_kb': self.byte_count / self.frame_count / 1e3 if self.frame_count else 0.0,
+            }
@@ -0,0 +1,103 @@
+import threading
+import numpy as np
+
+
+class ConstantVelocityKalman:
+    # Measurement noise as standard deviations of azimuth/elevation in degrees and distance in meters
+    DEFAULT_MEASUREMENT_STD = (0.05, 0.05, 1.0)
+    # Process noise as standard deviations of the unmodeled acceleration in deg/s^2 and m/s^2
+    DEFAULT_ACCELERATION_STD = (20.0, 20.0, 5.0)
+    # Standard deviation of the rates when a track starts in deg/s and m/s
+    DEFAULT_INITIAL_RATE_STD = (30.0, 30.0, 10.0)
+    # Longest time without a measurement before the estimate is dropped
+    DEFAULT_MAX_COAST_SECS = 1.0
+
+    # @brief - Constant velocity Kalman filter of azimuth, elevation and distance.
+    #          The state is [az, el, dist, az rate, el rate, dist rate], times are monotonic ns.
+    #          Updates come from the tracking thread and predictions from the publisher, so
+    #          both take a lock.
+    # @param measurement_std - measurement noise per axis
+    # @param acceleration_std - process noise per axis
+    # @param max_coast_secs - how long predictions are made without a new measurement
+    def __init__(self, measurement_std=DEFAULT_MEASUREMENT_STD, acceleration_std=DEFAULT_ACCELERATION_STD,
+                 initial_rate_std=DEFAULT_INITIAL_RATE_STD, max_coast_secs=DEFAULT_MAX_COAST_SECS):
+        self.measurement_noise = np.diag(np.square(measurement_std))
+        self.acceleration_var = np.diag(np.square(acceleration_std))
+        self.initial_covariance = np.diag(np.concatenate((np.square(measurement_std), np.square(initial_rate_std))))
+        self.max_coast_ns = int(max_coast_secs * 1e9)
+        self.lock = threading.Lock()
+        self.state = np.zeros(6)
+        self.covariance = self.initial_covariance.copy()
+        self.time_ns = None         # Time of the state, None until the first measurement
+
+        # Statistics
+        self.update_count = 0
+        self.reset_count = 0
+        self.innovation = np.zeros(3)
+
+    # @brief - Builds the transition and process noise for a time step, all axes at once
+    # @param dt - time step in seconds
+    # @return - transition matrix, process noise matrix
+    def transition(self, dt):
+        transition = np.eye(6)
+        transition[:3, 3:] = dt * np.eye(3)
+        process_noise = np.kron(np.array([[dt ** 3 / 3, dt ** 2 / 2], [dt ** 2 / 2, dt]]), self.acceleration_var)
+        return transition, process_noise
+
+    def propagate(self, time_ns):
+        transition, process_noise = self.transition((time_ns - self.time_ns) / 1e9)
+        return transition @ self.state, transition @ self.covariance @ transition.T + process_noise
+
+    def is_valid(self, time_ns):
+        return self.time_ns is not None and time_ns - self.time_ns <= self.max_coast_ns
+
+    # @brief - Fuses a tracker measurement
+    # @param measurement - azimuth, elevation, distance
+    # @param time_ns - monotonic capture time of the frame it came from
+    def update(self, measurement, time_ns):
+        measurement = np.asarray(measurement, dtype=float)
+        with self.lock:
+            # Start over if there is no track or it coasted too long to trust the rates
+            if not self.is_valid(time_ns):
+                self.state[:3] = measurement
+                self.state[3:] = 0.0
+                self.covariance = self.initial_covariance.copy()
+                self.time_ns = time_ns
+                self.reset_count += 1
+                return
+
+            # Measurements older than the state carry no new information
+            if time_ns < self.time_ns:
+                return
+
+            state, covariance = self.propagate(time_ns)
+            self.innovation = measurement - state[:3]
+            innovation_covariance = covariance[:3, :3] + self.measurement_noise
+            gain = np.linalg.solve(innovation_covariance, covariance[:3, :]).T
+            self.state = state + gain @ self.innovation
+            covariance = covariance - gain @ covariance[:3, :]
+            self.covariance = (covariance + covariance.T) / 2
+            self.time_ns = time_ns
+            self.update_count += 1
+
+    # @brief - Predicts the state at a time without changing the filter
+    # @param time_ns - monotonic time to predict to, e.g. a publish deadline
+    # @return - state vector and covariance matrix, None if there is no valid track
+    def predict(self, time_ns):
+        with self.lock:
+            if not self.is_valid(time_ns):
+                return None
+            if time_ns <= self.time_ns:
+                return self.state.copy(), self.covariance.copy()
+            return self.propagate(time_ns)
+
+    # @brief - Gets filter statistics
+    # @return - dict of statistics
+    def get_stats(self):
+        with self.lock:
+            return {
+                'updates': self.update_count,
+                'resets': self.reset_count,
+                'innovation': self.innovation.round(4).tolist(),
+                'rates': self.state[3:].round(4).tolist(),
+            }
@@ -0,0 +1,145 @@
+import os
+import subprocess
+import cv2
+import numpy as np
+
+
+# Decode flags for each JPEG scale, the reduced modes scale in the DCT instead of after decoding
+JPEG_DECODE_FLAGS = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+
+# @brief - Decodes a JPEG frame from the camera
+# @param data - NumPy array of the JPEG bytes
+# @param scale - 1, 2, 4 or 8, the decoded image is this many times smaller
+# @return - BGR image, None if the data could not be decoded
+def decode_jpeg(data, scale=1):
+    return cv2.imdecode(data, JPEG_DECODE_FLAGS[scale])
+
+
+# @brief - Size of a JPEG decoded at a scale, the reduced decodes round up
+# @param width, height - size of the JPEG
+# @param scale - the decode scale
+# @return - width, height
+def decoded_size(width, height, scale=1):
+    return -(-width // scale), -(-height // scale)
+
+
+class MjpegWriter:
+    # @brief - Writes JPEG frames back to back into a raw .mjpeg file, as they came from
+    #          the camera. ffmpeg, VLC and GStreamer's jpegparse read these directly.
+    # @param path - the file to write
+    def __init__(self, path):
+        self.path = path
+        try:
+            self.file = open(path, 'wb')
+        except OSError as e:
+            print(f"[MJPEG Writer] Error opening {path}: {e}")
+            self.file = None
+
+    def isOpened(self):
+        return self.file is not None
+
+    # @brief - Appends a frame
+    # @param frame - NumPy array of the JPEG bytes
+    def write(self, frame):
+        self.file.write(memoryview(np.ascontiguousarray(frame)))
+
+    def release(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+class MjpegStreamer:
+    CLOSE_TIMEOUT_SECS = 2
+
+    # @brief - Streams JPEG frames as RTP without decoding them. The frames are piped into
+    #          gst-launch, which only parses and packetizes them. The pipe never blocks the
+    #          caller: while gst-launch has not taken the last frame, new frames are dropped,
+    #          as the leaky queue in front of the GStreamer appsrc does.
+    # @param host - address to stream to
+    # @param port - port to stream to
+    # @param multicast - the host is a multicast group
+    # @param multicast_iface - interface the multicast stream is sent on, None for the default
+    def __init__(self, host, port, multicast=False, multicast_iface=None):
+        self.process = None
+        self.pending = None         # Rest of a frame the pipe did not take at once
+
+        # Statistics
+        self.sent_count = 0
+        self.dropped_count = 0
+
+        command = self.pipeline_command(host, port, multicast, multicast_iface)
+        print(f"Starting MJPEG passthrough stream: sending -> {' '.join(command)}")
+        try:
+            self.process = subprocess.Popen(command, stdin=subprocess.PIPE, bufsize=0)
+            os.set_blocking(self.process.stdin.fileno(), False)
+        except OSError as e:
+            print(f"[MJPEG Streamer] Error starting the stream: {e}")
+            self.release()
+
+    # @brief - Builds the gst-launch command line
+    # @return - list of arguments
+    def pipeline_command(self, host, port, multicast, multicast_iface):
+        sink = ['udpsink', f'host={host}', f'port={port}']
+        if multicast:
+            sink.append('auto-multicast=true')
+            if multicast_iface:
+                sink.append(f'multicast-iface={multicast_iface}')
+        return ['gst-launch-1.0', '-q', 'fdsrc', 'fd=0', '!', 'jpegparse', '!', 'rtpjpegpay', '!'] + sink
+
+    def isOpened(self):
+        return self.process is not None and self.process.poll() is None
+
+    # @brief - Sends a frame, a stream that has died is closed
+    # @param frame - NumPy array of the JPEG bytes
+    def write(self, frame):
+        if not self.isOpened():
+            return
+        try:
+            # Finish the last frame first, a new one would corrupt it
+            if self.pending is not None and not self.send(self.pending):
+                self.dropped_count += 1
+                return
+            self.send(memoryview(np.ascontiguousarray(frame)).cast('B'))
+            self.sent_count += 1
+        except OSError as e:
+            print(f"[MJPEG Streamer] Stream stopped: {e}")
+            self.release()
+
+    # @brief - Writes as much of a frame as the pipe takes, keeping a copy of the rest
+    # @param data - bytes-like frame data
+    # @return - True if the whole frame was written
+    def send(self, data):
+        try:
+            written = os.write(self.process.stdin.fileno(), data)
+        except BlockingIOError:
+            written = 0
+        self.pending = bytes(data[written:]) if written < len(data) else None
+        return self.pending is None
+
+    def release(self):
+        if self.process is not None:
+            try:
+                self.process.stdin.close()
+            except OSError:
+                pass
+            try:
+                self.process.wait(self.CLOSE_TIMEOUT_SECS)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+            self.process = None
+
+    # @brief - Gets the stream statistics
+    # @return - dict of statistics
+    def get_stats(self):
+        return {
+            'sent': self.sent_count,
+            'dropped': self.dropped_count,
+            'pending_bytes': len(self.pending) if self.pending is not None else 0,
+        }
@@ -0,0 +1,166 @@
+import collections
+import threading
+import time
+
+
+class DropPolicy:
+    DROP_OLDEST = 'drop-oldest'     # Make room by discarding the oldest queued item
+    DROP_NEWEST = 'drop-newest'     # Discard the incoming item, keeping what is queued
+    BLOCK = 'block'                 # Block the producer until there is room
+    ALL = (DROP_OLDEST, DROP_NEWEST, BLOCK)
+
+
+class Stage(threading.Thread):
+    DEFAULT_QUEUE_SIZE = 2
+
+    # @brief - A pipeline stage running its handler on its own worker thread
+    # @param name - name used in logs and statistics
+    # @param handler - callable taking an item, returning the item to pass to the
+    #                  connected stages or None to stop it here
+    # @param queue_size - maximum number of items waiting for this stage
+    # @param drop_policy - one of DropPolicy for when the queue is full
+    # @param gate - callable taking an item and returning False if the stage does not want it,
+    #               it is then not queued and an idle stage sleeps. None to accept every item.
+    def __init__(self, name, handler, queue_size=DEFAULT_QUEUE_SIZE, drop_policy=DropPolicy.DROP_OLDEST, gate=None):
+        super().__init__(name=name, daemon=True)
+        if drop_policy not in DropPolicy.ALL:
+            raise ValueError(f"Unknown drop policy: {drop_policy}")
+        self.handler = handler
+        self.queue_size = max(1, queue_size)
+        self.drop_policy = drop_policy
+        self.gate = gate
+        self.queue = collections.deque()
+        self.condition = threading.Condition()
+        self.outputs = []
+        self.running = True
+
+        # Statistics
+        self.received_count = 0
+        self.processed_count = 0
+        self.dropped_count = 0
+        self.max_depth = 0
+        self.total_wait_ns = 0
+        self.total_service_ns = 0
+        self.max_service_ns = 0
+
+    # @brief - Fans this stage's output out to another stage
+    # @param stage - the downstream stage
+    # @return - the downstream stage so connections can be chained
+    def connect(self, stage):
+        self.outputs.append(stage)
+        return stage
+
+    # @brief - Queues an item for this stage, applying the drop policy when full.
+    #          The stage holds its own reference to the item until it is handled.
+    # @param item - the item to queue, must provide retain() and release()
+    # @return - True if the item was queued
+    def put(self, item):
+        if self.gate is not None and not self.gate(item):
+            return False
+
+        evicted = None
+        rejected = False
+        item.retain()
+
+        with self.condition:
+            self.received_count += 1
+
+            if self.running and len(self.queue) >= self.queue_size:
+                if self.drop_policy == DropPolicy.BLOCK:
+                    self.condition.wait_for(lambda: len(self.queue) < self.queue_size or not self.running)
+                elif self.drop_policy == DropPolicy.DROP_NEWEST:
+                    rejected = True
+                else:
+                    evicted, _ = self.queue.popleft()
+
+            # A stopped stage takes nothing new and keeps what it queued to drain it
+            if not self.running:
+                rejected = True
+            if not rejected:
+                self.queue.append((item, time.monotonic_ns()))
+                self.max_depth = max(self.max_depth, len(self.queue))
+                self.condition.notify_all()
+
+            self.dropped_count += (evicted is not None) + rejected
+
+        if evicted is not None:
+            evicted.release()
+        if rejected:
+            item.release()
+        return not rejected
+
+    def run(self):
+        while True:
+            with self.condition:
+                # Keep draining after stop so sinks can flush what was already queued
+                self.condition.wait_for(lambda: self.queue or not self.running)
+                if not self.queue:
+                    break
+                item, queued_ns = self.queue.popleft()
+                self.condition.notify_all()
+
+            start_ns = time.monotonic_ns()
+            try:
+                output = self.handler(item)
+            except Exception as e:
+                print(f"[Pipeline] Error in stage {self.name}: {e}")
+                output = None
+            end_ns = time.monotonic_ns()
+
+            with self.condition:
+                self.processed_count += 1
+                self.total_wait_ns += start_ns - queued_ns
+                self.total_service_ns += end_ns - start_ns
+                self.max_service_ns = max(self.max_service_ns, end_ns - start_ns)
+
+            if output is not None:
+                for stage in self.outputs:
+                    stage.put(output)
+
+            item.release()
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+
+    # @brief - Gets the stage statistics. Latencies are averaged since the start.
+    # @return - dict of statistics
+    def get_stats(self):
+        with self.condition:
+            processed = max(1, self.processed_count)
+            return {
+                'depth': len(self.queue),
+                'max_depth': self.max_depth,
+                'received': self.received_count,
+                'processed': self.processed_count,
+                'dropped': self.dropped_count,
+                'avg_wait_ms': self.total_wait_ns / processed / 1e6,
+                'avg_service_ms': self.total_service_ns / processed / 1e6,
+                'max_service_ms': self.max_service_ns / 1e6,
+            }
+
+
+class Pipeline:
+    def __init__(self):
+        self.stages = []
+
+    # @brief - Adds a stage, stages must be added upstream first
+    # @return - the added stage
+    def add(self, stage):
+        self.stages.append(stage)
+        return stage
+
+    def start(self):
+        for stage in self.stages:
+            stage.start()
+
+    # @brief - Stops the stages upstream first, letting each drain into the next
+    def stop(self):
+        print("[Pipeline] Stopping")
+        for stage in self.stages:
+            stage.stop()
+            stage.join()
+
+    def get_stats(self):
+        return {stage.name: stage.get_stats() for stage in self.stages}
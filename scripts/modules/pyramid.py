@@ -0,0 +1,88 @@
+import threading
+import cv2
+import numpy as np
+
+
+class ImagePyramid:
+    DEFAULT_LEVELS = 3
+
+    # @brief - Multi-resolution view of a frame. Level 0 is the frame itself and every
+    #          level is half the size of the one above it. Levels are only computed when
+    #          asked for, once per frame, into buffers that are kept for the next frame.
+    # @param width, height - size of the frames at level 0
+    # @param levels - number of levels including level 0
+    def __init__(self, width, height, levels=DEFAULT_LEVELS):
+        self.sizes = [(width, height)]
+        for _ in range(1, levels):
+            width, height = self.sizes[-1]
+            self.sizes.append(((width + 1) // 2, (height + 1) // 2))
+        self.levels = levels
+        self.lock = threading.Lock()
+        self.buffers = [None] * levels
+        self.images = [None] * levels
+
+        # Statistics
+        self.frame_count = 0
+        self.computed_count = [0] * levels
+        self.allocations = 0
+
+    # @brief - Starts a new frame, the levels below it are recomputed when next asked for
+    # @param frame - the level 0 image, must match the pyramid size
+    # @return - self so it can be handed off directly
+    def set_frame(self, frame):
+        with self.lock:
+            self.images[0] = frame
+            for index in range(1, self.levels):
+                self.images[index] = None
+            self.frame_count += 1
+        return self
+
+    # @brief - Gets a level, computing it and any missing level above it
+    # @param index - level, 0 is full size
+    # @return - the image at that level
+    def level(self, index):
+        with self.lock:
+            return self.compute(index)
+
+    def compute(self, index):
+        if self.images[index] is None:
+            source = self.compute(index - 1)
+            width, height = self.sizes[index]
+            if self.buffers[index] is None:
+                self.buffers[index] = np.empty((height, width) + source.shape[2:], dtype=source.dtype)
+                self.allocations += 1
+            self.images[index] = cv2.pyrDown(source, dst=self.buffers[index], dstsize=(width, height))
+            self.computed_count[index] += 1
+        return self.images[index]
+
+    # @brief - Gets the size of a level
+    # @param index - level
+    # @return - width, height
+    def size(self, index):
+        return self.sizes[index]
+
+    # @brief - Gets the factor from a level's coordinates to level 0 coordinates
+    # @param index - level
+    # @return - the scale factor
+    def scale(self, index):
+        return 1 << index
+
+    # @brief - Finds the smallest level that is still at least the requested width
+    # @param width - requested width in pixels
+    # @return - level index
+    def level_for_width(self, width):
+        for index in range(self.levels - 1, 0, -1):
+            if self.sizes[index][0] >= width:
+                return index
+        return 0
+
+    # @brief - Gets how often each level was computed, unused levels stay at zero
+    # @return - dict of statistics
+    def get_stats(self):
+        with self.lock:
+            return {
+                'levels': [f"{width}x{height}" for width, height in self.sizes],
+                'frames': self.frame_count,
+                'computed': list(self.computed_count),
+                'allocations': self.allocations,
+            }
@@ -0,0 +1,125 @@
+import bisect
+import time
+
+
+class ScheduleMode:
+    FIXED_RATE = 'fixed'            # Fire on fixed deadlines, missed deadlines are skipped without drift
+    ON_NEW_RESULT = 'new-result'    # Fire whenever a new result (sequence number) arrives
+    ON_CHANGE = 'change'            # Fire when any value moved more than the threshold since the last fire
+    ALL = (FIXED_RATE, ON_NEW_RESULT, ON_CHANGE)
+
+
+class RateScheduler:
+    # Upper edges of the jitter histogram buckets in milliseconds, the last bucket is open ended
+    JITTER_BUCKETS_MS = (0.1, 0.5, 1, 2, 5, 10, 20, 50)
+
+    # @param rate_hz - requested rate. For FIXED_RATE this sets the deadlines, for the other
+    #                  modes it is a ceiling. 0 or less fires on every call / has no ceiling.
+    # @param mode - one of ScheduleMode
+    # @param threshold - smallest change of any value that fires in ON_CHANGE mode
+    def __init__(self, rate_hz, mode=ScheduleMode.FIXED_RATE, threshold=0.0):
+        if mode not in ScheduleMode.ALL:
+            raise ValueError(f"Unknown schedule mode: {mode}")
+        self.rate_hz = rate_hz
+        self.mode = mode
+        self.threshold = threshold
+        self.period_ns = int(1e9 / rate_hz) if rate_hz > 0 else 0
+        self.next_deadline_ns = None
+        self.last_seq = None
+        self.last_values = None
+
+        # Statistics
+        self.fired_count = 0
+        self.missed_count = 0
+        self.first_fire_ns = None
+        self.last_fire_ns = None
+        self.jitter_histogram = [0] * (len(self.JITTER_BUCKETS_MS) + 1)
+
+    # @brief - Decides if the scheduled action should run now
+    # @param now_ns - monotonic time in ns, taken here if None
+    # @param values - sequence of numbers compared against the threshold in ON_CHANGE mode
+    # @param seq - sequence number of the result in ON_NEW_RESULT mode
+    # @return - True if the action should run
+    def should_fire(self, now_ns=None, values=None, seq=None) -> bool:
+        if now_ns is None:
+            now_ns = time.monotonic_ns()
+
+        if self.mode == ScheduleMode.FIXED_RATE:
+            return self.check_deadline(now_ns)
+
+        # The rate is a ceiling for the event driven modes
+        if self.next_deadline_ns is not None and now_ns < self.next_deadline_ns:
+            return False
+
+        if self.mode == ScheduleMode.ON_NEW_RESULT:
+            if seq is not None and seq == self.last_seq:
+                return False
+            self.last_seq = seq
+        else:
+            if self.last_values is not None and values is not None and \
+                    max(abs(value - last) for value, last in zip(values, self.last_values)) <= self.threshold:
+                return False
+            self.last_values = tuple(values) if values is not None else None
+
+        if self.period_ns:
+            self.next_deadline_ns = now_ns + self.period_ns
+        self.record_fire(now_ns, None)
+        return True
+
+    def check_deadline(self, now_ns) -> bool:
+        if self.period_ns == 0:
+            self.record_fire(now_ns, None)
+            return True
+
+        if self.next_deadline_ns is None:
+            self.next_deadline_ns = now_ns
+
+        if now_ns < self.next_deadline_ns:
+            return False
+
+        # Advance by whole periods from the deadline, not from now, so the rate does not drift
+        lateness_ns = now_ns - self.next_deadline_ns
+        missed = lateness_ns // self.period_ns
+        self.missed_count += missed
+        self.next_deadline_ns += (missed + 1) * self.period_ns
+        self.record_fire(now_ns, lateness_ns - missed * self.period_ns)
+        return True
+
+    # @brief - Changes the rate, the next call starts a new deadline schedule
+    # @param rate_hz - the new rate, 0 or less fires on every call / has no ceiling
+    def set_rate(self, rate_hz):
+        self.rate_hz = rate_hz
+        self.period_ns = int(1e9 / rate_hz) if rate_hz > 0 else 0
+        self.next_deadline_ns = None
+
+    # @brief - Time until the next fixed rate deadline, for loops that sleep until it
+    # @param now_ns - monotonic time in ns, taken here if None
+    # @return - seconds to wait, 0 if the deadline has already passed
+    def seconds_until_deadline(self, now_ns=None) -> float:
+        if self.next_deadline_ns is None:
+            return 0.0
+        if now_ns is None:
+            now_ns = time.monotonic_ns()
+        return max(0, self.next_deadline_ns - now_ns) / 1e9
+
+    def record_fire(self, now_ns, jitter_ns):
+        if self.first_fire_ns is None:
+            self.first_fire_ns = now_ns
+        self.last_fire_ns = now_ns
+        self.fired_count += 1
+        if jitter_ns is not None:
+            self.jitter_histogram[bisect.bisect_left(self.JITTER_BUCKETS_MS, jitter_ns / 1e6)] += 1
+
+    # @brief - Gets the requested vs achieved rate and the jitter histogram (fixed rate only)
+    # @return - dict of statistics
+    def get_stats(self):
+        elapsed_ns = (self.last_fire_ns - self.first_fire_ns) if self.fired_count > 1 else 0
+        labels = [f"<{edge}ms" for edge in self.JITTER_BUCKETS_MS] + [f">={self.JITTER_BUCKETS_MS[-1]}ms"]
+        return {
+            'mode': self.mode,
+            'requested_hz': self.rate_hz,
+            'achieved_hz': (self.fired_count - 1) / (elapsed_ns / 1e9) if elapsed_ns else 0.0,
+            'fired': self.fired_count,
+            'missed': self.missed_count,
+            'jitter': {label: count for label, count in zip(labels, self.jitter_histogram) if count},
+        }
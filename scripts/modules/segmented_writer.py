@@ -0,0 +1,231 @@
+import json
+import os
+import time
+import uuid
+import cv2
+from modules.mjpeg import MjpegWriter
+from modules.telemetry_log import TELEMETRY_LOG_SUFFIX, TelemetryLog
+
+
+class SegmentedVideoWriter:
+    INDEX_SUFFIX = '.index.jsonl'
+
+    # @brief - Writes a recording as a series of segment files, rolling over on segment
+    #          duration or size and deleting the oldest segments to stay under a disk quota.
+    #          A segment is finalized and synced before it is added to the index, so the
+    #          segments in the index survive a crash of the live one. The index holds one
+    #          JSON line per segment with the run that wrote it and its first/last frame
+    #          sequence and monotonic capture time, and is replaced atomically. Frame
+    #          sequences and capture times restart with every run, the run tells them apart.
+    #          With telemetry each segment has its own telemetry log next to it, holding the
+    #          frames tracked after the previous segment's last frame up to its own last frame.
+    #          The log counts against the quota and is deleted with the segment.
+    # @param path - file the recording is named after, e.g. recording.avi gives recording_00000.avi
+    #               and recording.index.jsonl. Without rolling the recording is written to path itself.
+    # @param fourcc - codec of the segments
+    # @param fps - frame rate of the segments
+    # @param size - width, height of the frames
+    # @param segment_secs - capture time covered by a segment, 0 for no limit
+    # @param segment_mb - size of a segment in megabytes, 0 for no limit
+    # @param quota_mb - total size of the segments in megabytes, 0 for no limit
+    # @param passthrough - the frames are JPEG data written as they are into raw MJPEG segments,
+    #                      fourcc, fps and size are then unused
+    # @param telemetry - keep a TelemetryLog per segment, e.g. recording_00000.tlm, in self.telemetry_log
+    def __init__(self, path, fourcc, fps, size, segment_secs=0, segment_mb=0, quota_mb=0, passthrough=False,
+                 telemetry=False):
+        self.path = path
+        self.base, self.extension = os.path.splitext(path)
+        self.index_path = self.base + self.INDEX_SUFFIX
+        self.fourcc = fourcc
+        self.fps = fps
+        self.size = tuple(size)
+        self.segment_ns = int(segment_secs * 1e9)
+        self.segment_bytes = int(segment_mb * 1e6)
+        self.quota_bytes = int(quota_mb * 1e6)
+        self.rolls = self.segment_ns > 0 or self.segment_bytes > 0
+        self.passthrough = passthrough
+        self.telemetry = telemetry
+        self.telemetry_log = None   # Log of the live segment, appended to by the tracking thread
+        self.run = uuid.uuid4().hex[:12]   # Tells this run's segments from those of earlier runs
+
+        # Statistics
+        self.created_count = 0
+        self.deleted_count = 0
+
+        # Finalized segments, oldest first. A rolling recording continues after the segments
+        # of an earlier run, which count against the quota before this run writes anything.
+        self.segments = self.load_index() if self.rolls else []
+        self.next_number = max((segment['number'] for segment in self.segments), default=-1) + 1
+        if self.apply_quota(keep=0):
+            self.write_index()
+        self.writer = None
+        self.live = None            # Index entry of the segment being written
+
+        self.open_segment()
+
+    # @brief - Reads the segments of an earlier run whose files still exist
+    # @return - list of index entries
+    def load_index(self):
+        if not os.path.exists(self.index_path):
+            return []
+        segments = []
+        with open(self.index_path) as index:
+            for line in index:
+                try:
+                    segment = json.loads(line)
+                except ValueError:
+                    continue
+                if os.path.exists(os.path.join(os.path.dirname(self.path), segment['file'])):
+                    segments.append(segment)
+        return segments
+
+    def segment_path(self, number):
+        return f"{self.base}_{number:05d}{self.extension}" if self.rolls else self.path
+
+    def telemetry_path(self, number):
+        return os.path.splitext(self.segment_path(number))[0] + TELEMETRY_LOG_SUFFIX
+
+    def open_segment(self):
+        path = self.segment_path(self.next_number)
+        if self.passthrough:
+            self.writer = MjpegWriter(path)
+        else:
+            self.writer = cv2.VideoWriter(path, self.fourcc, self.fps, self.size)
+        self.live = {'number': self.next_number, 'run': self.run, 'file': os.path.basename(path), 'frames': 0,
+                     'first_seq': 0, 'last_seq': 0, 'first_ns': 0, 'last_ns': 0, 'bytes': 0}
+        if self.telemetry:
+            self.live['telemetry'] = os.path.basename(self.telemetry_path(self.next_number))
+            if self.telemetry_log is None:
+                self.telemetry_log = TelemetryLog(self.telemetry_path(self.next_number))
+        self.next_number += 1
+        self.created_count += 1
+
+    def is_opened(self):
+        return self.writer is not None and self.writer.isOpened()
+
+    # @brief - Writes a frame, rolling over to a new segment first if the live one is full
+    # @param frame - BGR frame of the writer's size, or the JPEG data when passing through
+    # @param seq - frame sequence number for the index
+    # @param capture_ns - monotonic capture time for the index, 0 for now
+    def write(self, frame, seq=0, capture_ns=0):
+        capture_ns = capture_ns or time.monotonic_ns()
+        if self.live['frames'] and self.is_full(capture_ns):
+            self.finalize_segment(last=False)
+            self.open_segment()
+
+        self.writer.write(frame)
+        if self.live['frames'] == 0:
+            self.live['first_seq'] = seq
+            self.live['first_ns'] = capture_ns
+        self.live['last_seq'] = seq
+        self.live['last_ns'] = capture_ns
+        self.live['frames'] += 1
+
+    def is_full(self, capture_ns):
+        if self.segment_ns and capture_ns - self.live['first_ns'] >= self.segment_ns:
+            return True
+        return bool(self.segment_bytes) and self.live_bytes() >= self.segment_bytes
+
+    def live_bytes(self):
+        try:
+            return os.path.getsize(self.segment_path(self.live['number']))
+        except OSError:
+            return 0
+
+    # @brief - Finalizes the live segment, syncs it to disk, then indexes it and applies the quota
+    # @param last - no segment follows, the telemetry log is closed rather than moved on
+    def finalize_segment(self, last=True):
+        self.writer.release()
+        self.writer = None
+
+        # The log moves on to the next segment's file after this segment's last frame
+        if self.telemetry_log is not None:
+            self.telemetry_log.roll(None if last else self.telemetry_path(self.next_number), self.live['last_seq'])
+
+        files = [self.live['file']] + ([self.live['telemetry']] if self.telemetry else [])
+        paths = [os.path.join(os.path.dirname(self.path), file) for file in files]
+        if self.live['frames'] == 0:
+            # Nothing was recorded, an empty segment is not worth keeping
+            if self.rolls:
+                for path in paths:
+                    if os.path.exists(path):
+                        os.remove(path)
+            return
+
+        for path in paths:
+            sync_file(path)
+        self.live['bytes'] = sum(os.path.getsize(path) for path in paths)
+        self.segments.append(self.live)
+        self.apply_quota()
+        self.write_index()
+
+    # @brief - Deletes the oldest segments until the finalized ones fit the quota
+    # @param keep - newest segments kept even over the quota
+    # @return - number of segments deleted
+    def apply_quota(self, keep=1):
+        if not self.quota_bytes:
+            return 0
+        deleted = 0
+        total = sum(segment['bytes'] for segment in self.segments)
+        while len(self.segments) > keep and total > self.quota_bytes:
+            oldest = self.segments.pop(0)
+            total -= oldest['bytes']
+            for file in (oldest['file'], oldest.get('telemetry')):
+                if file is None:
+                    continue
+                try:
+                    os.remove(os.path.join(os.path.dirname(self.path), file))
+                except OSError as e:
+                    print(f"[Segmented Writer] Error deleting {file}: {e}")
+            deleted += 1
+        self.deleted_count += deleted
+        return deleted
+
+    # @brief - Replaces the index with the current segments, a crash leaves the old or the new one
+    def write_index(self):
+        temporary_path = self.index_path + '.tmp'
+        with open(temporary_path, 'w') as index:
+            for segment in self.segments:
+                index.write(json.dumps(segment) + '\n')
+            index.flush()
+            os.fsync(index.fileno())
+        os.replace(temporary_path, self.index_path)
+        sync_directory(os.path.dirname(os.path.abspath(self.index_path)))
+
+    # @brief - Finalizes the live segment
+    def release(self):
+        if self.writer is not None:
+            self.finalize_segment()
+
+    # @brief - Gets the segment statistics
+    # @return - dict of statistics
+    def get_stats(self):
+        return {
+            'segments': len(self.segments),
+            'created': self.created_count,
+            'deleted': self.deleted_count,
+            'stored_mb': sum(segment['bytes'] for segment in self.segments) / 1e6,
+            'live_frames': self.live['frames'] if self.writer is not None else 0,
+        }
+
+
+# @brief - Flushes a file's data to disk
+# @param path - the file
+def sync_file(path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+# @brief - Flushes a directory entry to disk so a rename survives a crash, where the OS supports it
+# @param path - the directory
+def sync_directory(path):
+    if not hasattr(os, 'O_DIRECTORY'):
+        return
+    fd = os.open(path, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
@@ -0,0 +1,251 @@
+import socket
+import struct
+import threading
+import time
+
+
+# RTCP packet types carrying reception report blocks
+RTCP_SENDER_REPORT = 200
+RTCP_RECEIVER_REPORT = 201
+RTCP_HEADER = struct.Struct('!BBH')
+RTCP_REPORT_BLOCK_SIZE = 24
+
+
+# @brief - Reads the loss reported by the receivers of a compound RTCP packet
+# @param packet - bytes of the RTCP packet
+# @return - the highest fraction lost of its report blocks, 0 to 1, None if it has none
+def parse_rtcp_loss(packet):
+    loss = None
+    offset = 0
+    while offset + RTCP_HEADER.size <= len(packet):
+        first, packet_type, length = RTCP_HEADER.unpack_from(packet, offset)
+        end = offset + (length + 1) * 4
+        if first >> 6 != 2 or end > len(packet):
+            break
+
+        # Report blocks follow the sender SSRC, and the sender info of a sender report
+        if packet_type in (RTCP_SENDER_REPORT, RTCP_RECEIVER_REPORT):
+            block = offset + (28 if packet_type == RTCP_SENDER_REPORT else 8)
+            for _ in range(first & 0x1F):
+                if block + RTCP_REPORT_BLOCK_SIZE > end:
+                    break
+                fraction = packet[block + 4] / 256
+                loss = fraction if loss is None else max(loss, fraction)
+                block += RTCP_REPORT_BLOCK_SIZE
+        offset = end
+    return loss
+
+
+class StreamController:
+    DEFAULT_INTERVAL_SECS = 0.5     # Measurement window between adjustments
+    DEFAULT_MIN_QUALITY = 30
+    DEFAULT_MAX_QUALITY = 85
+    DEFAULT_QUALITY_STEP = 10
+    DEFAULT_LEVELS = 2              # Pyramid levels the stream may drop below its configured level
+    DEFAULT_MAX_DECIMATION = 6      # Stream at least every this many frames
+    DEFAULT_QUEUE_LIMIT_BYTES = 64 * 1024   # Socket send queue that counts as congestion
+    LOSS_LIMIT = 0.02               # Reported loss that counts as congestion
+    STEP_UP_MARGIN = 0.9            # A step up must be expected to stay below this share of the ceiling
+    STEP_UP_HOLD = 2                # Windows without congestion before stepping up
+
+    # Expected bitrate growth of one step up, JPEG size goes with the pixel count and weakly with quality
+    LEVEL_GROWTH = 4.0
+    QUALITY_GROWTH = 1.2
+
+    # @brief - Holds the stream under a bitrate ceiling by trading JPEG quality, then
+    #          resolution, then frame rate. The encoded size of each frame, the socket send
+    #          queue and the loss in RTCP receiver reports are measured over a window, a
+    #          congested window steps the operating point down and a window with enough
+    #          headroom for the next step up steps it back up. Thread safe.
+    # @param ceiling_kbps - bitrate ceiling of the stream
+    # @param levels - pyramid levels below the configured stream level the stream may drop to, 0 keeps the resolution
+    # @param adjust_quality - the encoder quality can be changed, off for JPEG passed through as it is
+    # @param rtcp_port - local port receiving RTCP receiver reports, 0 for none
+    # @param interval_secs - measurement window between adjustments
+    def __init__(self, ceiling_kbps, levels=DEFAULT_LEVELS, adjust_quality=True, rtcp_port=0,
+                 interval_secs=DEFAULT_INTERVAL_SECS):
+        self.lock = threading.Lock()
+        self.ceiling_bps = ceiling_kbps * 1000
+        self.max_downscale = max(0, levels)
+        self.adjust_quality = adjust_quality
+        self.interval_ns = int(interval_secs * 1e9)
+
+        # Operating point, starting at the best the stream can do. The stream is sent downscale
+        # pyramid levels below its configured level.
+        self.quality = self.DEFAULT_MAX_QUALITY
+        self.downscale = 0
+        self.decimation = 1
+
+        # Current window
+        self.window_start_ns = None
+        self.window_bytes = 0
+        self.window_queue_bytes = 0
+        self.window_loss = 0.0
+        self.clear_windows = 0
+        self.offered = 0
+
+        # Receiver reports arrive on a non-blocking socket read at each adjustment
+        self.rtcp_socket = None
+        if rtcp_port:
+            self.rtcp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.rtcp_socket.bind(('0.0.0.0', rtcp_port))
+            self.rtcp_socket.setblocking(False)
+
+        # Statistics
+        self.bitrate_bps = 0.0
+        self.loss = 0.0
+        self.send_queue_bytes = 0
+        self.step_downs = 0
+        self.step_ups = 0
+        self.skipped_count = 0
+        self.rtcp_reports = 0
+
+    # @brief - Decides if a frame offered to the stream is sent at the current decimation
+    # @return - True to send the frame
+    def should_send(self):
+        with self.lock:
+            self.offered += 1
+            if self.offered % self.decimation:
+                self.skipped_count += 1
+                return False
+            return True
+
+    # @brief - Counts an encoded frame, called from the encoder's thread
+    # @param nbytes - size of the encoded frame
+    def add_frame(self, nbytes):
+        with self.lock:
+            self.window_bytes += nbytes
+
+    # @brief - Reports the socket send queue occupancy
+    # @param nbytes - bytes waiting in the socket, None if unknown
+    def report_send_queue(self, nbytes):
+        if nbytes is None:
+            return
+        with self.lock:
+            self.window_queue_bytes = max(self.window_queue_bytes, nbytes)
+
+    # @brief - Reports the loss seen by a receiver
+    # @param fraction - fraction of packets lost, 0 to 1
+    def report_loss(self, fraction):
+        with self.lock:
+            self.window_loss = max(self.window_loss, fraction)
+            self.rtcp_reports += 1
+
+    def set_ceiling(self, ceiling_kbps):
+        with self.lock:
+            self.ceiling_bps = ceiling_kbps * 1000
+            self.clear_windows = 0
+
+    # @brief - Closes the window once it is over and adjusts the operating point
+    # @param now_ns - monotonic time in ns, taken here if None
+    # @return - True if the operating point changed
+    def update(self, now_ns=None):
+        if now_ns is None:
+            now_ns = time.monotonic_ns()
+        self.poll_rtcp()
+
+        with self.lock:
+            if self.window_start_ns is None:
+                self.window_start_ns = now_ns
+                return False
+            elapsed_ns = now_ns - self.window_start_ns
+            if elapsed_ns < self.interval_ns:
+                return False
+
+            self.bitrate_bps = self.window_bytes * 8 * 1e9 / elapsed_ns
+            self.send_queue_bytes = self.window_queue_bytes
+            self.loss = self.window_loss
+            self.window_start_ns = now_ns
+            self.window_bytes = 0
+            self.window_queue_bytes = 0
+            self.window_loss = 0.0
+
+            congested = (self.bitrate_bps > self.ceiling_bps or self.send_queue_bytes > self.DEFAULT_QUEUE_LIMIT_BYTES
+                         or self.loss > self.LOSS_LIMIT)
+            if congested:
+                self.clear_windows = 0
+                return self.step_down()
+
+            self.clear_windows += 1
+            if self.clear_windows >= self.STEP_UP_HOLD:
+                self.clear_windows = 0
+                return self.step_up()
+            return False
+
+    # @brief - Lowers quality first, then resolution, then frame rate
+    def step_down(self):
+        if self.adjust_quality and self.quality > self.DEFAULT_MIN_QUALITY:
+            self.quality = max(self.DEFAULT_MIN_QUALITY, self.quality - self.DEFAULT_QUALITY_STEP)
+        elif self.downscale < self.max_downscale:
+            self.downscale += 1
+        elif self.decimation < self.DEFAULT_MAX_DECIMATION:
+            self.decimation += 1
+        else:
+            return False
+        self.step_downs += 1
+        return True
+
+    # @brief - Restores frame rate first, then resolution, then quality, while the
+    #          expected bitrate after the step stays under the ceiling
+    def step_up(self):
+        budget = self.ceiling_bps * self.STEP_UP_MARGIN
+        if self.decimation > 1:
+            if self.bitrate_bps * self.decimation / (self.decimation - 1) > budget:
+                return False
+            self.decimation -= 1
+        elif self.downscale > 0:
+            if self.bitrate_bps * self.LEVEL_GROWTH > budget:
+                return False
+            self.downscale -= 1
+        elif self.adjust_quality and self.quality < self.DEFAULT_MAX_QUALITY:
+            if self.bitrate_bps * self.QUALITY_GROWTH > budget:
+                return False
+            self.quality = min(self.DEFAULT_MAX_QUALITY, self.quality + self.DEFAULT_QUALITY_STEP)
+        else:
+            return False
+        self.step_ups += 1
+        return True
+
+    def poll_rtcp(self):
+        if self.rtcp_socket is None:
+            return
+        while True:
+            try:
+                packet = self.rtcp_socket.recv(1500)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as e:
+                print(f"[Stream Controller] RTCP socket error: {e}")
+                return
+            loss = parse_rtcp_loss(packet)
+            if loss is not None:
+                self.report_loss(loss)
+
+    # @brief - Gets the operating point
+    # @return - quality, levels below the configured stream level, decimation
+    def get_operating_point(self):
+        with self.lock:
+            return self.quality, self.downscale, self.decimation
+
+    def close(self):
+        if self.rtcp_socket is not None:
+            self.rtcp_socket.close()
+            self.rtcp_socket = None
+
+    # @brief - Gets the operating point and the last window's measurements
+    # @return - dict of statistics
+    def get_stats(self):
+        with self.lock:
+            return {
+                'ceiling_kbps': self.ceiling_bps / 1000,
+                'bitrate_kbps': self.bitrate_bps / 1000,
+                'quality': self.quality,
+                'downscale': self.downscale,
+                'decimation': self.decimation,
+                'send_queue_bytes': self.send_queue_bytes,
+                'loss': self.loss,
+                'step_downs': self.step_downs,
+                'step_ups': self.step_ups,
+                'skipped': self.skipped_count,
+                'rtcp_reports': self.rtcp_reports,
+            }
@@ -0,0 +1,136 @@
+import threading
+
+
+class StreamSink:
+    DEFAULT_QUALITY = 85
+
+    # @brief - The stream output, opened the first time a frame is streamed after it is
+    #          enabled and released when it is disabled, so an idle stream holds no encoder,
+    #          threads or buffers. Changing the destination or level releases the streamer
+    #          and the next frame opens it with the new configuration, capture keeps running.
+    #          Thread safe, the streamer is only used under the sink's lock.
+    # @param open_streamer - callable(host, port, level) returning a stream writer with
+    #                        isOpened(), write() and release()
+    # @param host - address to stream to, empty until configured
+    # @param port - port to stream to
+    # @param level - pyramid level streamed
+    # @param max_level - deepest pyramid level that can be configured
+    # @param enabled - stream from the start
+    # @param quality - JPEG quality of the stream, for writers that encode
+    def __init__(self, open_streamer, host='', port=0, level=0, max_level=0, enabled=False, quality=DEFAULT_QUALITY):
+        self.open_streamer = open_streamer
+        self.lock = threading.Lock()
+        self.host = host
+        self.port = int(port)
+        self.max_level = max_level
+        self.level = min(max(0, level), max_level)
+        self.enabled = enabled
+        self.quality = quality
+        self.streamer = None
+        self.failed = False         # Opening failed for this configuration, retried once it changes
+
+        # Statistics
+        self.opened_count = 0
+        self.closed_count = 0
+        self.written_count = 0
+
+    # @brief - Checked before a frame is queued for the stream, a disabled sink is never handed frames
+    # @return - True if streaming is enabled
+    def is_enabled(self) -> bool:
+        return self.enabled
+
+    # @brief - Enables or disables streaming, disabling releases the streamer right away
+    # @param enabled - bool - stream or not
+    def set_enabled(self, enabled):
+        with self.lock:
+            if enabled == self.enabled:
+                return
+            self.enabled = enabled
+            self.failed = False
+            if not enabled:
+                self.close_streamer()
+            print(f"[Stream Sink] Streaming {'enabled' if enabled else 'disabled'}")
+
+    # @brief - Changes the stream configuration, the streamer reopens on the next frame
+    # @param host - address to stream to, None to keep it
+    # @param port - port to stream to, None to keep it
+    # @param level - pyramid level streamed, None to keep it
+    def configure(self, host=None, port=None, level=None):
+        with self.lock:
+            if host is not None:
+                self.host = host
+            if port is not None:
+                self.port = int(port)
+            if level is not None:
+                self.level = min(max(0, level), self.max_level)
+            self.failed = False
+            self.close_streamer()
+            print(f"[Stream Sink] Configured to {self.host}:{self.port} at level {self.level}")
+
+    # @brief - Sets the JPEG quality, applied by the next write without reopening the stream
+    # @param quality - 1 to 100
+    def set_quality(self, quality):
+        self.quality = min(max(1, int(quality)), 100)
+
+    # @brief - Hands the streamer to a write, opening it first if needed
+    # @param write - callable(streamer, level, quality) writing the frame
+    # @return - True if the write ran
+    def write(self, write):
+        with self.lock:
+            if not self.enabled or self.failed:
+                return False
+            if self.streamer is None and not self.open():
+                return False
+            write(self.streamer, self.level, self.quality)
+            self.written_count += 1
+        return True
+
+    def open(self):
+        if not self.host or not self.port:
+            print("[Stream Sink] No stream destination configured")
+            self.failed = True
+            return False
+        try:
+            streamer = self.open_streamer(self.host, self.port, self.level)
+        except Exception as e:
+            print(f"[Stream Sink] Error opening the stream: {e}")
+            streamer = None
+        if streamer is None or not streamer.isOpened():
+            print(f"[Stream Sink] Failed to open the stream to {self.host}:{self.port}")
+            if streamer is not None:
+                streamer.release()
+            self.failed = True
+            return False
+        self.streamer = streamer
+        self.opened_count += 1
+        return True
+
+    def close_streamer(self):
+        if self.streamer is not None:
+            self.streamer.release()
+            if hasattr(self.streamer, 'get_stats'):
+                print(f"[Stream Sink] Closed the stream: {self.streamer.get_stats()}")
+            self.streamer = None
+            self.closed_count += 1
+
+    # @brief - Releases the streamer for good
+    def close(self):
+        with self.lock:
+            self.enabled = False
+            self.close_streamer()
+
+    # @brief - Gets the sink statistics, with the streamer's own when it has them
+    # @return - dict of statistics
+    def get_stats(self):
+        with self.lock:
+            return {
+                'enabled': self.enabled,
+                'destination': f"{self.host}:{self.port}",
+                'level': self.level,
+                'quality': self.quality,
+                'open': self.streamer is not None,
+                'opened': self.opened_count,
+                'closed': self.closed_count,
+                'written': self.written_count,
+                'streamer': self.streamer.get_stats() if hasattr(self.streamer, 'get_stats') else None,
+            }
@@ -1,90 +1,357 @@
+import collections
+import itertools
+import selectors
 import socket
 import threading
+import time
+from modules.framing import FrameDecoder, encode_frame
+
+
+class OverflowPolicy:
+    COALESCE = 'coalesce'           # Replace everything not yet being sent with the newest message
+    DROP_OLDEST = 'drop-oldest'     # Drop the oldest message not yet being sent
+    DISCONNECT = 'disconnect'       # Disconnect the client once its backlog is full or too old
+    ALL = (COALESCE, DROP_OLDEST, DISCONNECT)
+
+
+class ClientConnection:
+    def __init__(self, client_socket, address):
+        self.socket = client_socket
+        self.address = address
+        self.outbound = collections.deque()     # [memoryview, enqueue_ns] per queued message
+        self.head_offset = 0                    # Bytes of the first queued message already sent
+        self.decoder = FrameDecoder()
+        self.closing = False
+
+        # Statistics
+        self.bytes_queued = 0
+        self.bytes_sent = 0
+        self.send_calls = 0
+        self.messages_sent = 0
+        self.messages_dropped = 0
+        self.total_latency_ns = 0
+        self.max_latency_ns = 0
+
+    # @brief - Queues a message applying the overflow policy
+    # @return - False if the client should be disconnected
+    def enqueue(self, message, now_ns, max_queue, policy, disconnect_after_ns) -> bool:
+        if self.closing:
+            return False
+
+        if len(self.outbound) >= max_queue:
+            if policy == OverflowPolicy.DISCONNECT:
+                return False
+
+            # Never touch a message that is partially written or the stream would be corrupted
+            keep = 1 if self.head_offset else 0
+            drop = len(self.outbound) - keep if policy == OverflowPolicy.COALESCE else 1
+            drop = min(drop, len(self.outbound) - keep)
+            for _ in range(drop):
+                dropped, _ = self.outbound[keep]
+                del self.outbound[keep]
+                self.bytes_queued -= len(dropped)
+                self.messages_dropped += 1
+
+            # Every message still queued is partially sent, drop the new one instead
+            if len(self.outbound) >= max_queue:
+                self.messages_dropped += 1
+                return True
+
+        elif policy == OverflowPolicy.DISCONNECT and self.outbound:
+            if now_ns - self.outbound[0][1] > disconnect_after_ns:
+                return False
+
+        self.outbound.append([memoryview(message), now_ns])
+        self.bytes_queued += len(message)
+        return True
+
+    # @brief - Records that the first queued message was fully written
+    def complete_head(self, now_ns):
+        message, queued_ns = self.outbound.popleft()
+        self.head_offset = 0
+        self.bytes_queued -= len(message)
+        self.messages_sent += 1
+        self.total_latency_ns += now_ns - queued_ns
+        self.max_latency_ns = max(self.max_latency_ns, now_ns - queued_ns)
+
+    def get_stats(self):
+        return {
+            'address': self.address,
+            'queued': len(self.outbound),
+            'bytes_queued': self.bytes_queued,
+            'bytes_sent': self.bytes_sent,
+            'send_calls': self.send_calls,
+            'sent': self.messages_sent,
+            'dropped': self.messages_dropped,
+            'avg_latency_ms': self.total_latency_ns / max(1, self.messages_sent) / 1e6,
+            'max_latency_ms': self.max_latency_ns / 1e6,
+        }
 
 
 class TCPServer(threading.Thread):
     DEFAULT_TIMEOUT_SECS = 3
+    RECV_SIZE = 1024
+    MAX_RECEIVED_MESSAGES = 100
+    DEFAULT_MAX_QUEUE = 16
+    DEFAULT_DISCONNECT_AFTER_MS = 2000
+    DEFAULT_BATCH_WINDOW_US = 5000
+    MAX_SEND_BUFFERS = 64
 
-    def __init__(self, host, port, message_handler):
+    # @param host - address to bind on
+    # @param port - port to bind on
+    # @param message_handler - callable receiving data sent by clients, None to keep it for receive_message
+    # @param max_queue - maximum number of messages queued per client
+    # @param overflow_policy - OverflowPolicy applied to a client whose queue is full
+    # @param disconnect_after_ms - backlog age that disconnects a client under OverflowPolicy.DISCONNECT
+    # @param batch_count - messages to accumulate per client before flushing, 1 disables batching
+    # @param batch_window_us - longest time a message waits for its batch to fill, 0 disables the window
+    #                          (defaults to DEFAULT_BATCH_WINDOW_US when batch_count is above 1)
+    def __init__(self, host, port, message_handler, max_queue=DEFAULT_MAX_QUEUE,
+                 overflow_policy=OverflowPolicy.COALESCE, disconnect_after_ms=DEFAULT_DISCONNECT_AFTER_MS,
+                 batch_count=1, batch_window_us=0):
         super().__init__()
+        if overflow_policy not in OverflowPolicy.ALL:
+            raise ValueError(f"Unknown overflow policy: {overflow_policy}")
         self.host = host
         self.port = port
         self.message_handler = message_handler
+        self.max_queue = max(1, max_queue)
+        self.overflow_policy = overflow_policy
+        self.disconnect_after_ns = disconnect_after_ms * 1_000_000
+        self.batch_count = min(max(1, batch_count), self.max_queue)
+        if self.batch_count > 1 and batch_window_us <= 0:
+            batch_window_us = self.DEFAULT_BATCH_WINDOW_US
+        elif self.batch_count == 1 and batch_window_us > 0:
+            # Only a window was requested, batches are then bounded by the queue size
+            self.batch_count = self.max_queue
+        self.batch_window_ns = max(0, batch_window_us) * 1_000
+        self.batch_deadline_ns = None
         self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.clients = []
+        self.selector = selectors.DefaultSelector()
+        self.clients = {}
+        self.received = collections.deque(maxlen=self.MAX_RECEIVED_MESSAGES)
+        self.lock = threading.Lock()
         self.running = True
 
+        # Lets other threads wake the selector when they queue outbound data or stop the server
+        self.wake_reader, self.wake_writer = socket.socketpair()
+        self.wake_reader.setblocking(False)
+        self.wake_writer.setblocking(False)
+
     def run(self):
-        self.server_socket.bind((self.host, self.port))
-        self.server_socket.listen(5)
-        print(f"[TCP Server] Started on {self.host}:{self.port}")
-        self.accept_clients()
-
-    def accept_clients(self):
-        self.server_socket.settimeout(self.DEFAULT_TIMEOUT_SECS)
-        
-        while self.running:
-            try:
-                client_socket, client_address = self.server_socket.accept()
-                if self.running:  # Check if the server is still running
-                    print(f"[TCP Server] Connection established with {client_address}")
-                    client_thread = threading.Thread(target=self.handle_client, args=(client_socket,))
-                    client_thread.start()
-                    self.clients.append((client_socket, client_thread))
-                else:
-                    # If the server is not running, close the client socket
-                    client_socket.close()
-            except socket.timeout:
+        try:
+            self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self.server_socket.bind((self.host, self.port))
+            self.server_socket.listen(5)
+            self.server_socket.setblocking(False)
+            self.selector.register(self.server_socket, selectors.EVENT_READ)
+            self.selector.register(self.wake_reader, selectors.EVENT_READ)
+            print(f"[TCP Server] Started on {self.host}:{self.port}")
+
+            while self.running:
+                for key, mask in self.selector.select(self.get_select_timeout()):
+                    if key.fileobj is self.server_socket:
+                        self.accept_client()
+                    elif key.fileobj is self.wake_reader:
+                        self.handle_wake()
+                    else:
+                        self.handle_client(key.data, mask)
+
+                # Flush every partial batch once its window has expired
+                with self.lock:
+                    expired = self.batch_deadline_ns is not None and time.monotonic_ns() >= self.batch_deadline_ns
+                    if expired:
+                        self.batch_deadline_ns = None
+                if expired:
+                    self.watch_pending_clients(flush_partial=True)
+        except Exception as e:
+            print(f"[TCP Server] An error occurred: {e}")
+        finally:
+            for client in list(self.clients.values()):
+                self.remove_client(client)
+            self.selector.close()
+            self.server_socket.close()
+            self.wake_reader.close()
+            self.wake_writer.close()
+
+    def accept_client(self):
+        try:
+            client_socket, client_address = self.server_socket.accept()
+        except BlockingIOError:
+            return
+        except Exception as e:
+            print(f"[TCP Server] Error accepting client connection: {e}")
+            return
+
+        print(f"[TCP Server] Connection established with {client_address}")
+        client_socket.setblocking(False)
+        client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        client = ClientConnection(client_socket, client_address)
+        with self.lock:
+            self.clients[client_socket] = client
+        self.selector.register(client_socket, selectors.EVENT_READ, client)
+
+    def handle_wake(self):
+        try:
+            while self.wake_reader.recv(self.RECV_SIZE):
                 pass
+        except BlockingIOError:
+            pass
+
+        self.watch_pending_clients(flush_partial=False)
+
+    # @brief - Drops slow clients and starts watching for writability on every client ready to send
+    # @param flush_partial - send queued messages even if they have not filled a batch
+    def watch_pending_clients(self, flush_partial):
+        with self.lock:
+            ready = self.batch_count if not flush_partial else 1
+            closing = [client for client in self.clients.values() if client.closing]
+            pending = [client for client in self.clients.values() if len(client.outbound) >= ready and not client.closing]
+        for client in closing:
+            print(f"[TCP Server] Disconnecting slow client {client.address}: {client.get_stats()}")
+            self.remove_client(client)
+        for client in pending:
+            self.selector.modify(client.socket, selectors.EVENT_READ | selectors.EVENT_WRITE, client)
+
+    def handle_client(self, client, mask):
+        if mask & selectors.EVENT_READ:
+            try:
+                data = client.socket.recv(self.RECV_SIZE)
+            except BlockingIOError:
+                data = None
             except Exception as e:
-                print(f"[TCP Server] Error accepting client connection: {e}")
-                
-        # Close the server socket after all client connections have been processed
-        self.server_socket.close()
-
-    def handle_client(self, client_socket):
-        client_socket.settimeout(self.DEFAULT_TIMEOUT_SECS)
-        while True:
+                print(f"[TCP Server] Error handling client: {e}")
+                self.remove_client(client)
+                return
+
+            if data == b'':
+                # If no data is received, client has disconnected
+                print(f"[TCP Server] Client {client.address} disconnected")
+                self.remove_client(client)
+                return
+
+            if data:
+                try:
+                    messages = client.decoder.feed(data)
+                except ValueError as e:
+                    print(f"[TCP Server] Dropping client {client.address}: {e}")
+                    self.remove_client(client)
+                    return
+
+                # Pass each received message to the message handler, or keep it for receive_message
+                for message in messages:
+                    if self.message_handler is not None:
+                        self.message_handler(message)
+                    else:
+                        self.received.append(message)
+
+        if mask & selectors.EVENT_WRITE:
+            self.flush_client(client)
+
+    # @brief - Writes as much of a client's queued data as the socket accepts without blocking
+    # @param client - the ClientConnection to flush
+    def flush_client(self, client):
+        failed = False
+        with self.lock:
             try:
-                data = client_socket.recv(1024)
-                if not data:
-                    # If no data is received, client has disconnected
-                    print(f"[TCP Server] Client {client_socket.getpeername()} disconnected")
-                    break  # Exit the loop to stop handling this client
-                # Pass the received data to the message handler
-                self.message_handler(data)
-            except socket.timeout:
-                # Handle timeout (no data received within the timeout period)
+                while client.outbound:
+                    sent = self.send_queued(client)
+                    client.send_calls += 1
+                    client.bytes_sent += sent
+
+                    # Retire every message the write completed
+                    now_ns = time.monotonic_ns()
+                    while client.outbound and sent >= len(client.outbound[0][0]) - client.head_offset:
+                        sent -= len(client.outbound[0][0]) - client.head_offset
+                        client.complete_head(now_ns)
+                    client.head_offset += sent
+                    if client.outbound and sent:
+                        break
+            except BlockingIOError:
                 pass
             except Exception as e:
-                print(f"[TCP Server] Error handling client: {e}")
-                break  # Exit the loop if an error occurs
+                print(f"[TCP Server] Error sending to client {client.address}: {e}")
+                failed = True
+            pending = bool(client.outbound)
 
-        # Close the client socket and remove it from the list of active connections
-        client_socket.close()
-        self.clients.remove((client_socket, threading.current_thread()))
+        if failed:
+            self.remove_client(client)
+        elif not pending:
+            self.selector.modify(client.socket, selectors.EVENT_READ, client)
+
+    # @brief - Writes a client's queued messages with a single vectored sendmsg where available
+    # @param client - the ClientConnection to write
+    # @return - bytes written
+    def send_queued(self, client):
+        head = client.outbound[0][0][client.head_offset:]
+        if not hasattr(client.socket, 'sendmsg'):
+            return client.socket.send(head)
+
+        buffers = [head]
+        buffers.extend(message for message, _ in itertools.islice(client.outbound, 1, self.MAX_SEND_BUFFERS))
+        return client.socket.sendmsg(buffers)
+
+    def get_select_timeout(self):
+        with self.lock:
+            if self.batch_deadline_ns is None:
+                return self.DEFAULT_TIMEOUT_SECS
+            return max(0, self.batch_deadline_ns - time.monotonic_ns()) / 1e9
+
+    def remove_client(self, client):
+        with self.lock:
+            self.clients.pop(client.socket, None)
+        try:
+            self.selector.unregister(client.socket)
+        except (KeyError, ValueError):
+            pass
+        client.socket.close()
+
+    def wake(self):
+        try:
+            self.wake_writer.send(b'\x00')
+        except (BlockingIOError, OSError):
+            # Already has a pending wake up or the server is shutting down
+            pass
 
     def stop(self):
         print("[TCP Server] Stopping")
         self.running = False
-        for client_socket, client_thread in self.clients:
-            client_socket.close()
-            client_thread.join()
+        self.wake()
 
     def get_num_connections(self):
         return len(self.clients)
 
+    def get_client_stats(self):
+        with self.lock:
+            return [client.get_stats() for client in self.clients.values()]
+
+    # @brief - Queues a message for every connected client, never blocks on the network
+    # @param message - bytes to send, the length prefix is added here
     def send_message(self, message):
-        for client_socket, _ in self.clients:
-            client_socket.sendall(message)
+        message = encode_frame(message)
+        wake_needed = False
+        now_ns = time.monotonic_ns()
+        with self.lock:
+            for client in self.clients.values():
+                if not client.enqueue(message, now_ns, self.max_queue, self.overflow_policy, self.disconnect_after_ns):
+                    client.closing = True
+                    wake_needed = True
+                elif len(client.outbound) == self.batch_count:
+                    # Wake once per client when its batch fills (or its first message is queued without batching)
+                    wake_needed = True
+
+            # Start the batching window so partial batches still go out in time
+            if self.batch_window_ns and self.batch_deadline_ns is None and self.clients:
+                self.batch_deadline_ns = now_ns + self.batch_window_ns
+                wake_needed = True
+
+        if wake_needed:
+            self.wake()
 
+    # @brief - Takes the messages received while there is no message handler
+    # @return - list of str, bytes that are not UTF-8 are replaced rather than raising
     def receive_message(self):
         messages = []
-        for client_socket, _ in self.clients:
-            try:
-                data = client_socket.recv(1024)
-                if data:
-                    messages.append(data.decode())
-            except Exception as e:
-                print(f"[TCP Server] Error receiving message: {e}")
+        while self.received:
+            messages.append(self.received.popleft().decode(errors='replace'))
         return messages
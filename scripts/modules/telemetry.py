@@ -0,0 +1,132 @@
+import json
+import struct
+import time
+import numpy as np
+
+
+class TelemetryEncoding:
+    JSON = 'json'
+    BINARY = 'binary'
+    ALL = (JSON, BINARY)
+
+
+# Fixed layout binary record, little endian and naturally aligned so the C++ side
+# can copy it straight into TelemetryRecord (telemetry.h). The version byte is
+# never '{' so a receiver can tell binary records from JSON messages.
+# Capture and publish times are time.monotonic_ns() values, comparable with
+# std::chrono::steady_clock on the same host.
+BINARY_VERSION = 4
+BINARY_RECORD = struct.Struct('<BBHIIIQQ11d')  # version, flags, track_count, sequence, frame_seq, reserved, capture_ns,
+                                               # publish_ns, timestamp, azimuth, elevation, distance, driver_ms,
+                                               # azimuth_rate, elevation_rate, distance_rate,
+                                               # azimuth_var, elevation_var, distance_var
+NO_DRIVER_TIMESTAMP = -1.0                     # driver_ms when the camera does not report CAP_PROP_POS_MSEC
+NO_RATES = (0.0, 0.0, 0.0)                     # rates and variances of messages without a state estimate
+
+# The record is followed by track_count entries of the tracked targets, must match TelemetryTrack
+TRACK_DTYPE = np.dtype([('id', '<u4'), ('azimuth', '<f4'), ('elevation', '<f4'), ('distance', '<f4')])
+MAX_TRACKS = 256
+
+
+class TelemetryFlags:
+    TRACKING = 0x01     # The values describe a tracked target
+    PREDICTED = 0x02    # The values are a state estimate predicted to publish_ns, not a raw measurement
+
+
+class TelemetryEncoder:
+    def __init__(self, encoding=TelemetryEncoding.JSON):
+        if encoding not in TelemetryEncoding.ALL:
+            raise ValueError(f"Unknown telemetry encoding: {encoding}")
+        self.encoding = encoding
+        self.sequence = 0
+        self.encode = self.encode_binary if encoding == TelemetryEncoding.BINARY else self.encode_json
+
+    def next_sequence(self):
+        self.sequence = (self.sequence + 1) & 0xFFFFFFFF
+        return self.sequence
+
+    # @brief - Encodes a message, the publish time is taken here
+    # @param timestamp - seconds since midnight, kept for existing consumers
+    # @param azimuth, elevation, distance - the tracked item
+    # @param frame_seq - sequence number of the frame the values came from
+    # @param capture_ns - monotonic capture time of that frame
+    # @param driver_ms - driver timestamp of that frame, NO_DRIVER_TIMESTAMP if unavailable
+    # @param rates - azimuth, elevation and distance rates per second
+    # @param variances - azimuth, elevation and distance variances of the estimate
+    # @param flags - TelemetryFlags
+    # @param tracks - rows of track id, azimuth, elevation, distance of every tracked target
+    def encode_json(self, timestamp, azimuth, elevation, distance, frame_seq=0, capture_ns=0,
+                    driver_ms=NO_DRIVER_TIMESTAMP, rates=NO_RATES, variances=NO_RATES, flags=0, tracks=()) -> bytes:
+        data = {
+            'sequence': self.next_sequence(),   # sequence number of the message
+            'timestamp': timestamp,             # timestamp of message sending
+            'azimuth': azimuth,                 # Azimuth of the tracked item
+            'elevation': elevation,             # Elevation of the tracked item
+            'distance': distance,               # Disatnce of the tracked item
+            'frame_seq': frame_seq,             # sequence number of the processed frame
+            'capture_ns': capture_ns,           # monotonic capture time of the processed frame
+            'publish_ns': time.monotonic_ns(),  # monotonic time of message sending
+            'driver_ms': driver_ms,             # driver timestamp of the processed frame
+            'flags': flags,                     # TelemetryFlags
+            'azimuth_rate': rates[0],           # Azimuth rate of the tracked item
+            'elevation_rate': rates[1],         # Elevation rate of the tracked item
+            'distance_rate': rates[2],          # Distance rate of the tracked item
+            'covariance': list(variances),      # Azimuth, elevation and distance variances
+            'tracks': [[int(track_id), track_azimuth, track_elevation, track_distance]
+                       for track_id, track_azimuth, track_elevation, track_distance in list(tracks)[:MAX_TRACKS]]
+        }
+        return json.dumps(data).encode('utf-8')
+
+    def encode_binary(self, timestamp, azimuth, elevation, distance, frame_seq=0, capture_ns=0,
+                      driver_ms=NO_DRIVER_TIMESTAMP, rates=NO_RATES, variances=NO_RATES, flags=0, tracks=()) -> bytes:
+        tracks = np.asarray(tracks, dtype=float).reshape(-1, 4)[:MAX_TRACKS]
+        record = BINARY_RECORD.pack(BINARY_VERSION, flags, len(tracks), self.next_sequence(), frame_seq & 0xFFFFFFFF, 0,
+                                    capture_ns, time.monotonic_ns(), timestamp, azimuth, elevation, distance, driver_ms,
+                                    *rates, *variances)
+        if len(tracks) == 0:
+            return record
+
+        # Convert all tracks in one go, columns map onto the packed fields
+        packed = np.empty(len(tracks), dtype=TRACK_DTYPE)
+        for column, field in enumerate(TRACK_DTYPE.names):
+            packed[field] = tracks[:, column]
+        return record + packed.tobytes()
+
+
+# @brief - Gets the wall clock time of day for the legacy timestamp field
+# @return - seconds since local midnight with sub-second precision
+def seconds_since_midnight() -> float:
+    now = time.time()
+    local = time.localtime(now)
+    return local.tm_hour * 3600 + local.tm_min * 60 + local.tm_sec + now % 1
+
+
+# @brief - Decodes a telemetry message of either encoding, used by tools and benchmarks
+# @param payload - the message payload without the frame header
+# @return - dict with the same keys as the JSON encoding
+def decode_telemetry(payload):
+    if payload[:1] == b'{':
+        return json.loads(payload)
+
+    (version, flags, track_count, sequence, frame_seq, _, capture_ns, publish_ns, timestamp, azimuth, elevation, distance,
+     driver_ms, azimuth_rate, elevation_rate, distance_rate, *variances) = BINARY_RECORD.unpack_from(payload)
+    if version != BINARY_VERSION:
+        raise ValueError(f"Unsupported telemetry version {version}")
+    tracks = np.frombuffer(payload, dtype=TRACK_DTYPE, count=track_count, offset=BINARY_RECORD.size)
+    return {
+        'sequence': sequence,
+        'timestamp': timestamp,
+        'azimuth': azimuth,
+        'elevation': elevation,
+        'distance': distance,
+        'frame_seq': frame_seq,
+        'capture_ns': capture_ns,
+        'publish_ns': publish_ns,
+        'driver_ms': driver_ms,
+        'flags': flags,
+        'azimuth_rate': azimuth_rate,
+        'elevation_rate': elevation_rate,
+        'distance_rate': distance_rate,
+        'covariance': variances,
+        'tracks': [list(track) for track in tracks.tolist()],
+    }
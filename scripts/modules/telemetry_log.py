@@ -0,0 +1,131 @@
+import threading
+import time
+import numpy as np
+from modules.telemetry import TelemetryFlags
+
+
+# One 64 byte little endian record per tracked frame, with no file header, so a log opens with
+# np.memmap(path, dtype=TELEMETRY_LOG_DTYPE, mode='r'). Frames join with the recording on
+# seq and capture_ns, the same fields as the segment index. Both restart with every run, a log
+# only holds the frames of the run that wrote it.
+TELEMETRY_LOG_SUFFIX = '.tlm'
+TELEMETRY_LOG_DTYPE = np.dtype([
+    ('seq', '<u8'),             # Frame sequence number
+    ('capture_ns', '<u8'),      # Monotonic capture time
+    ('log_ns', '<u8'),          # Monotonic time the tracker result was logged
+    ('flags', '<u2'),           # TelemetryFlags
+    ('track_count', '<u2'),     # Number of tracked targets
+    ('reserved', '<u4'),
+    ('azimuth', '<f8'),
+    ('elevation', '<f8'),
+    ('distance', '<f8'),
+    ('driver_ms', '<f8'),       # Driver timestamp, -1 if unavailable
+])
+
+
+class TelemetryLog:
+    DEFAULT_FLUSH_RECORDS = 64  # About a second at 60 Hz, the most a crash loses
+
+    # @brief - Append-only binary log of the tracker output of every frame. Records are
+    #          filled into a preallocated block and written a block at a time, so logging
+    #          a frame is a few field assignments. Only one thread may append, in frame
+    #          order. The recorder may move the log to the file of a new segment at any time,
+    #          the records of the frames after that segment's boundary move with it.
+    # @param path - the log file, replaced if it exists
+    # @param flush_records - records buffered before they are written
+    def __init__(self, path, flush_records=DEFAULT_FLUSH_RECORDS):
+        self.lock = threading.Lock()
+        self.path = path
+        self.file = open(path, 'wb', buffering=0)
+        self.block = np.zeros(max(1, flush_records), dtype=TELEMETRY_LOG_DTYPE)
+        self.count = 0              # Records in the block
+        self.closed = False
+
+        # Statistics
+        self.logged_count = 0
+        self.flush_count = 0
+
+    # @brief - Logs the tracker output of a frame
+    # @param seq - frame sequence number
+    # @param capture_ns - monotonic capture time of the frame
+    # @param result - azimuth, elevation, distance
+    # @param found - if the tracker found the target
+    # @param track_count - number of tracked targets
+    # @param driver_ms - driver timestamp of the frame
+    def append(self, seq, capture_ns, result, found, track_count=0, driver_ms=-1.0):
+        # One tuple assignment fills the whole record
+        azimuth, elevation, distance = result
+        with self.lock:
+            if self.closed:
+                return
+            self.block[self.count] = (seq, capture_ns, time.monotonic_ns(), TelemetryFlags.TRACKING if found else 0,
+                                      track_count, 0, azimuth, elevation, distance, driver_ms)
+            self.count += 1
+            self.logged_count += 1
+            if self.count == len(self.block):
+                self.flush()
+
+    # @brief - Writes the buffered records, with the lock held
+    def flush(self):
+        if self.count:
+            self.file.write(self.block[:self.count].view(np.uint8))
+            self.count = 0
+            self.flush_count += 1
+
+    # @brief - Completes the current file and continues the log in another one. The tracker
+    #          runs ahead of the recorder, so the records after the boundary may already be
+    #          logged, they are moved from the end of the current file to the new one.
+    # @param path - the new log file, None to close the log
+    # @param last_seq - last frame sequence kept in the current file, None to keep every record
+    def roll(self, path, last_seq=None):
+        with self.lock:
+            if self.closed:
+                return
+            self.flush()
+            carried = self.take_after(last_seq) if path is not None and last_seq is not None else None
+            self.file.close()
+            if path is None:
+                self.closed = True
+                return
+            self.path = path
+            self.file = open(path, 'wb', buffering=0)
+            if carried is not None and len(carried):
+                self.file.write(carried.view(np.uint8))
+
+    # @brief - Removes the records after a frame from the end of the current file, with the lock held
+    # @param last_seq - last frame sequence kept in the file
+    # @return - array of the removed records
+    def take_after(self, last_seq):
+        # Records are appended in frame order, the ones after the boundary are the newest
+        records = read_telemetry_log(self.path)
+        keep = int(np.searchsorted(records['seq'], last_seq, side='right'))
+        carried = np.array(records[keep:])
+        del records
+        if len(carried):
+            self.file.truncate(keep * TELEMETRY_LOG_DTYPE.itemsize)
+            self.file.seek(0, 2)
+        return carried
+
+    def close(self):
+        self.roll(None)
+
+    # @brief - Gets the log statistics
+    # @return - dict of statistics
+    def get_stats(self):
+        return {
+            'logged': self.logged_count,
+            'flushes': self.flush_count,
+            'buffered': self.count,
+        }
+
+
+# @brief - Maps a telemetry log for reading without loading it
+# @param path - the log file
+# @return - NumPy memmap of TELEMETRY_LOG_DTYPE records, an empty array if the log is empty
+def read_telemetry_log(path):
+    # A crash can leave a partial record at the end, only whole records are mapped
+    with open(path, 'rb') as log:
+        count = log.seek(0, 2) // TELEMETRY_LOG_DTYPE.itemsize
+    if count == 0:
+        return np.zeros(0, dtype=TELEMETRY_LOG_DTYPE)
+    return np.memmap(path, dtype=TELEMETRY_LOG_DTYPE, mode='r', shape=(count,))
@@ -0,0 +1,91 @@
+import threading
+import time
+from modules.telemetry import NO_DRIVER_TIMESTAMP, NO_RATES, TelemetryFlags, seconds_since_midnight
+
+
+class TelemetryPublisher(threading.Thread):
+    # @brief - Publishes the state estimate on fixed deadlines, independent of the frame rate.
+    #          The tracking stage feeds measurements in, this thread wakes at every deadline
+    #          and sends the estimate predicted to it. Tracks of other targets are sent as measured.
+    # @param scheduler - fixed rate RateScheduler setting the deadlines
+    # @param estimator - ConstantVelocityKalman fusing the measurements
+    # @param encoder - TelemetryEncoder for the messages
+    # @param send_message - callable taking an encoded message, e.g. TCPServer.send_message
+    def __init__(self, scheduler, estimator, encoder, send_message):
+        super().__init__(daemon=True)
+        if scheduler.period_ns == 0:
+            raise ValueError("The telemetry publisher needs a publish rate above 0")
+        self.scheduler = scheduler
+        self.estimator = estimator
+        self.encoder = encoder
+        self.send_message = send_message
+        self.stop_event = threading.Event()
+        self.lock = threading.Lock()
+        self.frame_seq = 0
+        self.capture_ns = 0
+        self.driver_ms = NO_DRIVER_TIMESTAMP
+        self.tracks = ()
+
+        # Statistics
+        self.published_count = 0
+        self.predicted_count = 0
+        self.total_horizon_ns = 0
+        self.max_horizon_ns = 0
+
+    # @brief - Feeds the result of a tracked frame, frames without a target only update the frame fields
+    # @param captured - the CapturedFrame with its result
+    def add_measurement(self, captured):
+        with self.lock:
+            self.frame_seq = captured.seq
+            self.capture_ns = captured.capture_ns
+            self.driver_ms = captured.driver_ms
+            self.tracks = captured.tracks
+        if captured.found:
+            self.estimator.update(captured.result, captured.capture_ns)
+
+    def run(self):
+        print("[Telemetry Publisher] Started")
+        while not self.stop_event.is_set():
+            # Sleep until the next deadline and predict to it, not to whenever we woke up
+            if self.stop_event.wait(self.scheduler.seconds_until_deadline()):
+                break
+            deadline_ns = self.scheduler.next_deadline_ns
+            if self.scheduler.should_fire():
+                self.publish(deadline_ns if deadline_ns is not None else time.monotonic_ns())
+        print("[Telemetry Publisher] Stopped")
+
+    def publish(self, deadline_ns):
+        with self.lock:
+            frame_seq, capture_ns, driver_ms, tracks = self.frame_seq, self.capture_ns, self.driver_ms, self.tracks
+
+        estimate = self.estimator.predict(deadline_ns)
+        if estimate is None:
+            # No track, send zeros like the raw tracker does when it finds nothing
+            values, rates, variances, flags = NO_RATES, NO_RATES, NO_RATES, 0
+        else:
+            state, covariance = estimate
+            values, rates, variances = state[:3], state[3:], covariance.diagonal()[:3]
+            flags = TelemetryFlags.TRACKING | TelemetryFlags.PREDICTED
+            horizon_ns = deadline_ns - self.estimator.time_ns
+            self.total_horizon_ns += horizon_ns
+            self.max_horizon_ns = max(self.max_horizon_ns, horizon_ns)
+            self.predicted_count += 1
+
+        self.send_message(self.encoder.encode(seconds_since_midnight(), *values, frame_seq, capture_ns, driver_ms,
+                                              rates, variances, flags, tracks))
+        self.published_count += 1
+
+    def stop(self):
+        self.stop_event.set()
+
+    # @brief - Gets the publisher statistics. The horizon is how far past the last
+    #          measurement the published values were predicted.
+    # @return - dict of statistics
+    def get_stats(self):
+        return {
+            'published': self.published_count,
+            'predicted': self.predicted_count,
+            'avg_horizon_ms': self.total_horizon_ns / self.predicted_count / 1e6 if self.predicted_count else 0.0,
+            'max_horizon_ms': self.max_horizon_ns / 1e6,
+            'estimator': self.estimator.get_stats(),
+        }
@@ -0,0 +1,536 @@
+import math
+import time
+import cv2
+import numpy as np
+from modules.pyramid import ImagePyramid
+
+
+NO_TRACKS = np.empty((0, 4))   # get_tracks() of trackers without multiple targets
+
+
+class CameraModel:
+    DEFAULT_HFOV_DEG = 60.0
+    DEFAULT_VFOV_DEG = 45.0
+
+    # @brief - Pinhole camera model defined by its field of view, so it applies to
+    #          the full frame as well as any resized copy of it
+    # @param hfov_deg - horizontal field of view in degrees
+    # @param vfov_deg - vertical field of view in degrees
+    def __init__(self, hfov_deg=DEFAULT_HFOV_DEG, vfov_deg=DEFAULT_VFOV_DEG):
+        self.hfov_deg = hfov_deg
+        self.vfov_deg = vfov_deg
+        self.tan_half_hfov = math.tan(math.radians(hfov_deg) / 2)
+        self.tan_half_vfov = math.tan(math.radians(vfov_deg) / 2)
+
+    # @brief - Converts a pixel position to angles off the optical axis
+    # @param x, y - pixel position, may be fractional
+    # @param width, height - size of the image the position is in
+    # @return - azimuth (right positive) and elevation (up positive) in degrees
+    def pixel_to_angles(self, x, y, width, height):
+        azimuth = math.degrees(math.atan((2 * x / width - 1) * self.tan_half_hfov))
+        elevation = math.degrees(math.atan((1 - 2 * y / height) * self.tan_half_vfov))
+        return azimuth, elevation
+
+    # @brief - Converts arrays of pixel positions to angles in one go
+    # @param xs, ys - NumPy arrays of pixel positions
+    # @param width, height - size of the image the positions are in
+    # @return - arrays of azimuth and elevation in degrees
+    def pixels_to_angles(self, xs, ys, width, height):
+        azimuths = np.degrees(np.arctan((2 * xs / width - 1) * self.tan_half_hfov))
+        elevations = np.degrees(np.arctan((1 - 2 * ys / height) * self.tan_half_vfov))
+        return azimuths, elevations
+
+    # @brief - Estimates distances to targets of known size in one go
+    # @param sizes_px - NumPy array of target sizes in pixels
+    # @param target_size_m - real size of the targets in meters
+    # @param width - width of the image the sizes were measured in
+    # @return - array of distances in meters, 0 where unknown
+    def distances_from_sizes(self, sizes_px, target_size_m, width):
+        if target_size_m <= 0:
+            return np.zeros(len(sizes_px))
+        focal_px = (width / 2) / self.tan_half_hfov
+        return np.where(sizes_px > 0, target_size_m * focal_px / np.maximum(sizes_px, 1), 0.0)
+
+    # @brief - Estimates the distance to a target of known size
+    # @param size_px - size of the target in pixels
+    # @param target_size_m - real size of the target in meters
+    # @param width - width of the image the size was measured in
+    # @return - distance in meters, 0 if unknown
+    def distance_from_size(self, size_px, target_size_m, width):
+        if size_px <= 0 or target_size_m <= 0:
+            return 0.0
+        focal_px = (width / 2) / self.tan_half_hfov
+        return target_size_m * focal_px / size_px
+
+
+class Detection:
+    def __init__(self, x, y, width, height, area, cx, cy):
+        self.x = x              # Bounding box left
+        self.y = y              # Bounding box top
+        self.width = width      # Bounding box width
+        self.height = height    # Bounding box height
+        self.area = area        # Pixel count of the blob
+        self.cx = cx            # Centroid x
+        self.cy = cy            # Centroid y
+
+    # @brief - Moves the detection into the coordinates of a larger or scaled image
+    # @param dx, dy - offset added after scaling
+    # @param scale - scale factor from this image to the other one
+    # @return - a new Detection
+    def transformed(self, dx=0, dy=0, scale=1.0):
+        return Detection(self.x * scale + dx, self.y * scale + dy, self.width * scale, self.height * scale,
+                         self.area * scale * scale, self.cx * scale + dx, self.cy * scale + dy)
+
+
+class Tracker:
+    # @param camera_model - the CameraModel used to convert detections to angles
+    # @param target_size_m - real size of the target in meters, 0 disables distance estimation
+    def __init__(self, camera_model, target_size_m=0.0):
+        self.camera_model = camera_model
+        self.target_size_m = target_size_m
+        self.pyramid_levels = 1     # Pyramid levels the tracker searches, see find()
+        self.pyramid = None         # Pyramid wrapping frames that are passed in without one
+        self.found = False          # If the last track() found the target
+
+    # @brief - Finds candidate targets in an image. Implemented by each tracker.
+    # @param image - BGR image, may be a view into a larger frame
+    # @return - list of Detection in the image's coordinates, largest first
+    def detect(self, image):
+        raise NotImplementedError
+
+    # @brief - Finds candidate targets in a frame's pyramid. Trackers that search at
+    #          lower resolutions override this, the default searches level 0.
+    # @param pyramid - ImagePyramid of the frame
+    # @return - list of Detection in level 0 coordinates, largest first
+    def find(self, pyramid):
+        return self.detect(pyramid.level(0))
+
+    # @brief - Wraps a frame in the tracker's own pyramid
+    # @param frame - BGR frame
+    # @return - the ImagePyramid
+    def wrap(self, frame):
+        height, width = frame.shape[:2]
+        if self.pyramid is None or self.pyramid.size(0) != (width, height):
+            self.pyramid = ImagePyramid(width, height, self.pyramid_levels)
+        return self.pyramid.set_frame(frame)
+
+    # @brief - Converts a detection to azimuth, elevation and distance
+    # @param detection - the Detection in full frame coordinates
+    # @param width, height - size of the full frame
+    # @return - azimuth, elevation, distance
+    def measure(self, detection, width, height):
+        azimuth, elevation = self.camera_model.pixel_to_angles(detection.cx, detection.cy, width, height)
+        distance = self.camera_model.distance_from_size(max(detection.width, detection.height), self.target_size_m, width)
+        return azimuth, elevation, distance
+
+    # @brief - Tracks the largest target in a frame
+    # @param frame - BGR frame, or an ImagePyramid of it
+    # @return - azimuth, elevation, distance of the target, all 0.0 if none was found
+    def track(self, frame):
+        pyramid = frame if isinstance(frame, ImagePyramid) else self.wrap(frame)
+        return self.track_detections(self.find(pyramid), *pyramid.size(0))
+
+    # @brief - Tracks the largest target from detections made elsewhere, e.g. in a worker process
+    # @param detections - list of Detection in full frame coordinates, largest first
+    # @param width, height - size of the full frame
+    # @return - azimuth, elevation, distance of the target, all 0.0 if none was found
+    def track_detections(self, detections, width, height):
+        self.found = bool(detections)
+        if not detections:
+            return 0.0, 0.0, 0.0
+        return self.measure(detections[0], width, height)
+
+    # @brief - Gets every target tracked in the last frame, single target trackers have none
+    # @return - array of rows of track id, azimuth, elevation, distance
+    def get_tracks(self):
+        return NO_TRACKS
+
+    # @brief - Gets tracker statistics, trackers without any return an empty dict
+    # @return - dict of statistics
+    def get_stats(self):
+        return {}
+
+
+class ColorBlobTracker(Tracker):
+    DEFAULT_HSV_LOWER = (0, 150, 120)
+    DEFAULT_HSV_UPPER = (12, 255, 255)
+    DEFAULT_MIN_AREA = 20
+
+    # @brief - Finds blobs of a color range with connected components, all in OpenCV/NumPy
+    # @param camera_model - the CameraModel used to convert detections to angles
+    # @param target_size_m - real size of the target in meters, 0 disables distance estimation
+    # @param hsv_lower, hsv_upper - inclusive HSV range of the target color
+    # @param min_area - smallest blob in pixels that counts as a detection
+    def __init__(self, camera_model, target_size_m=0.0, hsv_lower=DEFAULT_HSV_LOWER, hsv_upper=DEFAULT_HSV_UPPER,
+                 min_area=DEFAULT_MIN_AREA):
+        super().__init__(camera_model, target_size_m)
+        self.hsv_lower = np.array(hsv_lower, dtype=np.uint8)
+        self.hsv_upper = np.array(hsv_upper, dtype=np.uint8)
+        self.min_area = min_area
+        self.hsv = None
+        self.mask = None
+
+    def detect(self, image):
+        # Reuse the working buffers while the image size stays the same
+        if self.hsv is None or self.hsv.shape != image.shape:
+            self.hsv = np.empty(image.shape, dtype=np.uint8)
+            self.mask = np.empty(image.shape[:2], dtype=np.uint8)
+
+        cv2.cvtColor(image, cv2.COLOR_BGR2HSV, dst=self.hsv)
+        cv2.inRange(self.hsv, self.hsv_lower, self.hsv_upper, dst=self.mask)
+        count, _, stats, centroids = cv2.connectedComponentsWithStats(self.mask, connectivity=8)
+
+        # Label 0 is the background, filter and sort the rest without a Python loop over pixels
+        areas = stats[1:count, cv2.CC_STAT_AREA]
+        keep = np.flatnonzero(areas >= self.min_area)
+        order = keep[np.argsort(areas[keep])[::-1]] + 1
+
+        return [Detection(*stats[label, :cv2.CC_STAT_AREA + 1].tolist(), *centroids[label].tolist()) for label in order]
+
+
+class RoiTracker(Tracker):
+    DEFAULT_ROI_SCALE = 4.0         # ROI side as a multiple of the target size
+    DEFAULT_MIN_ROI = 64            # Smallest ROI side in pixels
+    DEFAULT_SEARCH_LEVEL = 1        # Pyramid level of the full frame search while the target is lost
+    ROI_STEP = 32                   # ROI sides are rounded up to this so the working buffers are reused
+
+    # @brief - Wraps a tracker so it only processes a predicted region of interest
+    #          while the target is tracked, and a coarse pyramid level while it is lost
+    # @param tracker - the Tracker doing the detection
+    # @param roi_scale - ROI side as a multiple of the target size
+    # @param min_roi - smallest ROI side in pixels
+    # @param search_level - pyramid level of the full frame search, the wrapped tracker's
+    #                       minimum area applies at that level
+    def __init__(self, tracker, roi_scale=DEFAULT_ROI_SCALE, min_roi=DEFAULT_MIN_ROI,
+                 search_level=DEFAULT_SEARCH_LEVEL):
+        super().__init__(tracker.camera_model, tracker.target_size_m)
+        self.tracker = tracker
+        self.roi_scale = roi_scale
+        self.min_roi = min_roi
+        self.search_level = search_level
+        self.pyramid_levels = search_level + 1
+        self.last = None            # Last Detection in full frame coordinates, None while lost
+        self.velocity_x = 0.0       # Target motion in pixels per frame
+        self.velocity_y = 0.0
+        self.lost_ns = None         # Time the target was lost, for the reacquisition time
+
+        # Statistics
+        self.roi_width = 0
+        self.roi_height = 0
+        self.roi_frames = 0
+        self.roi_hits = 0
+        self.searches = 0
+        self.reacquisitions = 0
+        self.last_reacquire_ms = 0.0
+        self.total_reacquire_ms = 0.0
+
+    def detect(self, image):
+        return self.find(self.wrap(image))
+
+    def find(self, pyramid):
+        if self.last is not None:
+            self.roi_frames += 1
+            detections = self.detect_roi(pyramid)
+            if detections:
+                self.roi_hits += 1
+                return detections
+
+            # Lost the target, search the whole frame from now on
+            self.last = None
+            self.lost_ns = time.monotonic_ns()
+
+        return self.search(pyramid)
+
+    # @brief - Detects at full resolution inside the ROI predicted from the last position and velocity
+    # @param pyramid - ImagePyramid of the frame
+    # @return - detections in full frame coordinates, empty if the target left the ROI
+    def detect_roi(self, pyramid):
+        width, height = pyramid.size(0)
+        size = max(self.last.width, self.last.height) * self.roi_scale
+        roi_width = min(width, self.round_roi(max(self.min_roi, size + 2 * abs(self.velocity_x))))
+        roi_height = min(height, self.round_roi(max(self.min_roi, size + 2 * abs(self.velocity_y))))
+
+        # Keep the ROI size and move it inside the frame so the buffers keep their shape
+        predicted_x = self.last.cx + self.velocity_x
+        predicted_y = self.last.cy + self.velocity_y
+        x = min(max(int(predicted_x - roi_width / 2), 0), width - roi_width)
+        y = min(max(int(predicted_y - roi_height / 2), 0), height - roi_height)
+        self.roi_width = roi_width
+        self.roi_height = roi_height
+
+        # Slicing gives a view, nothing is copied
+        detections = self.tracker.detect(pyramid.level(0)[y:y + roi_height, x:x + roi_width])
+        if not detections:
+            return []
+
+        detections = [detection.transformed(x, y) for detection in detections]
+        self.velocity_x = (self.velocity_x + detections[0].cx - self.last.cx) / 2
+        self.velocity_y = (self.velocity_y + detections[0].cy - self.last.cy) / 2
+        self.last = detections[0]
+        return detections
+
+    # @brief - Searches the whole frame at a coarse level and refines the find at full resolution
+    # @param pyramid - ImagePyramid of the frame
+    # @return - detections in full frame coordinates
+    def search(self, pyramid):
+        level = min(self.search_level, pyramid.levels - 1)
+        self.searches += 1
+
+        detections = self.tracker.detect(pyramid.level(level))
+        if not detections:
+            return []
+
+        detections = [detection.transformed(scale=pyramid.scale(level)) for detection in detections]
+        self.last = detections[0]
+        self.velocity_x = 0.0
+        self.velocity_y = 0.0
+
+        # The coarse position is only good to a few pixels, keep it if the refinement misses
+        refined = self.detect_roi(pyramid) if level > 0 else []
+        if refined:
+            detections = refined
+        else:
+            self.last = detections[0]
+
+        # The refinement moved from the coarse position, not with the target, its motion starts over
+        self.velocity_x = 0.0
+        self.velocity_y = 0.0
+
+        if self.lost_ns is not None:
+            self.last_reacquire_ms = (time.monotonic_ns() - self.lost_ns) / 1e6
+            self.total_reacquire_ms += self.last_reacquire_ms
+            self.reacquisitions += 1
+            self.lost_ns = None
+        return detections
+
+    def round_roi(self, size):
+        return int(math.ceil(size / self.ROI_STEP)) * self.ROI_STEP
+
+    def get_stats(self):
+        return {
+            'tracking': self.last is not None,
+            'roi_size': (self.roi_width, self.roi_height),
+            'roi_frames': self.roi_frames,
+            'hit_rate': self.roi_hits / self.roi_frames if self.roi_frames else 0.0,
+            'searches': self.searches,
+            'reacquisitions': self.reacquisitions,
+            'last_reacquire_ms': self.last_reacquire_ms,
+            'avg_reacquire_ms': self.total_reacquire_ms / self.reacquisitions if self.reacquisitions else 0.0,
+        }
+
+
+class MultiTargetTracker(Tracker):
+    DEFAULT_MAX_TRACKS = 32
+    DEFAULT_MIN_IOU = 0.1           # Smallest overlap of a predicted track and a detection that can match
+    DEFAULT_MIN_HITS = 2            # Matches before a track is reported
+    DEFAULT_MAX_MISSES = 5          # Frames a track coasts on its velocity before it is deleted
+
+    # @brief - Tracks several targets with IDs kept across frames. All tracks live in NumPy
+    #          arrays and are predicted, matched and updated as a whole, the only Python loop
+    #          is over the overlapping track/detection pairs of the greedy assignment.
+    # @param tracker - the Tracker doing the detection
+    # @param max_tracks - most tracks kept at once
+    # @param min_iou, min_hits, max_misses - track management, see the defaults
+    # @param detect_level - pyramid level the detection runs on
+    def __init__(self, tracker, max_tracks=DEFAULT_MAX_TRACKS, min_iou=DEFAULT_MIN_IOU, min_hits=DEFAULT_MIN_HITS,
+                 max_misses=DEFAULT_MAX_MISSES, detect_level=0):
+        super().__init__(tracker.camera_model, tracker.target_size_m)
+        self.tracker = tracker
+        self.max_tracks = max_tracks
+        self.min_iou = min_iou
+        self.min_hits = min_hits
+        self.max_misses = max_misses
+        self.detect_level = detect_level
+        self.pyramid_levels = detect_level + 1
+        self.next_id = 1
+
+        # One row per track
+        self.ids = np.empty(0, dtype=np.int64)
+        self.boxes = np.empty((0, 4))           # x1, y1, x2, y2 in full frame pixels
+        self.velocities = np.empty((0, 2))      # Box motion in pixels per frame
+        self.hits = np.empty(0, dtype=np.int64)
+        self.misses = np.empty(0, dtype=np.int64)
+        self.tracks = NO_TRACKS                 # Reported tracks of the last frame
+
+        # Statistics
+        self.created_count = 0
+        self.deleted_count = 0
+        self.matched_count = 0
+        self.max_candidates = 0
+
+    def detect(self, image):
+        self.update(self.wrap(image))
+        return [Detection(x1, y1, x2 - x1, y2 - y1, (x2 - x1) * (y2 - y1), (x1 + x2) / 2, (y1 + y2) / 2)
+                for x1, y1, x2, y2 in self.boxes[self.reported()].tolist()]
+
+    def track(self, frame):
+        pyramid = frame if isinstance(frame, ImagePyramid) else self.wrap(frame)
+        self.update(pyramid)
+        return self.primary()
+
+    def track_detections(self, detections, width, height):
+        self.update_boxes(detection_boxes(detections), width, height)
+        return self.primary()
+
+    # @brief - Sets found from the reported tracks
+    # @return - azimuth, elevation, distance of the primary target, all 0.0 if there is none
+    def primary(self):
+        self.found = len(self.tracks) > 0
+        if not self.found:
+            return 0.0, 0.0, 0.0
+
+        # The longest running track is the primary target for the single target fields
+        _, azimuth, elevation, distance = self.tracks[0]
+        return float(azimuth), float(elevation), float(distance)
+
+    def get_tracks(self):
+        return self.tracks
+
+    # @brief - Indexes of the confirmed tracks, longest running first
+    def reported(self):
+        confirmed = np.flatnonzero(self.hits >= self.min_hits)
+        return confirmed[np.argsort(-self.hits[confirmed], kind='stable')]
+
+    # @brief - Predicts, matches and updates every track with the detections of a frame
+    # @param pyramid - ImagePyramid of the frame
+    def update(self, pyramid):
+        level = min(self.detect_level, pyramid.levels - 1)
+        detected = detection_boxes(self.tracker.detect(pyramid.level(level))) * pyramid.scale(level)
+        self.update_boxes(detected, *pyramid.size(0))
+
+    # @brief - Predicts, matches and updates every track with detected boxes
+    # @param detected - array of x1, y1, x2, y2 rows in full frame pixels
+    # @param width, height - size of the full frame
+    def update_boxes(self, detected, width, height):
+        # Predict every track one frame ahead and match on the overlap with the detections
+        predicted = self.boxes + np.tile(self.velocities, 2)
+        track_index, detection_index = self.associate(predicted, detected)
+
+        # Matched tracks take the detection and blend the new motion into their velocity
+        new_centers = (detected[detection_index, :2] + detected[detection_index, 2:]) / 2
+        old_centers = (self.boxes[track_index, :2] + self.boxes[track_index, 2:]) / 2
+        self.velocities[track_index] = (self.velocities[track_index] + new_centers - old_centers) / 2
+        self.boxes = predicted
+        self.boxes[track_index] = detected[detection_index]
+        self.misses += 1
+        self.misses[track_index] = 0
+        self.hits[track_index] += 1
+        self.matched_count += len(track_index)
+
+        # Drop tracks that coasted too long
+        keep = self.misses <= self.max_misses
+        self.deleted_count += len(keep) - int(keep.sum())
+        self.ids, self.boxes, self.velocities = self.ids[keep], self.boxes[keep], self.velocities[keep]
+        self.hits, self.misses = self.hits[keep], self.misses[keep]
+
+        # Unmatched detections start tracks while there is room
+        unmatched = np.ones(len(detected), dtype=bool)
+        unmatched[detection_index] = False
+        new_boxes = detected[unmatched][:max(0, self.max_tracks - len(self.ids))]
+        if len(new_boxes):
+            count = len(new_boxes)
+            self.ids = np.concatenate((self.ids, np.arange(self.next_id, self.next_id + count)))
+            self.boxes = np.concatenate((self.boxes, new_boxes))
+            self.velocities = np.concatenate((self.velocities, np.zeros((count, 2))))
+            self.hits = np.concatenate((self.hits, np.ones(count, dtype=np.int64)))
+            self.misses = np.concatenate((self.misses, np.zeros(count, dtype=np.int64)))
+            self.next_id += count
+            self.created_count += count
+
+        # Convert the confirmed tracks to angles all at once
+        reported = self.reported()
+        boxes = self.boxes[reported]
+        azimuths, elevations = self.camera_model.pixels_to_angles((boxes[:, 0] + boxes[:, 2]) / 2,
+                                                                  (boxes[:, 1] + boxes[:, 3]) / 2, width, height)
+        sizes = np.maximum(boxes[:, 2] - boxes[:, 0], boxes[:, 3] - boxes[:, 1])
+        distances = self.camera_model.distances_from_sizes(sizes, self.target_size_m, width)
+        self.tracks = np.column_stack((self.ids[reported], azimuths, elevations, distances))
+
+    # @brief - Greedy assignment on the IoU matrix, best overlaps first
+    # @param tracks - array of predicted track boxes
+    # @param detections - array of detection boxes
+    # @return - arrays of matched track indexes and detection indexes
+    def associate(self, tracks, detections):
+        empty = np.empty(0, dtype=np.int64)
+        if len(tracks) == 0 or len(detections) == 0:
+            return empty, empty
+
+        iou = box_iou(tracks, detections)
+        candidates = np.flatnonzero(iou >= self.min_iou)
+        candidates = candidates[np.argsort(-iou.ravel()[candidates], kind='stable')]
+        self.max_candidates = max(self.max_candidates, len(candidates))
+
+        # Targets rarely overlap more than one other, so this is close to one pass per track
+        track_taken = np.zeros(len(tracks), dtype=bool)
+        detection_taken = np.zeros(len(detections), dtype=bool)
+        track_index = []
+        detection_index = []
+        for track, detection in zip(*np.unravel_index(candidates, iou.shape)):
+            if not track_taken[track] and not detection_taken[detection]:
+                track_taken[track] = detection_taken[detection] = True
+                track_index.append(track)
+                detection_index.append(detection)
+        return np.array(track_index, dtype=np.int64), np.array(detection_index, dtype=np.int64)
+
+    def get_stats(self):
+        return {
+            'tracks': len(self.ids),
+            'reported': len(self.tracks),
+            'created': self.created_count,
+            'deleted': self.deleted_count,
+            'matched': self.matched_count,
+            'max_candidates': self.max_candidates,
+        }
+
+
+# @brief - Converts detections to boxes
+# @param detections - list of Detection
+# @return - array of x1, y1, x2, y2 rows
+def detection_boxes(detections):
+    return np.array([[d.x, d.y, d.x + d.width, d.y + d.height] for d in detections], dtype=float).reshape(-1, 4)
+
+
+# @brief - Intersection over union of every pair of boxes
+# @param a, b - arrays of x1, y1, x2, y2 rows
+# @return - len(a) x len(b) array
+def box_iou(a, b):
+    top_left = np.maximum(a[:, None, :2], b[None, :, :2])
+    bottom_right = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    intersection = np.prod(np.clip(bottom_right - top_left, 0, None), axis=2)
+    area_a = np.prod(a[:, 2:] - a[:, :2], axis=1)
+    area_b = np.prod(b[:, 2:] - b[:, :2], axis=1)
+    return intersection / np.maximum(area_a[:, None] + area_b[None, :] - intersection, 1e-9)
+
+
+# Trackers selectable by name, e.g. from the command line
+TRACKERS = {
+    'blob': ColorBlobTracker,
+}
+
+
+# @brief - Creates a tracker by name
+# @param name - key in TRACKERS, or 'none' for no tracking
+# @param camera_model - the CameraModel for the tracker
+# @param roi - wrap the tracker in a RoiTracker
+# @param max_tracks - wrap the tracker in a MultiTargetTracker with this many tracks, 0 for a single target
+# @param kwargs - tracker specific options
+# @return - the tracker, None for 'none'
+def create_tracker(name, camera_model, roi=False, max_tracks=0, **kwargs):
+    if name == 'none':
+        return None
+    if name not in TRACKERS:
+        raise ValueError(f"Unknown tracker: {name}")
+    tracker = TRACKERS[name](camera_model, **kwargs)
+    if max_tracks > 0:
+        return MultiTargetTracker(tracker, max_tracks)
+    return RoiTracker(tracker) if roi else tracker
+
+
+# @brief - Finds a tracker of a type in a chain of wrapping trackers
+# @param tracker - the outermost tracker, None for no tracking
+# @param tracker_type - the Tracker class to find
+# @return - the tracker, None if the chain has none of that type
+def find_tracker(tracker, tracker_type):
+    while tracker is not None and not isinstance(tracker, tracker_type):
+        tracker = getattr(tracker, 'tracker', None)
+    return tracker
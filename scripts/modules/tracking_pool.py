@@ -0,0 +1,244 @@
+import multiprocessing
+import os
+import queue
+import threading
+import time
+import cv2
+import numpy as np
+from multiprocessing import shared_memory
+from modules.tracker import Detection
+
+
+# @brief - Entry point of a tracking worker process. Detects in the frames the pool copied
+#          into the shared ring and sends back only the detections, never the frame.
+# @param tracker_factory - picklable callable creating the detecting Tracker
+# @param memory_name - name of the SharedMemory holding the ring
+# @param slots, shape - layout of the ring
+# @param tasks - queue of (slot, seq) to detect, None to exit
+# @param results - queue the (slot, seq, detection rows, detect ns) are sent to
+def run_worker(tracker_factory, memory_name, slots, shape, tasks, results):
+    # The cores are shared out between processes, not between OpenCV threads
+    cv2.setNumThreads(1)
+    memory = shared_memory.SharedMemory(name=memory_name)
+    frames = np.ndarray((slots,) + shape, dtype=np.uint8, buffer=memory.buf)
+    tracker = tracker_factory()
+    print(f"[Tracking Pool] Worker {os.getpid()} started")
+
+    try:
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+            slot, seq = task
+
+            start_ns = time.perf_counter_ns()
+            try:
+                detections = tracker.detect(frames[slot])
+            except Exception as e:
+                print(f"[Tracking Pool] Error in worker {os.getpid()}: {e}")
+                detections = []
+            rows = np.array([[d.x, d.y, d.width, d.height, d.area, d.cx, d.cy] for d in detections],
+                            dtype=float).reshape(-1, 7)
+            results.put((slot, seq, rows, time.perf_counter_ns() - start_ns))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        del frames
+        memory.close()
+
+
+class TrackingPool(threading.Thread):
+    DEFAULT_MAX_WAIT_MS = 50        # Longest finished frames are held back for an earlier one still in a worker
+    DRAIN_TIMEOUT_SECS = 2          # Longest stop() waits for the frames in the workers
+    POLL_SECS = 0.01
+
+    # @brief - Runs detection in worker processes so it is not bound by the GIL. Frames are
+    #          copied into a ring of shared memory slots and only the slot index and the
+    #          detections cross the process boundary. Results come back in any order and are
+    #          handed on in frame order from this thread, where the stateful part of the
+    #          tracker runs. Added to a Pipeline like a stage, so stopping it drains it.
+    # @param workers - number of worker processes
+    # @param shape - height, width, channels of the frames
+    # @param tracker_factory - picklable callable creating the detecting Tracker in each worker
+    # @param slots - number of ring slots, 0 for two per worker
+    # @param max_wait_ms - how long a late frame may hold back the frames after it before it is skipped
+    def __init__(self, workers, shape, tracker_factory, slots=0, max_wait_ms=DEFAULT_MAX_WAIT_MS):
+        super().__init__(name='workers', daemon=True)
+        if workers < 1:
+            raise ValueError("The tracking pool needs at least one worker")
+        self.shape = tuple(shape)
+        self.slots = slots or 2 * workers
+        self.max_wait_ns = int(max_wait_ms * 1e6)
+        self.on_result = None       # Called with each frame and its list of Detection, in frame order
+
+        # Spawn rather than fork, the parent already runs threads that a fork would copy mid-flight
+        context = multiprocessing.get_context('spawn')
+        self.memory = shared_memory.SharedMemory(create=True, size=self.slots * int(np.prod(self.shape)))
+        self.frames = np.ndarray((self.slots,) + self.shape, dtype=np.uint8, buffer=self.memory.buf)
+        self.tasks = context.Queue()
+        self.results = context.Queue()
+        self.processes = [context.Process(target=run_worker, daemon=True,
+                                          args=(tracker_factory, self.memory.name, self.slots, self.shape,
+                                                self.tasks, self.results))
+                          for _ in range(workers)]
+
+        self.condition = threading.Condition()
+        self.running = True
+        self.free_slots = list(range(self.slots))
+        self.pending = {}           # seq -> (frame, submit time) in submission order
+        self.finished = {}          # seq -> detection rows of frames waiting on an earlier one
+
+        # Statistics
+        self.submitted_count = 0
+        self.completed_count = 0
+        self.emitted_count = 0
+        self.reordered_count = 0
+        self.late_count = 0
+        self.blocked_count = 0
+        self.total_detect_ns = 0
+        self.max_detect_ns = 0
+        self.total_latency_ns = 0
+
+    def start(self):
+        for process in self.processes:
+            process.start()
+        super().start()
+
+    # @brief - Copies a frame into a free slot and queues it for the workers. Waits for a
+    #          slot while every one is in use, so the stage feeding it applies its drop policy.
+    # @param captured - the CapturedFrame, the pool holds a reference until its result is handed on
+    # @return - None, results are handed on by this thread
+    def submit(self, captured):
+        if captured.image.shape != self.shape:
+            raise ValueError(f"Frame shape {captured.image.shape} does not match the pool's {self.shape}")
+
+        with self.condition:
+            if not self.free_slots:
+                self.blocked_count += 1
+            self.condition.wait_for(lambda: self.free_slots or not self.running)
+            if not self.running:
+                return None
+            slot = self.free_slots.pop()
+            self.pending[captured.seq] = (captured.retain(), time.monotonic_ns())
+            self.submitted_count += 1
+
+        # The slot belongs to this frame until its result comes back, no lock needed to fill it
+        np.copyto(self.frames[slot], captured.image)
+        self.tasks.put((slot, captured.seq))
+        return None
+
+    def run(self):
+        drain_deadline = None
+        while True:
+            with self.condition:
+                if not self.running:
+                    drain_deadline = drain_deadline or time.monotonic() + self.DRAIN_TIMEOUT_SECS
+                    if not self.pending or time.monotonic() > drain_deadline:
+                        break
+
+            try:
+                result = self.results.get(timeout=self.POLL_SECS)
+            except queue.Empty:
+                result = None
+
+            with self.condition:
+                if result is not None:
+                    self.complete(*result)
+                ready, skipped = self.take_ready()
+
+            for captured, rows in ready:
+                try:
+                    if self.on_result is not None:
+                        self.on_result(captured, [Detection(*row) for row in rows.tolist()])
+                except Exception as e:
+                    print(f"[Tracking Pool] Error handling frame {captured.seq}: {e}")
+                captured.release()
+            for captured in skipped:
+                captured.release()
+
+        self.close()
+
+    # @brief - Frees the slot of a finished frame and keeps its result until it is next in order
+    def complete(self, slot, seq, rows, detect_ns):
+        self.free_slots.append(slot)
+        self.condition.notify_all()
+        self.completed_count += 1
+        self.total_detect_ns += detect_ns
+        self.max_detect_ns = max(self.max_detect_ns, detect_ns)
+
+        # Results of skipped frames are no longer wanted
+        if seq in self.pending:
+            if seq != next(iter(self.pending)):
+                self.reordered_count += 1
+            self.finished[seq] = rows
+
+    # @brief - Takes the frames whose results can be handed on in order. A frame still in a
+    #          worker holds back the ones after it until it is max_wait_ms old, then it is skipped.
+    # @return - list of (frame, detection rows) to hand on, list of skipped frames to release
+    def take_ready(self):
+        now_ns = time.monotonic_ns()
+        ready = []
+        skipped = []
+        while self.pending:
+            seq = next(iter(self.pending))
+            captured, submit_ns = self.pending[seq]
+            if seq in self.finished:
+                ready.append((captured, self.finished.pop(seq)))
+                self.total_latency_ns += now_ns - submit_ns
+                self.emitted_count += 1
+            elif (self.finished and now_ns - submit_ns > self.max_wait_ns) or (not self.running and not self.processes_alive()):
+                skipped.append(captured)
+                self.late_count += 1
+            else:
+                break
+            del self.pending[seq]
+        return ready, skipped
+
+    def processes_alive(self):
+        return sum(process.is_alive() for process in self.processes)
+
+    # @brief - Stops the workers and frees the shared memory
+    def close(self):
+        with self.condition:
+            skipped = [captured for captured, _ in self.pending.values()]
+            self.pending.clear()
+            self.finished.clear()
+        for captured in skipped:
+            captured.release()
+
+        for _ in self.processes:
+            self.tasks.put(None)
+        for process in self.processes:
+            process.join(self.DRAIN_TIMEOUT_SECS)
+            if process.is_alive():
+                process.terminate()
+
+        del self.frames
+        self.memory.close()
+        self.memory.unlink()
+        print("[Tracking Pool] Stopped")
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+
+    # @brief - Gets the pool statistics. Latency is from submit to handing the result on,
+    #          late frames were skipped to keep the frames after them moving.
+    # @return - dict of statistics
+    def get_stats(self):
+        with self.condition:
+            return {
+                'workers': self.processes_alive(),
+                'in_flight': self.slots - len(self.free_slots),
+                'waiting': len(self.pending),
+                'submitted': self.submitted_count,
+                'completed': self.completed_count,
+                'emitted': self.emitted_count,
+                'reordered': self.reordered_count,
+                'late': self.late_count,
+                'blocked': self.blocked_count,
+                'avg_detect_ms': self.total_detect_ns / self.completed_count / 1e6 if self.completed_count else 0.0,
+                'max_detect_ms': self.max_detect_ns / 1e6,
+                'avg_latency_ms': self.total_latency_ns / self.emitted_count / 1e6 if self.emitted_count else 0.0,
+            }
@@ -1,5 +1,8 @@
 import socket
+import struct
 import threading
+from modules.command_protocol import CommandError, CommandTable, ErrorCode, Parameter, is_extended
+from modules.control_state import SharedControlState
 
 
 class UDPClient(threading.Thread):
@@ -8,10 +11,20 @@ class UDPClient(threading.Thread):
     SYNC_2 = 0xE1
     EOB = 0xCB
     COMMAND_MSG_ID = 0x01
+    STREAM_BITRATE_MSG_ID = 0x02    # Sets the stream bitrate ceiling, u32 kbps payload
+    STREAM_STATUS_MSG_ID = 0x03     # Reply to REPORT_STREAM with the stream operating point
+    STREAM_CONFIG_MSG_ID = 0x04     # Sets the stream destination and pyramid level
     ENABLE_STREAM = 0x01
     DISABLE_STREAM = 0x02
     ENABLE_DISPLAY = 0x03
     DISABLE_DISPLAY = 0x04
+    REPORT_STREAM = 0x05
+    COMMAND_LENGTH = 5
+
+    # Payload of the stream messages, framed by the sync bytes, message ID and end byte
+    STREAM_BITRATE = struct.Struct('<I')
+    STREAM_STATUS = struct.Struct('<IIBBB')     # Ceiling kbps, measured kbps, quality, levels downscaled, decimation
+    STREAM_CONFIG = struct.Struct('<4sHB')      # IPv4 address, port, pyramid level
 
     def __init__(self, host, port):
         super().__init__()
@@ -21,8 +34,21 @@ class UDPClient(threading.Thread):
         self.sock.bind((self.host, self.port))
         print(f"[UDP Client] Started on {self.host}:{self.port}")
         self.running = False
-        self.stream_enabled = False
-        self.display_enabled = False
+        self.stream_controller = None
+        self.max_stream_level = 0   # Deepest pyramid level the stream can be moved to
+
+        # Commands only publish a new control state, the frame loop picks it up on its next frame
+        self.control = SharedControlState()
+
+        # Parameters served over the extended protocol, the owners of the others register them
+        self.commands = CommandTable()
+        self.commands.register(Parameter.STREAM, lambda: (self.control.get().stream_enabled,),
+                               lambda enabled: self.control.update(stream_enabled=bool(enabled)))
+        self.commands.register(Parameter.DISPLAY, lambda: (self.control.get().display_enabled,),
+                               lambda enabled: self.control.update(display_enabled=bool(enabled)))
+        self.commands.register(Parameter.RECORDING, lambda: (self.control.get().recording_enabled,),
+                               lambda enabled: self.control.update(recording_enabled=bool(enabled)))
+        self.commands.register(Parameter.STREAM_CONFIG, self.get_stream_config, self.set_stream_config)
 
     def run(self):
         try:
@@ -37,26 +63,44 @@ class UDPClient(threading.Thread):
                 except socket.timeout:
                     continue
 
+                # Extended packets are answered to the sender with an ACK or NACK
+                if is_extended(data):
+                    reply = self.commands.handle(data)
+                    if reply is not None:
+                        self.sock.sendto(reply, addr)
+                    continue
+
                 # Process the received data
                 if data:
-                    if len(data) == 5:
-                        sync1, sync2, msg_id, command_id, end_byte = data
-
-                        # Check synchronization bytes and end byte
-                        if sync1 != self.SYNC_1 or sync2 != self.SYNC_2 or end_byte != self.EOB:
-                            continue
-
-                        if msg_id == self.COMMAND_MSG_ID:
-                            if command_id == self.ENABLE_STREAM:
-                                self.stream_enabled = True
-                            elif command_id == self.DISABLE_STREAM:
-                                self.stream_enabled = False
-                            elif command_id == self.ENABLE_DISPLAY:
-                                self.display_enabled = True
-                            elif command_id == self.DISABLE_DISPLAY:
-                                self.display_enabled = False
-                            else:
-                                print(f"[UDP Client] Received unrecognized command: {command_id}")
+                    if len(data) < self.COMMAND_LENGTH:
+                        print("[UDP Client] Received message with invalid length")
+                        continue
+
+                    # Check synchronization bytes and end byte
+                    if data[0] != self.SYNC_1 or data[1] != self.SYNC_2 or data[-1] != self.EOB:
+                        continue
+
+                    msg_id = data[2]
+                    payload = data[3:-1]
+                    if msg_id == self.COMMAND_MSG_ID and len(data) == self.COMMAND_LENGTH:
+                        command_id = payload[0]
+                        if command_id == self.ENABLE_STREAM:
+                            self.control.update(stream_enabled=True)
+                        elif command_id == self.DISABLE_STREAM:
+                            self.control.update(stream_enabled=False)
+                        elif command_id == self.ENABLE_DISPLAY:
+                            self.control.update(display_enabled=True)
+                        elif command_id == self.DISABLE_DISPLAY:
+                            self.control.update(display_enabled=False)
+                        elif command_id == self.REPORT_STREAM:
+                            self.send_stream_status(addr)
+                        else:
+                            print(f"[UDP Client] Received unrecognized command: {command_id}")
+                    elif msg_id == self.STREAM_BITRATE_MSG_ID and len(payload) == self.STREAM_BITRATE.size:
+                        if self.set_parameter(Parameter.STREAM_BITRATE, *self.STREAM_BITRATE.unpack(payload)):
+                            print(f"[UDP Client] Stream bitrate ceiling set to {self.control.get().stream_bitrate_kbps} kbps")
+                    elif msg_id == self.STREAM_CONFIG_MSG_ID and len(payload) == self.STREAM_CONFIG.size:
+                        self.set_parameter(Parameter.STREAM_CONFIG, *self.STREAM_CONFIG.unpack(payload))
                     else:
                         print("[UDP Client] Received message with invalid length")
         except Exception as e:
@@ -64,12 +108,71 @@ class UDPClient(threading.Thread):
         finally:
             self.sock.close()
 
+    # @brief - Sets a parameter for a legacy command, through the setter and checks of the extended commands
+    # @param parameter - one of Parameter
+    # @param values - the parameter's values
+    # @return - True if the parameter was set
+    def set_parameter(self, parameter, *values) -> bool:
+        setter = self.commands.setters.get(parameter)
+        if setter is None:
+            print(f"[UDP Client] Parameter {parameter:#04x} is not served")
+            return False
+        try:
+            setter(*values)
+        except CommandError as e:
+            print(f"[UDP Client] Rejected parameter {parameter:#04x}: {e}")
+            return False
+        return True
+
+    def get_stream_config(self):
+        state = self.control.get()
+        try:
+            address = socket.inet_aton(state.stream_host)
+        except OSError:
+            address = bytes(4)
+        return address, state.stream_port, state.stream_level
+
+    # @brief - Sets the stream destination and level
+    # @param address - packed IPv4 address
+    # @param port - port to stream to
+    # @param level - pyramid level streamed, up to max_stream_level
+    def set_stream_config(self, address, port, level):
+        if address == bytes(4) or port == 0:
+            raise CommandError(ErrorCode.INVALID_VALUE, "The stream needs an address and a port")
+        if not 0 <= level <= self.max_stream_level:
+            raise CommandError(ErrorCode.INVALID_VALUE, f"The stream level must be 0 to {self.max_stream_level}")
+        self.control.update(stream_host=socket.inet_ntoa(address), stream_port=port, stream_level=level)
+
+    # @brief - Sets the deepest pyramid level the stream can be configured to
+    # @param level - int - pyramid level
+    def set_max_stream_level(self, level):
+        self.max_stream_level = level
+
+    # @brief - Replies with the stream operating point, nothing is sent without a stream controller
+    # @param addr - address the report request came from
+    def send_stream_status(self, addr):
+        if self.stream_controller is None:
+            return
+        stats = self.stream_controller.get_stats()
+        payload = self.STREAM_STATUS.pack(int(stats['ceiling_kbps']), int(stats['bitrate_kbps']), stats['quality'],
+                                          stats['downscale'], stats['decimation'])
+        self.sock.sendto(bytes((self.SYNC_1, self.SYNC_2, self.STREAM_STATUS_MSG_ID)) + payload + bytes((self.EOB,)), addr)
+
+    # @brief - Sets the controller the stream reports come from
+    # @param controller - StreamController, None when the stream is not adaptive
+    def set_stream_controller(self, controller):
+        self.stream_controller = controller
+
     def stop(self):
         print("[UDP Client] Stopping")
         self.running = False
 
+    # The frame loops read self.control once per frame instead of these
     def is_stream_enabled(self) -> bool:
-        return self.stream_enabled
+        return self.control.get().stream_enabled
 
     def is_display_enabled(self) -> bool:
-        return self.display_enabled
+        return self.control.get().display_enabled
+
+    def is_recording_enabled(self) -> bool:
+        return self.control.get().recording_enabled
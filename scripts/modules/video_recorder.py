@@ -0,0 +1,137 @@
+import collections
+import threading
+import time
+import numpy as np
+from modules.pipeline import DropPolicy
+
+
+class VideoRecorder(threading.Thread):
+    DEFAULT_QUEUE_SIZE = 8
+
+    # @brief - Writes frames to a video writer on its own thread so the encode cost stays
+    #          off the caller. Frames are copied into buffers owned by the recorder, so the
+    #          caller can reuse its frame as soon as write() returns.
+    # @param writer - opened SegmentedVideoWriter, or any writer with write(frame, seq, capture_ns),
+    #                 release() and get_stats()
+    # @param queue_size - maximum number of frames waiting to be encoded
+    # @param drop_policy - one of DropPolicy for when the queue is full
+    # @param copy_frames - copy frames into the recorder's buffers, off for frames that are never
+    #                      reused by the caller, like the JPEG data of passthrough capture
+    def __init__(self, writer, queue_size=DEFAULT_QUEUE_SIZE, drop_policy=DropPolicy.DROP_OLDEST, copy_frames=True):
+        super().__init__(daemon=True)
+        if drop_policy not in DropPolicy.ALL:
+            raise ValueError(f"Unknown drop policy: {drop_policy}")
+        self.writer = writer
+        self.queue_size = max(1, queue_size)
+        self.drop_policy = drop_policy
+        self.copy_frames = copy_frames
+        self.condition = threading.Condition()
+        self.queue = collections.deque()
+        self.free = []
+        self.running = True
+
+        # Statistics
+        self.received_count = 0
+        self.written_count = 0
+        self.dropped_count = 0
+        self.max_depth = 0
+        self.allocations = 0
+        self.total_encode_ns = 0
+        self.max_encode_ns = 0
+
+    # @brief - Queues a copy of a frame for encoding, applying the drop policy when full
+    # @param frame - BGR frame
+    # @param seq - frame sequence number, passed on to the writer's index
+    # @param capture_ns - monotonic capture time, passed on to the writer's index
+    # @return - True if the frame was queued
+    def write(self, frame, seq=0, capture_ns=0):
+        with self.condition:
+            self.received_count += 1
+            if len(self.queue) >= self.queue_size:
+                if self.drop_policy == DropPolicy.BLOCK:
+                    self.condition.wait_for(lambda: len(self.queue) < self.queue_size or not self.running)
+                elif self.drop_policy == DropPolicy.DROP_NEWEST:
+                    self.dropped_count += 1
+                    return False
+                else:
+                    dropped, _, _ = self.queue.popleft()
+                    if self.copy_frames:
+                        self.free.append(dropped)
+                    self.dropped_count += 1
+
+            if not self.running:
+                self.dropped_count += 1
+                return False
+
+            # Reuse a buffer of the same shape, only the first frames and size changes allocate
+            if self.copy_frames:
+                buffer = self.free.pop() if self.free else None
+                if buffer is None or buffer.shape != frame.shape:
+                    buffer = np.empty_like(frame)
+                    self.allocations += 1
+                np.copyto(buffer, frame)
+            else:
+                buffer = frame
+
+            self.queue.append((buffer, seq, capture_ns))
+            self.max_depth = max(self.max_depth, len(self.queue))
+            self.condition.notify_all()
+        return True
+
+    def run(self):
+        print("[Video Recorder] Started")
+        while True:
+            with self.condition:
+                # Keep encoding after stop so every queued frame makes it into the file
+                self.condition.wait_for(lambda: self.queue or not self.running)
+                if not self.queue:
+                    break
+                buffer, seq, capture_ns = self.queue.popleft()
+
+            start_ns = time.monotonic_ns()
+            try:
+                self.writer.write(buffer, seq, capture_ns)
+            except Exception as e:
+                print(f"[Video Recorder] Error writing frame: {e}")
+            encode_ns = time.monotonic_ns() - start_ns
+
+            with self.condition:
+                self.written_count += 1
+                self.total_encode_ns += encode_ns
+                self.max_encode_ns = max(self.max_encode_ns, encode_ns)
+                if self.copy_frames:
+                    self.free.append(buffer)
+                self.condition.notify_all()
+
+        # Finalizing writes the index and trailer, a file that is never released may not play
+        self.writer.release()
+        print(f"[Video Recorder] Finalized after {self.written_count} frames")
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+
+    # @brief - Stops accepting frames, encodes what is queued and finalizes the file
+    def close(self):
+        self.stop()
+        if self.ident is None:
+            self.writer.release()
+        else:
+            self.join()
+
+    # @brief - Gets the recorder statistics. Encode times are averaged since the start.
+    # @return - dict of statistics
+    def get_stats(self):
+        with self.condition:
+            return {
+                'depth': len(self.queue),
+                'max_depth': self.max_depth,
+                'received': self.received_count,
+                'written': self.written_count,
+                'dropped': self.dropped_count,
+                'allocations': self.allocations,
+                'avg_encode_ms': self.total_encode_ns / self.written_count / 1e6 if self.written_count else 0.0,
+                'max_encode_ms': self.max_encode_ns / 1e6,
+                'writer': self.writer.get_stats(),
+            }
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Make the script folder importable, the scripts import their modules as modules.*
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
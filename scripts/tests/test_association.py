@@ -0,0 +1,84 @@
+import numpy as np
+import pytest
+
+from modules.tracker import CameraModel, Detection, MultiTargetTracker, Tracker, box_iou
+
+
+def boxes(*rows):
+    return np.array(rows, dtype=float).reshape(-1, 4)
+
+
+def detection(x, y, side=10):
+    return Detection(x, y, side, side, side * side, x + side / 2, y + side / 2)
+
+
+class ScriptedTracker(Tracker):
+    # Detects whatever the test put in detections
+    def __init__(self):
+        super().__init__(CameraModel())
+        self.detections = []
+
+    def detect(self, image):
+        return self.detections
+
+
+def make_tracker(**kwargs):
+    return MultiTargetTracker(ScriptedTracker(), **kwargs)
+
+
+def track(tracker, detections):
+    tracker.tracker.detections = detections
+    tracker.track(np.zeros((240, 320, 3), np.uint8))
+
+
+def test_box_iou():
+    iou = box_iou(boxes((0, 0, 10, 10)), boxes((0, 0, 10, 10), (5, 0, 15, 10), (20, 20, 30, 30)))
+    assert iou[0] == pytest.approx([1.0, 1 / 3, 0.0])
+
+
+def test_greedy_association_takes_the_best_overlap_first():
+    tracker = make_tracker()
+    # Track 0 overlaps both detections, detection 0 matches track 1 better than track 0
+    tracks = boxes((0, 0, 10, 10), (2, 0, 12, 10))
+    detections = boxes((2, 0, 12, 10), (-3, 0, 7, 10))
+    track_index, detection_index = tracker.associate(tracks, detections)
+    assert sorted(zip(track_index.tolist(), detection_index.tolist())) == [(0, 1), (1, 0)]
+
+
+def test_association_ignores_overlaps_below_the_minimum():
+    tracker = make_tracker(min_iou=0.5)
+    track_index, detection_index = tracker.associate(boxes((0, 0, 10, 10)), boxes((6, 0, 16, 10)))
+    assert len(track_index) == 0 and len(detection_index) == 0
+    assert len(tracker.associate(boxes(), boxes((0, 0, 1, 1)))[0]) == 0
+
+
+def test_ids_persist_and_tracks_are_confirmed_after_min_hits():
+    tracker = make_tracker(min_hits=2)
+    track(tracker, [detection(10, 10), detection(100, 100)])
+    assert not tracker.found
+
+    track(tracker, [detection(103, 100), detection(12, 10)])
+    assert tracker.found
+    assert sorted(tracker.get_tracks()[:, 0].tolist()) == [1, 2]
+
+    # Swapped order in the detections does not swap the ids
+    track(tracker, [detection(14, 10), detection(106, 100)])
+    ids = {int(row[0]): row[1] for row in tracker.get_tracks()}
+    assert ids[1] < ids[2]
+
+
+def test_unmatched_tracks_coast_then_are_deleted():
+    tracker = make_tracker(min_hits=1, max_misses=2)
+    track(tracker, [detection(10, 10)])
+    for _ in range(2):
+        track(tracker, [])
+        assert tracker.found
+    track(tracker, [])
+    assert not tracker.found
+    assert tracker.get_stats()['deleted'] == 1
+
+
+def test_new_tracks_stop_at_max_tracks():
+    tracker = make_tracker(max_tracks=2, min_hits=1)
+    track(tracker, [detection(10 + 40 * index, 10) for index in range(4)])
+    assert tracker.get_stats()['tracks'] == 2
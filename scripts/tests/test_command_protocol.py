@@ -0,0 +1,181 @@
+import struct
+import pytest
+
+from modules.command_protocol import (HEADER, CommandTable, ErrorCode, MessageType, Parameter, crc16, decode_command,
+                                      decode_reply, encode_packet, encode_request, is_extended, CommandError)
+
+
+def make_table(values=None):
+    values = values if values is not None else {'rate': 1.0}
+    table = CommandTable()
+    table.register(Parameter.PUBLISH_RATE, lambda: (values['rate'],), lambda rate: values.update(rate=rate))
+    table.register(Parameter.STATUS, lambda: (7, 1, 0, 1))
+    return table, values
+
+
+def test_crc16_is_ccitt_false():
+    assert crc16(b'123456789') == 0x29B1
+
+
+def test_request_round_trip():
+    packet = encode_request(513, Parameter.HSV_RANGE, 1, 2, 3, 4, 5, 6)
+    assert is_extended(packet)
+    command = decode_command(packet)
+    assert (command.message_type, command.sequence, command.parameter) == (MessageType.SET, 513, Parameter.HSV_RANGE)
+    assert command.values == (1, 2, 3, 4, 5, 6)
+    assert decode_command(encode_request(2, Parameter.STATUS)).values == ()
+
+
+def test_set_is_acknowledged_with_the_new_value():
+    table, values = make_table()
+    reply = decode_reply(table.handle(encode_request(9, Parameter.PUBLISH_RATE, 5.0)))
+    assert reply == (MessageType.ACK, 9, Parameter.PUBLISH_RATE, (5.0,))
+    assert values['rate'] == 5.0
+
+
+def test_get_of_a_read_only_parameter():
+    table, _ = make_table()
+    assert decode_reply(table.handle(encode_request(3, Parameter.STATUS))) == (MessageType.ACK, 3, Parameter.STATUS, (7, 1, 0, 1))
+
+
+@pytest.mark.parametrize('packet, code', [
+    (encode_packet(MessageType.SET, 4, Parameter.STATUS, bytes(7)), ErrorCode.READ_ONLY),
+    (encode_packet(MessageType.SET, 4, 0x7F, b''), ErrorCode.UNKNOWN_PARAMETER),
+    (encode_packet(MessageType.ACK, 4, Parameter.PUBLISH_RATE, bytes(4)), ErrorCode.BAD_TYPE),
+    (encode_packet(MessageType.SET, 4, Parameter.PUBLISH_RATE, bytes(2)), ErrorCode.BAD_LENGTH),
+    (encode_request(4, Parameter.MIN_AREA, 10), ErrorCode.UNAVAILABLE),
+])
+def test_rejected_commands_are_nacked_with_their_sequence(packet, code):
+    table, values = make_table()
+    assert decode_reply(table.handle(packet)) == (MessageType.NACK, 4, packet[HEADER.size - 2], code)
+    assert values['rate'] == 1.0
+
+
+def test_other_versions_are_nacked():
+    packet = bytearray(encode_request(6, Parameter.PUBLISH_RATE))
+    packet[2] = 99
+    packet[-2:] = struct.pack('<H', crc16(bytes(packet[:-2])))
+    table, _ = make_table()
+    assert decode_reply(table.handle(bytes(packet)))[3] == ErrorCode.BAD_VERSION
+
+
+@pytest.mark.parametrize('packet', [
+    encode_request(1, Parameter.PUBLISH_RATE, 5.0)[:-1],                # Truncated
+    encode_request(1, Parameter.PUBLISH_RATE, 5.0) + b'\0',             # Trailing byte
+    encode_request(1, Parameter.PUBLISH_RATE, 5.0)[:5],                 # Shorter than a header
+    bytes([*encode_request(1, Parameter.PUBLISH_RATE, 5.0)[:-3], 0x55, 0x00, 0x00]),     # Corrupted payload
+])
+def test_malformed_or_corrupted_packets_are_dropped(packet):
+    table, values = make_table()
+    assert table.handle(packet) is None
+    assert values['rate'] == 1.0
+
+
+def test_setter_errors_are_nacked():
+    table = CommandTable()
+
+    def reject(rate):
+        raise CommandError(ErrorCode.INVALID_VALUE, "no")
+    table.register(Parameter.PUBLISH_RATE, lambda: (1.0,), reject)
+    assert decode_reply(table.handle(encode_request(1, Parameter.PUBLISH_RATE, 5.0)))[3] == ErrorCode.INVALID_VALUE
+
+
+def test_unexpected_errors_are_nacked_instead_of_raised():
+    table = CommandTable()
+    table.register(Parameter.PUBLISH_RATE, lambda: (1.0,), lambda rate: 1 / 0)
+    table.register(Parameter.MIN_AREA, lambda: None)
+    assert decode_reply(table.handle(encode_request(1, Parameter.PUBLISH_RATE, 5.0)))[3] == ErrorCode.INTERNAL_ERROR
+    assert decode_reply(table.handle(encode_request(2, Parameter.MIN_AREA)))[3] == ErrorCode.INTERNAL_ERROR
+
+
+@pytest.mark.parametrize('reply', [b'', encode_packet(MessageType.ACK, 1, Parameter.MIN_AREA, bytes(4))[:-1],
+                                   encode_packet(MessageType.ACK, 1, Parameter.MIN_AREA, bytes(4))[:-1] + b'\xff'])
+def test_malformed_replies_raise_value_error(reply):
+    with pytest.raises(ValueError):
+        decode_reply(reply)
+
+
+def test_register_rejects_unknown_parameters():
+    with pytest.raises(ValueError):
+        CommandTable().register(0x7F, lambda: ())
+
+
+@pytest.fixture
+def commands(monkeypatch):
+    import ImageTracking_cv2 as it
+    from modules.control_state import SharedControlState
+    from modules.tracker import CameraModel, ColorBlobTracker, RoiTracker
+
+    monkeypatch.setattr(it, 'TRACKER', RoiTracker(ColorBlobTracker(CameraModel())))
+
+    def create(predict):
+        control = SharedControlState()
+        it.seed_control(control, False, '', 0, 0, 0, 10.0)
+        table = CommandTable()
+        it.register_parameters(table, control, None, False, False, None, lambda: None, predict)
+        return table, control
+    return create
+
+
+@pytest.mark.parametrize('predict, rate, code', [
+    (True, 0.0, ErrorCode.INVALID_VALUE),
+    (False, 0.0, None),
+    (False, -1.0, ErrorCode.INVALID_VALUE),
+    (False, float('nan'), ErrorCode.INVALID_VALUE),
+    (False, float('inf'), ErrorCode.INVALID_VALUE),
+    (True, 30.0, None),
+])
+def test_publish_rate_validation(commands, predict, rate, code):
+    table, control = commands(predict)
+    reply = decode_reply(table.handle(encode_request(1, Parameter.PUBLISH_RATE, rate)))
+    if code is None:
+        assert reply[0] == MessageType.ACK and control.get().publish_rate_hz == rate
+    else:
+        assert reply[0] == MessageType.NACK and reply[3] == code
+        assert control.get().publish_rate_hz == 10.0
+
+
+@pytest.mark.parametrize('scale', [float('inf'), float('nan'), 0.0])
+def test_roi_scale_validation(commands, scale):
+    table, control = commands(False)
+    roi = control.get().roi
+    assert decode_reply(table.handle(encode_request(1, Parameter.ROI, scale, 32)))[3] == ErrorCode.INVALID_VALUE
+    assert control.get().roi == roi
+
+
+@pytest.mark.parametrize('hsv', [
+    (180, 0, 0, 179, 255, 255),     # Hue above 179
+    (0, 0, 0, 180, 255, 255),
+    (20, 0, 0, 10, 255, 255),       # Inverted bounds
+    (0, 200, 0, 179, 100, 255),
+    (0, 0, 90, 179, 255, 80),
+])
+def test_hsv_range_validation(commands, hsv):
+    table, control = commands(False)
+    hsv_range = control.get().hsv_range
+    assert decode_reply(table.handle(encode_request(1, Parameter.HSV_RANGE, *hsv)))[3] == ErrorCode.INVALID_VALUE
+    assert control.get().hsv_range == hsv_range
+
+
+def test_negative_hsv_bounds_are_rejected(commands):
+    table, control = commands(False)
+    hsv_range = control.get().hsv_range
+    with pytest.raises(CommandError):
+        table.setters[Parameter.HSV_RANGE](-1, 0, 0, 179, 255, 255)
+    assert control.get().hsv_range == hsv_range
+
+
+def test_valid_hsv_range_and_min_area_are_applied(commands):
+    table, control = commands(False)
+    assert decode_reply(table.handle(encode_request(1, Parameter.HSV_RANGE, 0, 0, 0, 179, 255, 255)))[0] == MessageType.ACK
+    assert decode_reply(table.handle(encode_request(2, Parameter.MIN_AREA, 5)))[0] == MessageType.ACK
+    assert control.get().hsv_range == (0, 0, 0, 179, 255, 255) and control.get().min_area == 5
+
+
+def test_min_area_must_be_positive(commands):
+    table, control = commands(False)
+    min_area = control.get().min_area
+    assert decode_reply(table.handle(encode_request(1, Parameter.MIN_AREA, 0)))[3] == ErrorCode.INVALID_VALUE
+    with pytest.raises(CommandError):
+        table.setters[Parameter.MIN_AREA](-5)
+    assert control.get().min_area == min_area
@@ -0,0 +1,117 @@
+import socket
+import threading
+import time
+
+import pytest
+
+from modules.control_state import ControlState, SharedControlState
+from modules.pipeline import Stage
+from modules.udp_client import UDPClient
+
+
+class Recorder:
+    # Records the calls made on it as (name, args)
+    def __init__(self):
+        self.calls = []
+
+    def __getattr__(self, name):
+        return lambda *args: self.calls.append((name, args))
+
+
+class Item:
+    def __init__(self, wanted):
+        self.wanted = wanted
+        self.references = 0
+
+    def retain(self):
+        self.references += 1
+
+    def release(self):
+        self.references -= 1
+
+
+def test_defaults():
+    state = SharedControlState().get()
+    assert state.generation == 0
+    assert (state.stream_enabled, state.display_enabled, state.recording_enabled) == (False, False, True)
+    assert (state.stream_quality, state.stream_bitrate_kbps, state.roi, state.hsv_range) == (85, 0, None, None)
+
+
+def test_every_update_bumps_the_generation_once():
+    control = SharedControlState()
+    first = control.update(stream_enabled=True)
+    second = control.update(stream_quality=50, publish_rate_hz=5.0)
+    assert (first.generation, second.generation) == (1, 2)
+    assert control.get() is second
+    assert second.stream_enabled and second.stream_quality == 50
+
+
+def test_snapshots_are_immutable_and_kept():
+    control = SharedControlState()
+    first = control.update(stream_quality=40)
+    control.update(stream_quality=60)
+    with pytest.raises(AttributeError):
+        first.stream_quality = 70
+    assert first.stream_quality == 40 and first.generation == 1
+
+
+def test_concurrent_updates_are_not_lost():
+    control = SharedControlState()
+
+    def update():
+        for _ in range(1000):
+            control.update(display_enabled=True)
+    threads = [threading.Thread(target=update) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert control.get().generation == 4000
+
+
+def test_apply_control_only_applies_changes():
+    import ImageTracking_cv2 as it
+    scheduler, sink, controller = Recorder(), Recorder(), Recorder()
+    previous = ControlState(stream_host='10.0.0.1', stream_port=5000)
+
+    it.apply_control(previous, previous._replace(generation=1), scheduler, sink, controller)
+    assert scheduler.calls == sink.calls == controller.calls == []
+
+    state = previous._replace(generation=2, stream_enabled=True, stream_port=5001, publish_rate_hz=20.0, stream_bitrate_kbps=800)
+    it.apply_control(previous, state, scheduler, sink, controller)
+    assert sink.calls == [('set_enabled', (True,)), ('configure', ('10.0.0.1', 5001, 0))]
+    assert scheduler.calls == [('set_rate', (20.0,))]
+    assert controller.calls == [('set_ceiling', (800,))]
+
+
+def test_gate_sees_the_item():
+    stage = Stage('gated', lambda item: None, gate=lambda item: item.wanted)
+    stage.running = True
+    unwanted, wanted = Item(False), Item(True)
+    assert not stage.put(unwanted) and unwanted.references == 0
+    assert stage.put(wanted) and wanted.references == 1
+
+
+def test_legacy_commands_update_the_control_state():
+    client = UDPClient('127.0.0.1', 0)
+    client.set_max_stream_level(1)
+    client.start()
+    try:
+        sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        address = client.sock.getsockname()
+        command = bytes([UDPClient.SYNC_1, UDPClient.SYNC_2, UDPClient.COMMAND_MSG_ID, UDPClient.ENABLE_STREAM,
+                         UDPClient.EOB])
+        config = bytes([UDPClient.SYNC_1, UDPClient.SYNC_2, UDPClient.STREAM_CONFIG_MSG_ID]) \
+            + UDPClient.STREAM_CONFIG.pack(socket.inet_aton('10.0.0.2'), 6000, 1) + bytes([UDPClient.EOB])
+        sender.sendto(command, address)
+        sender.sendto(config, address)
+        deadline = time.monotonic() + 2
+        while client.control.get().generation < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        sender.close()
+        state = client.control.get()
+        assert state.stream_enabled
+        assert (state.stream_host, state.stream_port, state.stream_level) == ('10.0.0.2', 6000, 1)
+    finally:
+        client.stop()
+        client.join()
@@ -0,0 +1,100 @@
+import time
+
+import numpy as np
+
+from modules.frame_grabber import FrameGrabber
+from modules.frame_pool import FramePool
+
+WIDTH, HEIGHT = 32, 24
+
+
+class FakeCamera:
+    # Delivers numbered frames, each filled with its number, until frames runs out
+    def __init__(self, frames=None, interval=0.001):
+        self.frames = frames
+        self.interval = interval
+        self.count = 0
+
+    def isOpened(self):
+        return True
+
+    def grab(self):
+        time.sleep(self.interval)
+        if self.frames is not None and self.count >= self.frames:
+            return False
+        self.count += 1
+        return True
+
+    def retrieve(self, image=None):
+        if image is None:
+            image = np.empty((HEIGHT, WIDTH, 3), np.uint8)
+        image[:] = self.count % 256
+        return True, image
+
+    def get(self, prop):
+        return 0
+
+
+def test_stop_returns_every_buffer_to_the_pool():
+    pool = FramePool(WIDTH, HEIGHT, size=4)
+    grabber = FrameGrabber(FakeCamera(), pool)
+    grabber.start()
+    for _ in range(3):
+        captured = grabber.read()
+        assert captured is not None
+        captured.release()
+    grabber.stop()
+    grabber.join()
+    assert pool.get_stats()['free'] == pool.get_stats()['size']
+    assert grabber.read(timeout=0) is None
+
+
+def test_read_returns_the_newest_frame_and_counts_the_skipped_ones():
+    grabber = FrameGrabber(FakeCamera())
+    grabber.publish(np.zeros((HEIGHT, WIDTH, 3), np.uint8), 1)
+    grabber.publish(np.ones((HEIGHT, WIDTH, 3), np.uint8), 2)
+    captured = grabber.read(timeout=0)
+    assert (captured.seq, captured.capture_ns, int(captured.image[0, 0, 0])) == (2, 2, 1)
+    assert grabber.get_stats() == {'captured': 2, 'dropped': 1}
+
+    # The same frame is never returned twice
+    assert grabber.read(timeout=0) is None
+    grabber.publish(np.zeros((HEIGHT, WIDTH, 3), np.uint8), 3)
+    assert grabber.read(timeout=0).seq == 3
+    assert grabber.get_stats()['dropped'] == 1
+
+
+def test_a_replaced_frame_goes_back_to_the_pool():
+    pool = FramePool(WIDTH, HEIGHT, size=2)
+    grabber = FrameGrabber(FakeCamera(), pool)
+    for capture_ns in (1, 2, 3):
+        buffer = pool.acquire()
+        grabber.publish(buffer.array, capture_ns, buffer)
+    assert pool.get_stats()['free'] == 1
+    grabber.stop()
+    assert pool.get_stats()['free'] == 2
+
+
+def test_capture_ends_when_the_camera_stops_delivering():
+    grabber = FrameGrabber(FakeCamera(frames=3))
+    grabber.start()
+    grabber.join(5)
+    assert not grabber.is_alive() and not grabber.is_running()
+    assert grabber.get_stats()['captured'] == 3
+    assert grabber.read(timeout=0) is None
+
+
+def test_passthrough_keeps_the_jpeg_data():
+    class JpegCamera(FakeCamera):
+        def retrieve(self, image=None):
+            return True, np.arange(10, dtype=np.uint8).reshape(1, 10)
+
+    grabber = FrameGrabber(JpegCamera(), FramePool(WIDTH, HEIGHT), passthrough=True)
+    grabber.start()
+    try:
+        captured = grabber.read()
+    finally:
+        grabber.stop()
+        grabber.join()
+    assert captured.image is None and captured.buffer is None
+    assert captured.jpeg.tolist() == list(range(10))
@@ -0,0 +1,55 @@
+import numpy as np
+
+from modules.frame_pool import FramePool
+
+
+def test_buffers_return_on_the_last_release():
+    pool = FramePool(16, 8, size=2)
+    buffer = pool.acquire()
+    assert buffer.array.shape == (8, 16, 3) and buffer.ref_count == 1
+    assert buffer.retain() is buffer
+    buffer.release()
+    assert pool.get_stats()['free'] == 1
+    buffer.release()
+    assert pool.get_stats()['free'] == 2
+
+    # The freed buffer is handed out again rather than a new one
+    assert pool.acquire() is buffer
+
+
+def test_pool_grows_instead_of_stalling():
+    pool = FramePool(16, 8, size=1)
+    buffers = [pool.acquire() for _ in range(3)]
+    stats = pool.get_stats()
+    assert (stats['size'], stats['free'], stats['allocations']) == (3, 0, 2)
+    for buffer in buffers:
+        buffer.release()
+    assert pool.get_stats()['free'] == 3
+
+
+def test_extra_releases_are_ignored():
+    pool = FramePool(16, 8, size=1)
+    buffer = pool.acquire()
+    buffer.release()
+    buffer.release()
+    assert buffer.ref_count == 0
+    assert pool.get_stats()['free'] == 1
+
+
+def test_accept_keeps_the_array_opencv_returned():
+    pool = FramePool(16, 8, size=1)
+    buffer = pool.acquire()
+    assert buffer.accept(buffer.array) is buffer.array
+    assert pool.get_stats()['allocations'] == 0
+
+    other = np.zeros((8, 16, 3), np.uint8)
+    assert buffer.accept(other) is other and buffer.array is other
+    assert pool.get_stats()['allocations'] == 1
+
+
+def test_buffers_carry_their_own_pyramid():
+    pool = FramePool(16, 8, size=2, pyramid_levels=2)
+    first, second = pool.acquire(), pool.acquire()
+    assert first.pyramid is not None and first.pyramid is not second.pyramid
+    assert first.pyramid.size(1) == (8, 4)
+    assert FramePool(16, 8, size=1).acquire().pyramid is None
@@ -0,0 +1,34 @@
+import pytest
+
+from modules.framing import HEADER, MAX_MESSAGE_SIZE, FrameDecoder, encode_frame
+
+
+def test_encode_prefixes_the_length_in_network_order():
+    assert encode_frame(b'abc') == b'\x00\x00\x00\x03abc'
+
+
+def test_encode_rejects_oversized_messages():
+    with pytest.raises(ValueError):
+        encode_frame(bytes(MAX_MESSAGE_SIZE + 1))
+
+
+def test_decoder_splits_coalesced_messages():
+    decoder = FrameDecoder()
+    assert decoder.feed(encode_frame(b'one') + encode_frame(b'') + encode_frame(b'three')) == [b'one', b'', b'three']
+
+
+def test_decoder_reassembles_messages_split_at_every_byte():
+    stream = encode_frame(b'hello') + encode_frame(b'world')
+    decoder = FrameDecoder()
+    messages = []
+    for index in range(len(stream)):
+        messages += decoder.feed(stream[index:index + 1])
+    assert messages == [b'hello', b'world']
+    assert not decoder.buffer
+
+
+def test_decoder_rejects_an_out_of_sync_length():
+    decoder = FrameDecoder(max_message_size=16)
+    with pytest.raises(ValueError):
+        decoder.feed(HEADER.pack(17) + bytes(17))
+    assert not decoder.buffer
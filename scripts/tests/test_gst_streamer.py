@@ -0,0 +1,118 @@
+import socket
+import time
+
+import numpy as np
+import pytest
+
+from modules import gst_streamer
+from modules.gst_streamer import GstStreamer, StreamEncoder, StreamReceiver, gst_available, make_element, select_encoder
+
+requires_gst = pytest.mark.skipif(not gst_available(), reason="the GStreamer Python bindings (gi) are not installed")
+
+
+class FakeElementFactory:
+    # Knows only the installed element names, make() returns a FakeElement
+    installed = set()
+
+    @classmethod
+    def find(cls, name):
+        return name if name in cls.installed else None
+
+    @classmethod
+    def make(cls, factory, name):
+        return FakeElement() if factory in cls.installed else None
+
+
+class FakeElement:
+    def __init__(self):
+        self.properties = {}
+
+    def set_property(self, key, value):
+        self.properties[key] = value
+
+
+class FakeGst:
+    ElementFactory = FakeElementFactory
+
+
+@pytest.fixture
+def installed(monkeypatch):
+    monkeypatch.setattr(gst_streamer, 'Gst', FakeGst)
+    monkeypatch.setattr(FakeElementFactory, 'installed', set())
+    return FakeElementFactory.installed
+
+
+def free_udp_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as probe:
+        probe.bind(('127.0.0.1', 0))
+        return probe.getsockname()[1]
+
+
+def test_auto_prefers_a_hardware_encoder(installed):
+    installed.update({StreamEncoder.JPEGENC, StreamEncoder.V4L2JPEGENC, StreamEncoder.VAAPIJPEGENC})
+    assert select_encoder(StreamEncoder.AUTO) == StreamEncoder.VAAPIJPEGENC
+
+
+def test_auto_falls_back_to_software(installed):
+    installed.add(StreamEncoder.JPEGENC)
+    assert select_encoder(StreamEncoder.AUTO) == StreamEncoder.JPEGENC
+
+
+def test_explicit_encoder_must_be_installed(installed):
+    installed.add(StreamEncoder.JPEGENC)
+    assert select_encoder(StreamEncoder.JPEGENC) == StreamEncoder.JPEGENC
+    with pytest.raises(RuntimeError):
+        select_encoder(StreamEncoder.NVJPEGENC)
+
+
+def test_make_element_sets_properties_by_gstreamer_name(installed):
+    installed.add('queue')
+    element = make_element('queue', max_size_buffers=2, leaky=2)
+    assert element.properties == {'max-size-buffers': 2, 'leaky': 2}
+    with pytest.raises(RuntimeError):
+        make_element('udpsink')
+
+
+def test_streamer_requires_the_bindings(monkeypatch):
+    monkeypatch.setattr(gst_streamer, 'Gst', None)
+    assert not gst_available()
+    with pytest.raises(RuntimeError):
+        GstStreamer('127.0.0.1', 5000, 64, 48, 30)
+    with pytest.raises(RuntimeError):
+        StreamReceiver(5000)
+
+
+@requires_gst
+def test_frames_reach_a_local_receiver():
+    port = free_udp_port()
+    receiver = StreamReceiver(port)
+    streamer = GstStreamer('127.0.0.1', port, 64, 48, 30, encoder=StreamEncoder.JPEGENC)
+    try:
+        image = np.zeros((48, 64, 3), np.uint8)
+        deadline = time.monotonic() + 5
+        while receiver.get_stats()['frames'] == 0 and time.monotonic() < deadline:
+            image[:] = int(time.monotonic() * 100) % 256
+            streamer.write(image)
+            time.sleep(0.02)
+    finally:
+        streamer.release()
+        receiver.release()
+
+    assert receiver.get_stats()['frames'] > 0
+    stats = streamer.get_stats()
+    assert stats['encoder'] == StreamEncoder.JPEGENC
+    assert stats['pushed'] > 0
+    assert stats['error'] is None
+
+
+@requires_gst
+def test_frame_size_change_renegotiates_the_stream():
+    port = free_udp_port()
+    streamer = GstStreamer('127.0.0.1', port, 64, 48, 30, encoder=StreamEncoder.JPEGENC)
+    try:
+        streamer.write(np.zeros((48, 64, 3), np.uint8))
+        streamer.write(np.zeros((24, 32, 3), np.uint8))
+        assert (streamer.width, streamer.height) == (32, 24)
+        assert streamer.isOpened()
+    finally:
+        streamer.release()
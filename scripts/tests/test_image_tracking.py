@@ -0,0 +1,62 @@
+import collections
+import functools
+import threading
+import numpy as np
+
+import ImageTracking_cv2 as it
+from modules.control_state import ControlState
+from modules.frame_grabber import CapturedFrame
+from modules.rate_scheduler import RateScheduler
+from modules.tracker import CameraModel, ColorBlobTracker
+from modules.tracking_pool import TrackingPool
+
+SHAPE = (120, 160, 3)
+
+
+class CountingLog:
+    # Counts the records appended per frame sequence
+    def __init__(self):
+        self.records = collections.Counter()
+
+    def append(self, seq, *values):
+        self.records[seq] += 1
+
+
+class CountingPublisher:
+    # Counts the measurements added per frame sequence
+    def __init__(self, expected):
+        self.measurements = collections.Counter()
+        self.expected = expected
+        self.done = threading.Event()
+
+    def add_measurement(self, captured):
+        self.measurements[captured.seq] += 1
+        if len(self.measurements) == self.expected:
+            self.done.set()
+
+
+def frame(seq):
+    image = np.zeros(SHAPE, np.uint8)
+    image[20:30, 10 * seq:10 * seq + 10] = (0, 0, 255)
+    captured = CapturedFrame(image, seq, seq * 1_000_000)
+    captured.control = ControlState()
+    return captured
+
+
+def test_worker_results_are_logged_and_measured_once_per_frame(monkeypatch):
+    monkeypatch.setattr(it, 'TRACKER', ColorBlobTracker(CameraModel()))
+    pool = TrackingPool(1, SHAPE, functools.partial(ColorBlobTracker, CameraModel()), max_wait_ms=5000)
+    log, publisher = CountingLog(), CountingPublisher(5)
+    schedulers = {name: RateScheduler(0) for name in ('publish', 'record', 'stream')}
+    pipeline, pipeline_input = it.build_pipeline(None, False, None, False, None, 8, 'block', 'json', schedulers,
+                                                 publisher=publisher, tracking_pool=pool, telemetry_log=log)
+    pipeline.start()
+    try:
+        for seq in range(1, 6):
+            pipeline_input.put(frame(seq))
+        assert publisher.done.wait(30)
+    finally:
+        pipeline.stop()
+
+    assert log.records == {seq: 1 for seq in range(1, 6)}
+    assert publisher.measurements == {seq: 1 for seq in range(1, 6)}
@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+from modules.kalman import ConstantVelocityKalman
+
+SECOND = 1_000_000_000
+
+
+def test_first_measurement_starts_the_track():
+    kalman = ConstantVelocityKalman()
+    assert kalman.predict(0) is None
+    kalman.update((1.0, 2.0, 30.0), 0)
+    state, _ = kalman.predict(0)
+    assert state == pytest.approx([1.0, 2.0, 30.0, 0.0, 0.0, 0.0])
+    assert kalman.get_stats()['resets'] == 1
+
+
+def test_constant_velocity_is_learned_and_extrapolated():
+    kalman = ConstantVelocityKalman()
+    for step in range(30):
+        kalman.update((2.0 * step / 10, -1.0 * step / 10, 50.0), step * SECOND // 10)
+
+    # 2 deg/s and -1 deg/s, predicted half a second past the last measurement at 2.9 s
+    state, covariance = kalman.predict(int(3.4 * SECOND))
+    assert state[3:5] == pytest.approx([2.0, -1.0], abs=0.05)
+    assert state[:3] == pytest.approx([6.8, -3.4, 50.0], abs=0.05)
+
+    # Uncertainty grows the further ahead the prediction is
+    _, nearer = kalman.predict(int(3.0 * SECOND))
+    assert covariance[0, 0] > nearer[0, 0]
+
+
+def test_prediction_does_not_change_the_filter():
+    kalman = ConstantVelocityKalman()
+    kalman.update((0.0, 0.0, 0.0), 0)
+    kalman.update((1.0, 0.0, 0.0), SECOND // 10)
+    before = kalman.state.copy()
+    kalman.predict(SECOND // 2)
+    assert np.array_equal(kalman.state, before)
+
+
+def test_coasting_too_long_drops_and_restarts_the_track():
+    kalman = ConstantVelocityKalman(max_coast_secs=0.5)
+    kalman.update((0.0, 0.0, 0.0), 0)
+    kalman.update((1.0, 0.0, 0.0), SECOND // 10)
+    assert kalman.predict(SECOND) is None
+
+    kalman.update((5.0, 5.0, 5.0), SECOND)
+    state, _ = kalman.predict(SECOND)
+    assert state == pytest.approx([5.0, 5.0, 5.0, 0.0, 0.0, 0.0])
+    assert kalman.get_stats()['resets'] == 2
+
+
+def test_out_of_order_measurements_are_ignored():
+    kalman = ConstantVelocityKalman()
+    kalman.update((0.0, 0.0, 0.0), SECOND // 10)
+    kalman.update((9.0, 9.0, 9.0), 0)
+    assert kalman.get_stats()['updates'] == 0
+    assert kalman.predict(SECOND // 10)[0][:3] == pytest.approx([0.0, 0.0, 0.0])
@@ -0,0 +1,80 @@
+import sys
+import time
+
+import cv2
+import numpy as np
+import pytest
+
+from modules.mjpeg import MjpegStreamer, MjpegWriter, decode_jpeg, decoded_size
+
+
+def jpeg(width=64, height=48):
+    image = np.zeros((height, width, 3), np.uint8)
+    image[8:24, 8:24] = (0, 0, 255)
+    good, data = cv2.imencode('.jpg', image)
+    assert good
+    return data.reshape(-1)
+
+
+class PythonStreamer(MjpegStreamer):
+    # Pipes into a Python consumer instead of gst-launch
+    def __init__(self, consumer, **kwargs):
+        self.consumer = consumer
+        super().__init__('127.0.0.1', 5000, **kwargs)
+
+    def pipeline_command(self, host, port, multicast, multicast_iface):
+        return [sys.executable, '-c', self.consumer]
+
+
+@pytest.mark.parametrize('scale', [1, 2, 4, 8])
+def test_decode_jpeg_at_a_scale(scale):
+    image = decode_jpeg(jpeg(), scale)
+    assert (image.shape[1], image.shape[0]) == decoded_size(64, 48, scale)
+
+
+def test_decoded_size_rounds_up():
+    assert decoded_size(1281, 961, 8) == (161, 121)
+    assert decode_jpeg(np.frombuffer(b'not a jpeg', np.uint8)) is None
+
+
+def test_writer_writes_frames_back_to_back(tmp_path):
+    frames = [jpeg(), jpeg(32, 32)]
+    writer = MjpegWriter(str(tmp_path / 'rec.mjpeg'))
+    assert writer.isOpened()
+    for frame in frames:
+        writer.write(frame)
+    writer.release()
+    assert (tmp_path / 'rec.mjpeg').read_bytes() == b''.join(frame.tobytes() for frame in frames)
+    assert not MjpegWriter(str(tmp_path / 'missing' / 'rec.mjpeg')).isOpened()
+
+
+def test_stream_command_honours_multicast():
+    command = MjpegStreamer.pipeline_command(None, '239.0.0.1', 5000, True, 'eth1')
+    assert command[-5:] == ['udpsink', 'host=239.0.0.1', 'port=5000', 'auto-multicast=true', 'multicast-iface=eth1']
+    assert 'auto-multicast=true' not in MjpegStreamer.pipeline_command(None, '10.0.0.1', 5000, False, 'eth1')
+
+
+def test_stream_pipes_whole_frames(tmp_path):
+    path = tmp_path / 'piped.mjpeg'
+    streamer = PythonStreamer(f"import shutil, sys; shutil.copyfileobj(sys.stdin.buffer, open({str(path)!r}, 'wb'))")
+    assert streamer.isOpened()
+    frames = [jpeg() for _ in range(5)]
+    for frame in frames:
+        streamer.write(frame)
+    assert streamer.get_stats() == {'sent': 5, 'dropped': 0, 'pending_bytes': 0}
+    streamer.release()
+    assert path.read_bytes() == b''.join(frame.tobytes() for frame in frames)
+
+
+def test_a_stalled_consumer_does_not_block_and_drops_frames():
+    streamer = PythonStreamer("import time; time.sleep(30)")
+    frame = np.zeros(256 * 1024, np.uint8)
+    start = time.monotonic()
+    for _ in range(20):
+        streamer.write(frame)
+    assert time.monotonic() - start < 1
+    stats = streamer.get_stats()
+    assert stats['dropped'] > 0 and stats['pending_bytes'] > 0
+    assert stats['sent'] + stats['dropped'] == 20
+    streamer.process.kill()
+    streamer.release()
@@ -0,0 +1,65 @@
+from modules.pipeline import DropPolicy, Stage
+
+
+class Item:
+    def __init__(self):
+        self.references = 0
+
+    def retain(self):
+        self.references += 1
+        return self
+
+    def release(self):
+        self.references -= 1
+
+
+def make_stage(drop_policy, queue_size=1):
+    # Not started, so queued items stay queued
+    return Stage('test', lambda item: None, queue_size, drop_policy)
+
+
+def test_drop_oldest_evicts_and_releases_the_oldest():
+    stage = make_stage(DropPolicy.DROP_OLDEST)
+    first, second = Item(), Item()
+    assert stage.put(first)
+    assert stage.put(second)
+    assert first.references == 0
+    assert second.references == 1
+    assert stage.get_stats()['dropped'] == 1
+
+
+def test_drop_newest_rejects_and_releases_the_incoming_item():
+    stage = make_stage(DropPolicy.DROP_NEWEST)
+    first, second = Item(), Item()
+    assert stage.put(first)
+    assert not stage.put(second)
+    assert first.references == 1
+    assert second.references == 0
+    assert stage.get_stats()['dropped'] == 1
+
+
+def test_stopped_stage_rejects_without_evicting_or_leaking():
+    stage = make_stage(DropPolicy.DROP_OLDEST)
+    first, second = Item(), Item()
+    assert stage.put(first)
+    stage.stop()
+    assert not stage.put(second)
+
+    # The queued item is kept to be drained, the rejected one is released
+    assert first.references == 1
+    assert second.references == 0
+    assert stage.get_stats()['depth'] == 1
+
+
+def test_stopped_stage_drains_and_releases_everything():
+    handled = []
+    stage = Stage('test', handled.append, 4, DropPolicy.DROP_OLDEST)
+    items = [Item() for _ in range(3)]
+    for item in items:
+        stage.put(item)
+    stage.start()
+    stage.stop()
+    stage.join()
+    assert handled == items
+    assert all(item.references == 0 for item in items)
+
@@ -0,0 +1,42 @@
+import numpy as np
+
+from modules.pyramid import ImagePyramid
+
+
+def test_levels_halve_and_round_up():
+    pyramid = ImagePyramid(641, 481, 4)
+    assert [pyramid.size(index) for index in range(4)] == [(641, 481), (321, 241), (161, 121), (81, 61)]
+    assert pyramid.scale(3) == 8
+
+
+def test_levels_are_computed_lazily_once_per_frame():
+    pyramid = ImagePyramid(64, 48, 3)
+    frame = np.full((48, 64, 3), 100, np.uint8)
+    assert pyramid.set_frame(frame).level(0) is frame
+    assert pyramid.get_stats()['computed'] == [0, 0, 0]
+
+    # Level 2 computes level 1 on the way, asking again computes nothing
+    assert pyramid.level(2).shape == (12, 16, 3)
+    pyramid.level(1)
+    pyramid.level(2)
+    assert pyramid.get_stats()['computed'] == [0, 1, 1]
+    assert (pyramid.level(2) == 100).all()
+
+
+def test_buffers_are_reused_across_frames():
+    pyramid = ImagePyramid(64, 48, 2)
+    pyramid.set_frame(np.zeros((48, 64), np.uint8))
+    first = pyramid.level(1)
+    pyramid.set_frame(np.full((48, 64), 200, np.uint8))
+    second = pyramid.level(1)
+    assert second is first
+    assert (second == 200).all()
+    assert pyramid.get_stats()['allocations'] == 1
+
+
+def test_level_for_width_picks_the_smallest_wide_enough_level():
+    pyramid = ImagePyramid(640, 480, 4)
+    assert pyramid.level_for_width(80) == 3
+    assert pyramid.level_for_width(100) == 2
+    assert pyramid.level_for_width(640) == 0
+    assert pyramid.level_for_width(1000) == 0
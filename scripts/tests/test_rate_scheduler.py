@@ -0,0 +1,60 @@
+import pytest
+
+from modules.rate_scheduler import RateScheduler, ScheduleMode
+
+MS = 1_000_000
+
+
+def test_fixed_rate_fires_on_deadlines_without_drift():
+    scheduler = RateScheduler(100)
+    assert scheduler.should_fire(0)
+    assert not scheduler.should_fire(5 * MS)
+    assert scheduler.should_fire(13 * MS)
+
+    # Late by 3 ms, the next deadline is still 20 ms rather than 23 ms
+    assert not scheduler.should_fire(19 * MS)
+    assert scheduler.should_fire(20 * MS)
+
+
+def test_fixed_rate_counts_and_skips_missed_deadlines():
+    scheduler = RateScheduler(100)
+    assert scheduler.should_fire(0)
+    assert scheduler.should_fire(35 * MS)
+    assert scheduler.get_stats()['missed'] == 2
+    assert not scheduler.should_fire(39 * MS)
+    assert scheduler.should_fire(40 * MS)
+
+
+def test_zero_rate_fires_on_every_call():
+    scheduler = RateScheduler(0)
+    assert all(scheduler.should_fire(0) for _ in range(3))
+    assert scheduler.seconds_until_deadline(0) == 0.0
+
+
+def test_set_rate_restarts_the_schedule():
+    scheduler = RateScheduler(1)
+    assert scheduler.should_fire(0)
+    assert not scheduler.should_fire(10 * MS)
+    scheduler.set_rate(100)
+    assert scheduler.should_fire(10 * MS)
+    assert scheduler.seconds_until_deadline(10 * MS) == pytest.approx(0.01)
+
+
+def test_new_result_mode_fires_once_per_sequence_under_the_ceiling():
+    scheduler = RateScheduler(10, ScheduleMode.ON_NEW_RESULT)
+    assert scheduler.should_fire(0, seq=1)
+    assert not scheduler.should_fire(200 * MS, seq=1)
+    assert not scheduler.should_fire(50 * MS, seq=2)
+    assert scheduler.should_fire(200 * MS, seq=2)
+
+
+def test_change_mode_fires_beyond_the_threshold():
+    scheduler = RateScheduler(0, ScheduleMode.ON_CHANGE, threshold=0.5)
+    assert scheduler.should_fire(0, values=(1.0, 2.0))
+    assert not scheduler.should_fire(0, values=(1.4, 2.0))
+    assert scheduler.should_fire(0, values=(1.0, 2.6))
+
+
+def test_unknown_mode_is_rejected():
+    with pytest.raises(ValueError):
+        RateScheduler(1, 'sometimes')
@@ -0,0 +1,70 @@
+import pytest
+import numpy as np
+
+from modules.tracker import CameraModel, ColorBlobTracker, RoiTracker
+
+
+def frame_with(*boxes, width=320, height=240):
+    frame = np.zeros((height, width, 3), np.uint8)
+    for x, y, side in boxes:
+        frame[y:y + side, x:x + side] = (0, 0, 255)
+    return frame
+
+
+def make_tracker():
+    return RoiTracker(ColorBlobTracker(CameraModel(), min_area=4), roi_scale=2.0, min_roi=32)
+
+
+def test_search_then_follow_inside_the_roi():
+    tracker = make_tracker()
+    tracker.track(frame_with((100, 100, 16)))
+    assert tracker.get_stats()['tracking']
+    assert tracker.searches == 1
+
+    # Moving 4 pixels a frame keeps the target inside the predicted ROI
+    for step in range(1, 6):
+        tracker.track(frame_with((100 + 4 * step, 100, 16)))
+        assert tracker.get_stats()['tracking']
+    stats = tracker.get_stats()
+    assert stats['searches'] == 1
+    assert stats['hit_rate'] == 1.0
+    assert tracker.last.x == 120
+    assert tracker.velocity_x > 0
+
+
+def test_roi_is_rounded_and_kept_inside_the_frame():
+    tracker = make_tracker()
+    tracker.track(frame_with((300, 220, 16)))
+    tracker.track(frame_with((300, 220, 16)))
+    width, height = tracker.get_stats()['roi_size']
+    assert width % RoiTracker.ROI_STEP == 0 and height % RoiTracker.ROI_STEP == 0
+    assert tracker.get_stats()['tracking']
+
+
+def test_lost_target_falls_back_to_the_full_frame_search():
+    tracker = make_tracker()
+    tracker.track(frame_with((40, 40, 16)))
+    tracker.track(frame_with())
+    assert not tracker.get_stats()['tracking']
+    assert tracker.last is None
+
+    # Reappearing far from the old ROI is found by the search and counted as a reacquisition
+    tracker.track(frame_with((250, 180, 16)))
+    assert tracker.get_stats()['tracking']
+    assert tracker.get_stats()['reacquisitions'] == 1
+    assert tracker.last.x == 250
+
+
+def test_reacquired_target_starts_without_velocity():
+    tracker = make_tracker()
+    for step in range(3):
+        tracker.track(frame_with((20 + 6 * step, 20, 16)))
+    tracker.track(frame_with())
+
+    # Refining the coarse find must not count as motion
+    tracker.track(frame_with((250, 180, 16)))
+    assert tracker.get_stats()['reacquisitions'] == 1
+    assert (tracker.velocity_x, tracker.velocity_y) == (0.0, 0.0)
+    tracker.track(frame_with((250, 180, 16)))
+    assert tracker.get_stats()['tracking']
+    assert tracker.velocity_x == pytest.approx(0.0, abs=0.5)
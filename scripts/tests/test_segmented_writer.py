@@ -0,0 +1,74 @@
+import json
+import os
+import numpy as np
+
+from modules.segmented_writer import SegmentedVideoWriter
+
+MS = 1_000_000
+FRAME = np.zeros(100_000, np.uint8)     # Stands in for the JPEG data of a passthrough frame
+
+
+def open_writer(path, **kwargs):
+    return SegmentedVideoWriter(str(path), 0, 0, (0, 0), passthrough=True, **kwargs)
+
+
+def read_index(tmp_path):
+    with open(tmp_path / 'rec.index.jsonl') as index:
+        return [json.loads(line) for line in index]
+
+
+def record(writer, frames, first_seq=1):
+    for seq in range(first_seq, first_seq + frames):
+        writer.write(FRAME, seq, seq * 100 * MS)
+    writer.release()
+
+
+def test_segments_roll_on_duration_and_are_indexed(tmp_path):
+    writer = open_writer(tmp_path / 'rec.avi', segment_secs=0.5)
+    record(writer, 12)
+    segments = read_index(tmp_path)
+    assert [segment['file'] for segment in segments] == ['rec_00000.avi', 'rec_00001.avi', 'rec_00002.avi']
+    assert [(segment['first_seq'], segment['last_seq']) for segment in segments] == [(1, 5), (6, 10), (11, 12)]
+    assert all(segment['run'] == writer.run for segment in segments)
+
+
+def test_a_new_run_continues_the_index_with_its_own_run(tmp_path):
+    first = open_writer(tmp_path / 'rec.avi', segment_secs=0.5)
+    record(first, 5)
+    second = open_writer(tmp_path / 'rec.avi', segment_secs=0.5)
+    record(second, 5)
+
+    segments = read_index(tmp_path)
+    assert [segment['number'] for segment in segments] == [0, 1]
+    assert [segment['run'] for segment in segments] == [first.run, second.run]
+    assert first.run != second.run
+
+    # Both runs restarted their frame sequence, the run tells the segments apart
+    assert segments[0]['first_seq'] == segments[1]['first_seq'] == 1
+
+
+def test_quota_deletes_the_oldest_segments(tmp_path):
+    writer = open_writer(tmp_path / 'rec.avi', segment_secs=0.15, quota_mb=0.45)
+    record(writer, 10)
+    assert writer.get_stats()['stored_mb'] <= 0.45
+    assert writer.get_stats()['deleted'] > 0
+    remaining = {segment['file'] for segment in read_index(tmp_path)}
+    assert {name for name in os.listdir(tmp_path) if name.endswith('.avi')} == remaining
+
+
+def test_quota_is_enforced_at_open_on_earlier_runs(tmp_path):
+    record(open_writer(tmp_path / 'rec.avi', segment_secs=0.15), 10)
+    assert len(read_index(tmp_path)) == 5
+
+    # A smaller quota makes room before the new run writes its first frame
+    writer = open_writer(tmp_path / 'rec.avi', segment_secs=0.15, quota_mb=0.25)
+    assert len(read_index(tmp_path)) == 1
+    assert writer.get_stats()['deleted'] == 4
+    assert not os.path.exists(tmp_path / 'rec_00000.avi')
+    writer.release()
+
+
+def test_without_rolling_the_recording_is_the_path_itself(tmp_path):
+    record(open_writer(tmp_path / 'rec.avi'), 3)
+    assert os.path.getsize(tmp_path / 'rec.avi') == 3 * FRAME.nbytes
+    assert [segment['file'] for segment in read_index(tmp_path)] == ['rec.avi']
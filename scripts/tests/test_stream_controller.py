@@ -0,0 +1,146 @@
+import socket
+import struct
+import time
+
+from modules.stream_controller import (RTCP_RECEIVER_REPORT, RTCP_SENDER_REPORT, StreamController, parse_rtcp_loss)
+
+SECOND_NS = 1_000_000_000
+
+
+def report_blocks(*fractions):
+    # Report blocks with the given fraction lost, out of 256
+    return b''.join(struct.pack('!IB3s16s', 0x1234, fraction, b'\0' * 3, b'\0' * 16) for fraction in fractions)
+
+
+def rtcp_packet(packet_type, body, count=0):
+    body += b'\0' * (-len(body) % 4)
+    return struct.pack('!BBH', 0x80 | count, packet_type, (len(body) + 4) // 4 - 1) + body
+
+
+def receiver_report(*fractions):
+    return rtcp_packet(RTCP_RECEIVER_REPORT, struct.pack('!I', 1) + report_blocks(*fractions), len(fractions))
+
+
+def windows(controller, kbps, count, queue_bytes=None):
+    # Feeds count one second windows at a bitrate, returns how many changed the operating point
+    changes = 0
+    for _ in range(count):
+        controller.add_frame(kbps * 1000 // 8)
+        controller.report_send_queue(queue_bytes)
+        controller.now_ns += SECOND_NS
+        changes += controller.update(controller.now_ns)
+    return changes
+
+
+def make_controller(ceiling_kbps=1000, **kwargs):
+    controller = StreamController(ceiling_kbps, interval_secs=1, **kwargs)
+    controller.now_ns = 0
+    controller.update(0)
+    return controller
+
+
+def test_over_ceiling_trades_quality_then_resolution_then_rate():
+    controller = make_controller(ceiling_kbps=100, levels=2)
+    points = []
+    for _ in range(16):
+        windows(controller, 800, 1)
+        points.append(controller.get_operating_point())
+
+    assert points[:6] == [(quality, 0, 1) for quality in (75, 65, 55, 45, 35, 30)]
+    assert points[6:8] == [(30, 1, 1), (30, 2, 1)]
+    assert points[8:13] == [(30, 2, decimation) for decimation in range(2, 7)]
+    assert points[13:] == [(30, 2, 6)] * 3
+    assert controller.get_stats()['step_downs'] == 13
+
+
+def test_without_quality_control_resolution_goes_first():
+    controller = make_controller(ceiling_kbps=100, levels=1, adjust_quality=False)
+    windows(controller, 800, 2)
+    assert controller.get_operating_point() == (85, 1, 2)
+
+
+def test_headroom_steps_back_up_rate_first_after_the_hold():
+    controller = make_controller(ceiling_kbps=100, levels=1)
+    windows(controller, 800, 9)
+    assert controller.get_operating_point() == (30, 1, 3)
+
+    assert windows(controller, 1, 1) == 0
+    assert windows(controller, 1, 1) == 1
+    assert controller.get_operating_point() == (30, 1, 2)
+    windows(controller, 1, 4)
+    assert controller.get_operating_point() == (30, 0, 1)
+    windows(controller, 1, 2)
+    assert controller.get_operating_point() == (40, 0, 1)
+
+
+def test_step_up_is_withheld_when_it_would_cross_the_ceiling():
+    controller = make_controller(ceiling_kbps=100, levels=1, adjust_quality=False)
+    windows(controller, 800, 1)
+    assert controller.get_operating_point() == (85, 1, 1)
+
+    # A level up is expected to grow the bitrate by LEVEL_GROWTH, 30 kbps would end up above 90
+    assert windows(controller, 30, 4) == 0
+    assert windows(controller, 20, 2) == 1
+    assert controller.get_operating_point() == (85, 0, 1)
+
+
+def test_a_full_send_queue_counts_as_congestion():
+    controller = make_controller()
+    assert windows(controller, 10, 1, queue_bytes=StreamController.DEFAULT_QUEUE_LIMIT_BYTES + 1) == 1
+    assert controller.get_stats()['send_queue_bytes'] == StreamController.DEFAULT_QUEUE_LIMIT_BYTES + 1
+    assert controller.get_operating_point() == (75, 0, 1)
+
+
+def test_lowering_the_ceiling_steps_down_on_the_next_window():
+    controller = make_controller(ceiling_kbps=1000)
+    assert windows(controller, 500, 1) == 0
+    controller.set_ceiling(400)
+    assert windows(controller, 500, 1) == 1
+    assert controller.get_stats()['ceiling_kbps'] == 400
+
+
+def test_decimation_skips_frames():
+    controller = make_controller(ceiling_kbps=100, levels=0, adjust_quality=False)
+    windows(controller, 800, 2)
+    assert controller.get_operating_point() == (85, 0, 3)
+    assert [controller.should_send() for _ in range(6)] == [False, False, True, False, False, True]
+    assert controller.get_stats()['skipped'] == 4
+
+
+def test_parse_rtcp_loss_takes_the_worst_report_block():
+    assert parse_rtcp_loss(receiver_report(10, 64)) == 64 / 256
+    sender_info = struct.pack('!I', 1) + b'\0' * 20
+    assert parse_rtcp_loss(rtcp_packet(RTCP_SENDER_REPORT, sender_info + report_blocks(128), 1)) == 0.5
+
+    # Compound packets are walked past other packet types
+    sdes = rtcp_packet(202, b'\0' * 8, 1)
+    assert parse_rtcp_loss(sdes + receiver_report(32)) == 32 / 256
+
+
+def test_parse_rtcp_loss_ignores_packets_without_reports():
+    assert parse_rtcp_loss(receiver_report()) is None
+    assert parse_rtcp_loss(b'') is None
+    assert parse_rtcp_loss(b'\x00' * 8) is None
+    assert parse_rtcp_loss(receiver_report(64)[:-4]) is None
+
+
+def test_rtcp_loss_backs_the_stream_off():
+    probe = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    probe.bind(('127.0.0.1', 0))
+    port = probe.getsockname()[1]
+    probe.close()
+
+    controller = make_controller(rtcp_port=port)
+    sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        sender.sendto(receiver_report(64), ('127.0.0.1', port))
+        time.sleep(0.05)
+        assert windows(controller, 10, 1) == 1
+    finally:
+        sender.close()
+        controller.close()
+
+    stats = controller.get_stats()
+    assert stats['rtcp_reports'] == 1
+    assert stats['loss'] == 0.25
+    assert controller.get_operating_point() == (75, 0, 1)
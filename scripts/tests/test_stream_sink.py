@@ -0,0 +1,136 @@
+import pytest
+
+from modules.stream_sink import StreamSink
+
+
+class FakeStreamer:
+    def __init__(self, host, port, level, opened=True):
+        self.config = (host, port, level)
+        self.opened = opened
+        self.released = False
+        self.frames = []
+
+    def isOpened(self):
+        return self.opened
+
+    def write(self, frame):
+        self.frames.append(frame)
+
+    def release(self):
+        self.released = True
+
+
+class StreamerFactory:
+    # Opens FakeStreamers and keeps every one it made
+    def __init__(self, opened=True, error=None):
+        self.opened = opened
+        self.error = error
+        self.streamers = []
+
+    def __call__(self, host, port, level):
+        if self.error is not None:
+            raise self.error
+        self.streamers.append(FakeStreamer(host, port, level, self.opened))
+        return self.streamers[-1]
+
+
+def write_frame(sink, frame='frame'):
+    written = []
+    ran = sink.write(lambda streamer, level, quality: (streamer.write(frame), written.append((level, quality))))
+    return ran, written
+
+
+@pytest.fixture
+def factory():
+    return StreamerFactory()
+
+
+def test_disabled_sink_never_opens_a_streamer(factory):
+    sink = StreamSink(factory, '127.0.0.1', 5000)
+    assert not sink.is_enabled()
+    assert write_frame(sink) == (False, [])
+    assert factory.streamers == []
+
+
+def test_streamer_opens_on_the_first_frame_and_is_reused(factory):
+    sink = StreamSink(factory, '127.0.0.1', 5000, level=1, max_level=2, enabled=True, quality=70)
+    assert factory.streamers == []
+
+    for _ in range(3):
+        assert write_frame(sink) == (True, [(1, 70)])
+    assert len(factory.streamers) == 1
+    assert factory.streamers[0].config == ('127.0.0.1', 5000, 1)
+    assert factory.streamers[0].frames == ['frame'] * 3
+    assert sink.get_stats()['opened'] == 1
+    assert sink.get_stats()['written'] == 3
+
+
+def test_disabling_releases_the_streamer_and_enabling_reopens_it(factory):
+    sink = StreamSink(factory, '127.0.0.1', 5000, enabled=True)
+    write_frame(sink)
+    sink.set_enabled(False)
+    assert factory.streamers[0].released
+    assert not sink.get_stats()['open']
+    assert write_frame(sink) == (False, [])
+
+    sink.set_enabled(True)
+    assert write_frame(sink)[0]
+    assert len(factory.streamers) == 2
+    assert sink.get_stats()['closed'] == 1
+
+
+def test_reconfigure_reopens_with_the_new_destination_and_level(factory):
+    sink = StreamSink(factory, '127.0.0.1', 5000, max_level=2, enabled=True)
+    write_frame(sink)
+    sink.configure(host='239.0.0.1', port=6000, level=5)
+    assert factory.streamers[0].released
+    assert len(factory.streamers) == 1
+
+    write_frame(sink)
+    assert factory.streamers[-1].config == ('239.0.0.1', 6000, 2)
+    sink.configure(level=1)
+    write_frame(sink)
+    assert factory.streamers[-1].config == ('239.0.0.1', 6000, 1)
+
+
+def test_failed_open_is_not_retried_until_reconfigured():
+    factory = StreamerFactory(opened=False)
+    sink = StreamSink(factory, '127.0.0.1', 5000, enabled=True)
+    assert write_frame(sink) == (False, [])
+    assert write_frame(sink) == (False, [])
+    assert len(factory.streamers) == 1
+    assert factory.streamers[0].released
+
+    factory.opened = True
+    sink.configure(port=5001)
+    assert write_frame(sink)[0]
+    assert len(factory.streamers) == 2
+
+
+def test_open_errors_and_a_missing_destination_fail_the_stream():
+    sink = StreamSink(StreamerFactory(error=OSError("no encoder")), '127.0.0.1', 5000, enabled=True)
+    assert write_frame(sink) == (False, [])
+
+    factory = StreamerFactory()
+    sink = StreamSink(factory, enabled=True)
+    assert write_frame(sink) == (False, [])
+    assert factory.streamers == []
+
+
+def test_quality_is_clamped_and_applied_without_reopening(factory):
+    sink = StreamSink(factory, '127.0.0.1', 5000, enabled=True)
+    write_frame(sink)
+    sink.set_quality(150)
+    assert write_frame(sink)[1] == [(0, 100)]
+    sink.set_quality(0)
+    assert write_frame(sink)[1] == [(0, 1)]
+    assert len(factory.streamers) == 1
+
+
+def test_close_releases_the_streamer_for_good(factory):
+    sink = StreamSink(factory, '127.0.0.1', 5000, enabled=True)
+    write_frame(sink)
+    sink.close()
+    assert factory.streamers[0].released
+    assert write_frame(sink) == (False, [])
+    assert not sink.is_enabled()
@@ -0,0 +1,267 @@
+import socket
+import time
+
+import pytest
+
+from modules.framing import FrameDecoder, HEADER, encode_frame
+from modules.tcp_server import ClientConnection, OverflowPolicy, TCPServer
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+@pytest.fixture
+def make_server():
+    servers = []
+
+    def make(message_handler=None, **kwargs):
+        server = TCPServer('127.0.0.1', 0, message_handler, **kwargs)
+        server.start()
+        servers.append(server)
+        assert wait_for(lambda: server.server_socket.getsockname()[1] != 0)
+        return server
+
+    yield make
+    for server in servers:
+        server.stop()
+        server.join()
+
+
+@pytest.fixture
+def server(make_server):
+    return make_server()
+
+
+def connect(server):
+    connections = server.get_num_connections()
+    client = socket.create_connection(server.server_socket.getsockname())
+    client.settimeout(5)
+    assert wait_for(lambda: server.get_num_connections() == connections + 1)
+    return client
+
+
+def queued(client):
+    return [bytes(message) for message, _ in client.outbound]
+
+
+def fill(policy, count=3, head_offset=0):
+    client = ClientConnection(None, ('127.0.0.1', 0))
+    for index in range(count):
+        assert client.enqueue(b'%d' % index, index, count, policy, 10)
+    client.head_offset = head_offset
+    return client
+
+
+def connect_without_reading(server):
+    # A small receive buffer so the server's writes back up quickly
+    client = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    client.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+    client.connect(server.server_socket.getsockname())
+    assert wait_for(lambda: server.get_num_connections() == 1)
+    return client
+
+
+def receive_frames(client, count):
+    decoder = FrameDecoder()
+    messages = []
+    while len(messages) < count:
+        data = client.recv(65536)
+        assert data, "connection closed"
+        messages.extend(decoder.feed(data))
+    return messages
+
+
+def test_received_messages_that_are_not_utf8_are_replaced(server):
+    client = connect(server)
+    client.sendall(encode_frame(b'\xff\xfequit') + encode_frame(b'quit'))
+    messages = []
+    assert wait_for(lambda: messages.extend(server.receive_message()) or len(messages) == 2)
+    client.close()
+    assert messages == ['\ufffd\ufffdquit', 'quit']
+
+
+def test_every_client_receives_every_framed_message(server):
+    clients = [connect(server) for _ in range(3)]
+    for index in range(5):
+        server.send_message(b'message %d' % index)
+
+    for client in clients:
+        assert receive_frames(client, 5) == [b'message %d' % index for index in range(5)]
+        client.close()
+
+
+def test_messages_split_across_writes_reach_the_handler(make_server):
+    received = []
+    server = make_server(received.append)
+    client = connect(server)
+    stream = encode_frame(b'first') + encode_frame(b'second message')
+    for offset in range(0, len(stream), 3):
+        client.sendall(stream[offset:offset + 3])
+        time.sleep(0.005)
+
+    assert wait_for(lambda: len(received) == 2)
+    client.close()
+    assert received == [b'first', b'second message']
+
+
+def test_invalid_frame_length_drops_only_that_client(server):
+    good, bad = connect(server), connect(server)
+    bad.sendall(HEADER.pack(0xFFFFFFFF))
+    assert wait_for(lambda: server.get_num_connections() == 1)
+    assert bad.recv(16) == b''
+
+    server.send_message(b'still here')
+    assert receive_frames(good, 1) == [b'still here']
+    good.close()
+    bad.close()
+
+
+def test_disconnected_clients_are_removed(server):
+    client = connect(server)
+    client.close()
+    assert wait_for(lambda: server.get_num_connections() == 0)
+
+    # Sending with no clients left queues nothing
+    server.send_message(b'nobody')
+    assert server.get_client_stats() == []
+
+
+def test_coalesce_keeps_only_the_newest_message():
+    client = fill(OverflowPolicy.COALESCE)
+    assert client.enqueue(b'new', 3, 3, OverflowPolicy.COALESCE, 10)
+    assert queued(client) == [b'new']
+    assert client.get_stats()['dropped'] == 3
+    assert client.get_stats()['bytes_queued'] == 3
+
+
+def test_coalesce_keeps_a_partially_sent_message():
+    client = fill(OverflowPolicy.COALESCE, head_offset=1)
+    assert client.enqueue(b'new', 3, 3, OverflowPolicy.COALESCE, 10)
+    assert queued(client) == [b'0', b'new']
+
+
+def test_drop_oldest_drops_one_message():
+    client = fill(OverflowPolicy.DROP_OLDEST)
+    assert client.enqueue(b'new', 3, 3, OverflowPolicy.DROP_OLDEST, 10)
+    assert queued(client) == [b'1', b'2', b'new']
+    assert client.get_stats()['dropped'] == 1
+
+
+def test_drop_oldest_skips_a_partially_sent_message():
+    client = fill(OverflowPolicy.DROP_OLDEST, head_offset=1)
+    assert client.enqueue(b'new', 3, 3, OverflowPolicy.DROP_OLDEST, 10)
+    assert queued(client) == [b'0', b'2', b'new']
+
+
+def test_new_message_is_dropped_when_only_a_partial_message_is_queued():
+    client = fill(OverflowPolicy.COALESCE, count=1, head_offset=1)
+    assert client.enqueue(b'new', 1, 1, OverflowPolicy.COALESCE, 10)
+    assert queued(client) == [b'0']
+    assert client.get_stats()['dropped'] == 1
+
+
+def test_disconnect_when_the_queue_is_full_or_too_old():
+    client = fill(OverflowPolicy.DISCONNECT)
+    assert not client.enqueue(b'new', 3, 3, OverflowPolicy.DISCONNECT, 10)
+
+    client = fill(OverflowPolicy.DISCONNECT, count=2)
+    assert client.enqueue(b'new', 10, 3, OverflowPolicy.DISCONNECT, 10)
+    client = fill(OverflowPolicy.DISCONNECT, count=2)
+    assert not client.enqueue(b'new', 11, 3, OverflowPolicy.DISCONNECT, 10)
+
+
+def test_unknown_overflow_policy_is_rejected():
+    with pytest.raises(ValueError):
+        TCPServer('127.0.0.1', 0, None, overflow_policy='block')
+
+
+def test_client_that_stops_reading_is_disconnected(make_server):
+    server = make_server(max_queue=2, overflow_policy=OverflowPolicy.DISCONNECT)
+    client = connect_without_reading(server)
+
+    message = bytes(60 * 1024)
+    assert wait_for(lambda: server.send_message(message) or server.get_num_connections() == 0)
+    client.close()
+
+
+def test_client_that_stops_reading_is_coalesced(make_server):
+    server = make_server(max_queue=2, overflow_policy=OverflowPolicy.COALESCE)
+    client = connect_without_reading(server)
+
+    message = bytes(60 * 1024)
+    assert wait_for(lambda: server.send_message(message) or server.get_client_stats()[0]['dropped'] > 0)
+    assert server.get_num_connections() == 1
+    assert server.get_client_stats()[0]['queued'] <= 2
+    client.close()
+
+
+class RecordingSocket:
+    # Accepts a fixed number of bytes per call and records the buffers it was given
+    def __init__(self, accept):
+        self.accept = accept
+        self.calls = []
+
+    def sendmsg(self, buffers):
+        self.calls.append([bytes(buffer) for buffer in buffers])
+        return min(self.accept, sum(len(buffer) for buffer in buffers))
+
+
+def test_batch_is_held_until_it_fills(make_server):
+    server = make_server(batch_count=4, batch_window_us=5_000_000)
+    client = connect(server)
+    client.settimeout(0.2)
+    for index in range(3):
+        server.send_message(b'%d' % index)
+    with pytest.raises(socket.timeout):
+        client.recv(16)
+
+    client.settimeout(5)
+    server.send_message(b'3')
+    assert receive_frames(client, 4) == [b'0', b'1', b'2', b'3']
+    assert wait_for(lambda: server.get_client_stats()[0]['sent'] == 4)
+    assert server.get_client_stats()[0]['send_calls'] == 1
+    client.close()
+
+
+def test_partial_batch_is_flushed_when_its_window_expires(make_server):
+    server = make_server(batch_count=8, batch_window_us=20_000)
+    client = connect(server)
+    server.send_message(b'alone')
+    assert receive_frames(client, 1) == [b'alone']
+    client.close()
+
+
+def test_batch_window_defaults():
+    # A batch count alone gets the default window, a window alone batches up to the queue size
+    server = TCPServer('127.0.0.1', 0, None, batch_count=4)
+    assert server.batch_window_ns == TCPServer.DEFAULT_BATCH_WINDOW_US * 1_000
+    server = TCPServer('127.0.0.1', 0, None, max_queue=8, batch_window_us=1000)
+    assert server.batch_count == 8
+    server = TCPServer('127.0.0.1', 0, None, max_queue=8, batch_count=32)
+    assert server.batch_count == 8
+
+
+def test_queued_messages_go_out_in_one_vectored_write():
+    client = ClientConnection(RecordingSocket(accept=100), ('127.0.0.1', 0))
+    for index in range(3):
+        client.enqueue(b'message %d' % index, 0, 16, OverflowPolicy.COALESCE, 10)
+    client.head_offset = 4
+
+    server = TCPServer('127.0.0.1', 0, None)
+    assert server.send_queued(client) == 23
+    assert client.socket.calls == [[b'age 0', b'message 1', b'message 2']]
+
+
+def test_vectored_write_is_capped_at_max_send_buffers():
+    client = ClientConnection(RecordingSocket(accept=0), ('127.0.0.1', 0))
+    for index in range(TCPServer.MAX_SEND_BUFFERS + 5):
+        client.enqueue(b'%d' % index, 0, 1000, OverflowPolicy.COALESCE, 10)
+
+    TCPServer('127.0.0.1', 0, None).send_queued(client)
+    assert len(client.socket.calls[0]) == TCPServer.MAX_SEND_BUFFERS
@@ -0,0 +1,148 @@
+import json
+import os
+import shutil
+import subprocess
+import time
+
+import numpy as np
+import pytest
+
+from modules.telemetry import (BINARY_RECORD, BINARY_VERSION, MAX_TRACKS, TRACK_DTYPE, TelemetryEncoder, TelemetryFlags,
+                               decode_telemetry)
+
+TELEMETRY_H = os.path.join(os.path.dirname(__file__), '..', '..', 'telemetry.h')
+
+# Decodes a record from stdin with telemetry.h and prints every field, one per line
+DECODER_SOURCE = r'''
+#include <cstdio>
+#include <iostream>
+#include <iterator>
+#include <string>
+#include "telemetry.h"
+
+int main()
+{
+    const std::string payload((std::istreambuf_iterator<char>(std::cin)), std::istreambuf_iterator<char>());
+    TelemetryRecord record;
+    std::vector<TelemetryTrack> tracks;
+    if (!IsBinaryTelemetry(payload.data(), payload.size()) ||
+        !DecodeTelemetry(payload.data(), payload.size(), record) ||
+        !DecodeTelemetryTracks(payload.data(), payload.size(), record, tracks))
+    {
+        return 1;
+    }
+
+    std::printf("%u\n%u\n%u\n%u\n%u\n%llu\n%llu\n", record.version, record.flags, record.trackCount, record.sequence,
+        record.frameSequence, (unsigned long long)record.captureNs, (unsigned long long)record.publishNs);
+    std::printf("%.17g\n%.17g\n%.17g\n%.17g\n%.17g\n", record.timestamp, record.azimuth, record.elevation,
+        record.distance, record.driverMs);
+    std::printf("%.17g\n%.17g\n%.17g\n%.17g\n%.17g\n%.17g\n", record.azimuthRate, record.elevationRate,
+        record.distanceRate, record.azimuthVar, record.elevationVar, record.distanceVar);
+    for (const TelemetryTrack& track : tracks)
+    {
+        std::printf("%u %.9g %.9g %.9g\n", track.id, track.azimuth, track.elevation, track.distance);
+    }
+    return 0;
+}
+'''
+
+
+def encode(encoding='binary', **values):
+    fields = dict(timestamp=43200.5, azimuth=1.25, elevation=-2.5, distance=100.0)
+    fields.update(values)
+    encoder = TelemetryEncoder(encoding)
+    return encoder.encode_binary(**fields) if encoding == 'binary' else encoder.encode_json(**fields)
+
+
+@pytest.fixture(scope='module')
+def decoder(tmp_path_factory):
+    compiler = shutil.which('c++') or shutil.which('g++')
+    if compiler is None:
+        pytest.skip("no C++ compiler to build the telemetry.h decoder")
+    directory = tmp_path_factory.mktemp('decoder')
+    source = directory / 'decode.cpp'
+    source.write_text(DECODER_SOURCE)
+    binary = directory / 'decode'
+    subprocess.run([compiler, '-std=c++17', '-I', os.path.dirname(TELEMETRY_H), '-o', str(binary), str(source)],
+                   check=True)
+    return str(binary)
+
+
+def test_binary_layout_matches_the_header_sizes():
+    # telemetry.h static_asserts TelemetryRecord at 120 and TelemetryTrack at 16 bytes
+    assert BINARY_RECORD.size == 120
+    assert TRACK_DTYPE.itemsize == 16
+    assert encode()[0] == BINARY_VERSION
+    assert encode()[:1] != b'{'
+
+
+def test_binary_record_decodes_with_telemetry_h(decoder):
+    tracks = [(7, 1.5, -0.5, 20.0), (9, -3.0, 2.0, 35.5)]
+    payload = encode(frame_seq=42, capture_ns=123_456_789_012, driver_ms=17.5, rates=(0.1, 0.2, 0.3),
+                     variances=(0.01, 0.02, 0.03), flags=TelemetryFlags.TRACKING | TelemetryFlags.PREDICTED,
+                     tracks=tracks)
+    before = time.monotonic_ns()
+    output = subprocess.run([decoder], input=payload, stdout=subprocess.PIPE, check=True).stdout.decode().split('\n')
+
+    (version, flags, track_count, sequence, frame_seq, capture_ns, publish_ns) = map(int, output[:7])
+    assert (version, flags, track_count, sequence, frame_seq) == (BINARY_VERSION, 3, 2, 1, 42)
+    assert capture_ns == 123_456_789_012
+    assert 0 < publish_ns <= before
+    assert list(map(float, output[7:18])) == [43200.5, 1.25, -2.5, 100.0, 17.5, 0.1, 0.2, 0.3, 0.01, 0.02, 0.03]
+    assert [tuple(map(float, line.split())) for line in output[18:20]] == tracks
+
+
+def test_header_rejects_a_record_of_another_version(decoder):
+    payload = bytearray(encode())
+    payload[0] = BINARY_VERSION + 1
+    assert subprocess.run([decoder], input=bytes(payload)).returncode == 1
+
+
+def test_binary_round_trips_through_decode_telemetry():
+    payload = encode(frame_seq=5, rates=(1.0, 2.0, 3.0), flags=TelemetryFlags.TRACKING, tracks=[(3, 1.0, 2.0, 3.0)])
+    decoded = decode_telemetry(payload)
+    assert decoded['frame_seq'] == 5
+    assert decoded['flags'] == TelemetryFlags.TRACKING
+    assert (decoded['azimuth'], decoded['elevation'], decoded['distance']) == (1.25, -2.5, 100.0)
+    assert (decoded['azimuth_rate'], decoded['elevation_rate'], decoded['distance_rate']) == (1.0, 2.0, 3.0)
+    assert decoded['tracks'] == [[3, 1.0, 2.0, 3.0]]
+
+
+def test_binary_tracks_are_capped_at_max_tracks():
+    tracks = np.arange(4 * (MAX_TRACKS + 10), dtype=float).reshape(-1, 4)
+    payload = encode(tracks=tracks)
+    assert len(payload) == BINARY_RECORD.size + MAX_TRACKS * TRACK_DTYPE.itemsize
+    assert len(decode_telemetry(payload)['tracks']) == MAX_TRACKS
+
+
+def test_decode_rejects_an_unsupported_version():
+    payload = bytearray(encode())
+    payload[0] = BINARY_VERSION + 1
+    with pytest.raises(ValueError):
+        decode_telemetry(bytes(payload))
+
+
+def test_json_and_binary_decode_to_the_same_values():
+    values = dict(frame_seq=8, capture_ns=99, rates=(0.5, 0.25, 0.125), flags=TelemetryFlags.TRACKING)
+    text = encode('json', **values)
+    assert text[:1] == b'{'
+    from_json, from_binary = decode_telemetry(text), decode_telemetry(encode(**values))
+    for key in ('timestamp', 'azimuth', 'elevation', 'distance', 'frame_seq', 'capture_ns', 'flags',
+                'azimuth_rate', 'elevation_rate', 'distance_rate'):
+        assert from_json[key] == from_binary[key], key
+    assert json.loads(text) == from_json
+
+
+def test_sequence_counts_per_encoder_and_wraps_at_32_bits():
+    encoder = TelemetryEncoder('binary')
+    sequences = [decode_telemetry(encoder.encode_binary(0, 0, 0, 0))['sequence'] for _ in range(3)]
+    assert sequences == [1, 2, 3]
+
+    encoder.sequence = 0xFFFFFFFE
+    sequences = [decode_telemetry(encoder.encode_binary(0, 0, 0, 0))['sequence'] for _ in range(2)]
+    assert sequences == [0xFFFFFFFF, 0]
+
+
+def test_unknown_encoding_is_rejected():
+    with pytest.raises(ValueError):
+        TelemetryEncoder('xml')
@@ -0,0 +1,116 @@
+import json
+import os
+import numpy as np
+
+from modules.segmented_writer import SegmentedVideoWriter
+from modules.telemetry import TelemetryFlags
+from modules.telemetry_log import TELEMETRY_LOG_DTYPE, TelemetryLog, read_telemetry_log
+
+MS = 1_000_000
+
+
+def log_frames(log, seqs):
+    for seq in seqs:
+        log.append(seq, seq * 100 * MS, (seq * 0.5, -1.0, 10.0), seq % 2 == 0, 1, 2.5)
+
+
+def test_records_round_trip_through_the_memory_map(tmp_path):
+    log = TelemetryLog(str(tmp_path / 'run.tlm'), flush_records=4)
+    log_frames(log, range(1, 7))
+    assert log.get_stats() == {'logged': 6, 'flushes': 1, 'buffered': 2}
+    log.close()
+
+    records = read_telemetry_log(str(tmp_path / 'run.tlm'))
+    assert records['seq'].tolist() == [1, 2, 3, 4, 5, 6]
+    assert records['azimuth'][2] == 1.5
+    assert records['flags'].tolist() == [0, TelemetryFlags.TRACKING] * 3
+    assert TELEMETRY_LOG_DTYPE.itemsize == 64
+
+
+def test_a_new_log_replaces_an_earlier_run(tmp_path):
+    path = str(tmp_path / 'run.tlm')
+    for _ in range(2):
+        log = TelemetryLog(path)
+        log_frames(log, range(1, 4))
+        log.close()
+    assert read_telemetry_log(path)['seq'].tolist() == [1, 2, 3]
+
+
+def test_roll_completes_the_file_and_close_is_final(tmp_path):
+    log = TelemetryLog(str(tmp_path / 'a.tlm'))
+    log_frames(log, [1, 2])
+    log.roll(str(tmp_path / 'b.tlm'))
+    log_frames(log, [3])
+    log.close()
+    log.close()
+    log_frames(log, [4])
+
+    assert read_telemetry_log(str(tmp_path / 'a.tlm'))['seq'].tolist() == [1, 2]
+    assert read_telemetry_log(str(tmp_path / 'b.tlm'))['seq'].tolist() == [3]
+
+
+def test_roll_moves_the_records_after_the_boundary(tmp_path):
+    log = TelemetryLog(str(tmp_path / 'a.tlm'), flush_records=2)
+    log_frames(log, range(1, 8))
+    log.roll(str(tmp_path / 'b.tlm'), last_seq=4)
+    log_frames(log, [8])
+    log.roll(str(tmp_path / 'c.tlm'), last_seq=8)
+    log.close()
+
+    assert read_telemetry_log(str(tmp_path / 'a.tlm'))['seq'].tolist() == [1, 2, 3, 4]
+    assert read_telemetry_log(str(tmp_path / 'b.tlm'))['seq'].tolist() == [5, 6, 7, 8]
+    assert len(read_telemetry_log(str(tmp_path / 'c.tlm'))) == 0
+
+
+def test_partial_trailing_record_is_not_mapped(tmp_path):
+    path = str(tmp_path / 'run.tlm')
+    log = TelemetryLog(path)
+    log_frames(log, [1])
+    log.close()
+    with open(path, 'ab') as file:
+        file.write(b'\0' * 10)
+    assert len(read_telemetry_log(path)) == 1
+
+
+def test_each_segment_has_its_own_log_within_the_quota(tmp_path):
+    writer = SegmentedVideoWriter(str(tmp_path / 'rec.avi'), 0, 0, (0, 0), segment_secs=0.15, quota_mb=0.25,
+                                  passthrough=True, telemetry=True)
+    frame = np.zeros(100_000, np.uint8)
+    for seq in range(1, 11):
+        writer.write(frame, seq, seq * 100 * MS)
+        writer.telemetry_log.append(seq, seq * 100 * MS, (0.0, 0.0, 0.0), True)
+    writer.release()
+
+    with open(tmp_path / 'rec.index.jsonl') as index:
+        segments = [json.loads(line) for line in index]
+    assert [segment['telemetry'] for segment in segments] == ['rec_00004.tlm']
+    assert segments[0]['bytes'] == 2 * frame.nbytes + 2 * TELEMETRY_LOG_DTYPE.itemsize
+    assert sorted(os.listdir(tmp_path)) == ['rec.index.jsonl', 'rec_00004.avi', 'rec_00004.tlm']
+
+    # The frames logged while a segment was live are in its log
+    assert read_telemetry_log(str(tmp_path / 'rec_00004.tlm'))['seq'].tolist() == [9, 10]
+
+
+def test_segment_logs_match_the_index_with_the_tracker_ahead(tmp_path):
+    writer = SegmentedVideoWriter(str(tmp_path / 'rec.avi'), 0, 0, (0, 0), segment_secs=0.35, passthrough=True,
+                                  telemetry=True)
+    frame = np.zeros(1000, np.uint8)
+
+    # Every frame is logged three frames before the recorder sees it, and only odd frames are recorded
+    log_frames(writer.telemetry_log, range(1, 4))
+    for seq in range(1, 21):
+        if seq + 3 <= 20:
+            log_frames(writer.telemetry_log, [seq + 3])
+        if seq % 2:
+            writer.write(frame, seq, seq * 100 * MS)
+    writer.release()
+
+    with open(tmp_path / 'rec.index.jsonl') as index:
+        segments = [json.loads(line) for line in index]
+    assert len(segments) > 2
+    previous_last = 0
+    for segment in segments:
+        seqs = read_telemetry_log(str(tmp_path / segment['telemetry']))['seq'].tolist()
+        assert seqs == list(range(previous_last + 1, segment['last_seq'] + 1 if segment is not segments[-1] else 21))
+        assert segment['first_seq'] in seqs and segment['last_seq'] in seqs
+        previous_last = segment['last_seq']
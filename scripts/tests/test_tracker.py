@@ -0,0 +1,66 @@
+import pytest
+import numpy as np
+
+from modules.tracker import (CameraModel, ColorBlobTracker, MultiTargetTracker, RoiTracker, create_tracker,
+                             find_tracker)
+
+RED = (0, 0, 255)
+
+
+def frame_with(*boxes, width=320, height=240):
+    frame = np.zeros((height, width, 3), np.uint8)
+    for x, y, side in boxes:
+        frame[y:y + side, x:x + side] = RED
+    return frame
+
+
+def test_camera_model_maps_the_center_and_edges():
+    model = CameraModel(60.0, 40.0)
+    assert model.pixel_to_angles(160, 120, 320, 240) == pytest.approx((0.0, 0.0))
+    assert model.pixel_to_angles(320, 0, 320, 240) == pytest.approx((30.0, 20.0))
+    assert model.pixel_to_angles(0, 240, 320, 240) == pytest.approx((-30.0, -20.0))
+
+
+def test_camera_model_vectorized_matches_scalar():
+    model = CameraModel()
+    xs, ys = np.array([0.0, 100.0, 319.0]), np.array([5.0, 120.0, 239.0])
+    azimuths, elevations = model.pixels_to_angles(xs, ys, 320, 240)
+    for x, y, azimuth, elevation in zip(xs, ys, azimuths, elevations):
+        assert model.pixel_to_angles(x, y, 320, 240) == pytest.approx((azimuth, elevation))
+
+
+def test_distance_from_size_and_unknown_distance():
+    model = CameraModel(90.0)
+    # Focal length of a 90 degree field of view is half the width
+    assert model.distance_from_size(16, 1.0, 320) == pytest.approx(10.0)
+    assert model.distance_from_size(16, 0.0, 320) == 0.0
+    assert model.distances_from_sizes(np.array([16.0, 0.0]), 1.0, 320) == pytest.approx([10.0, 0.0])
+
+
+def test_blob_tracker_finds_blobs_largest_first_above_the_minimum_area():
+    tracker = ColorBlobTracker(CameraModel(), min_area=20)
+    detections = tracker.detect(frame_with((10, 10, 6), (100, 50, 20), (200, 200, 3)))
+    assert [(d.x, d.y, d.width, d.height, d.area) for d in detections] == [(100, 50, 20, 20, 400), (10, 10, 6, 6, 36)]
+    assert (detections[0].cx, detections[0].cy) == pytest.approx((109.5, 59.5))
+
+
+def test_track_reports_the_target_and_nothing_without_one():
+    tracker = ColorBlobTracker(CameraModel())
+    azimuth, elevation, _ = tracker.track(frame_with((150, 110, 20)))
+    assert tracker.found
+    assert azimuth == pytest.approx(0.0, abs=0.2) and elevation == pytest.approx(0.0, abs=0.2)
+
+    assert tracker.track(frame_with()) == (0.0, 0.0, 0.0)
+    assert not tracker.found
+
+
+def test_create_and_find_trackers():
+    assert create_tracker('none', CameraModel()) is None
+    with pytest.raises(ValueError):
+        create_tracker('psychic', CameraModel())
+
+    tracker = create_tracker('blob', CameraModel(), roi=True, min_area=5)
+    assert isinstance(tracker, RoiTracker)
+    assert find_tracker(tracker, ColorBlobTracker).min_area == 5
+    assert find_tracker(tracker, MultiTargetTracker) is None
+    assert find_tracker(None, ColorBlobTracker) is None
@@ -0,0 +1,64 @@
+import functools
+import threading
+import numpy as np
+import pytest
+
+from modules.tracker import CameraModel, ColorBlobTracker
+from modules.tracking_pool import TrackingPool
+
+SHAPE = (120, 160, 3)
+
+
+class Frame:
+    def __init__(self, seq, x):
+        self.seq = seq
+        self.image = np.zeros(SHAPE, np.uint8)
+        self.image[20:30, x:x + 10] = (0, 0, 255)
+        self.references = 0
+
+    def retain(self):
+        self.references += 1
+        return self
+
+    def release(self):
+        self.references -= 1
+
+
+def test_results_come_back_in_order_from_the_workers():
+    pool = TrackingPool(2, SHAPE, functools.partial(ColorBlobTracker, CameraModel()), max_wait_ms=5000)
+    results = []
+    done = threading.Event()
+
+    def on_result(captured, detections):
+        results.append((captured.seq, [detection.x for detection in detections]))
+        if len(results) == 8:
+            done.set()
+
+    pool.on_result = on_result
+    pool.start()
+    frames = [Frame(seq, 10 * seq) for seq in range(1, 9)]
+    try:
+        for frame in frames:
+            pool.submit(frame)
+        assert done.wait(30)
+    finally:
+        pool.stop()
+        pool.join()
+
+    assert results == [(seq, [10 * seq]) for seq in range(1, 9)]
+    assert all(frame.references == 0 for frame in frames)
+    assert pool.get_stats()['emitted'] == 8
+
+
+def test_submit_rejects_frames_of_another_shape():
+    pool = TrackingPool(1, SHAPE, functools.partial(ColorBlobTracker, CameraModel()))
+    frame = Frame(1, 0)
+    frame.image = np.zeros((10, 10, 3), np.uint8)
+    pool.start()
+    try:
+        with pytest.raises(ValueError):
+            pool.submit(frame)
+    finally:
+        pool.stop()
+        pool.join()
+    assert frame.references == 0
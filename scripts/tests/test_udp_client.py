@@ -0,0 +1,83 @@
+import socket
+import time
+
+import pytest
+
+from modules.command_protocol import ErrorCode, MessageType, Parameter, decode_reply, encode_request
+from modules.udp_client import UDPClient
+
+
+def legacy(msg_id, payload):
+    return bytes([UDPClient.SYNC_1, UDPClient.SYNC_2, msg_id]) + payload + bytes([UDPClient.EOB])
+
+
+def stream_config(host, port, level):
+    return legacy(UDPClient.STREAM_CONFIG_MSG_ID, UDPClient.STREAM_CONFIG.pack(socket.inet_aton(host), port, level))
+
+
+def stream_bitrate(ceiling_kbps):
+    return legacy(UDPClient.STREAM_BITRATE_MSG_ID, UDPClient.STREAM_BITRATE.pack(ceiling_kbps))
+
+
+@pytest.fixture
+def client(monkeypatch):
+    import ImageTracking_cv2 as it
+    monkeypatch.setattr(it, 'TRACKER', None)
+    monkeypatch.setattr(UDPClient, 'DEFAULT_TIMEOUT_SECS', 0.1)
+
+    # The tracking script serves the stream bitrate when a stream controller holds it
+    client = UDPClient('127.0.0.1', 0)
+    client.set_max_stream_level(2)
+    it.register_parameters(client.commands, client.control, object(), False, False, None, lambda: None)
+    client.start()
+    yield client
+    client.stop()
+    client.join()
+
+
+def send(client, *datagrams, generation):
+    sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    for datagram in datagrams:
+        sender.sendto(datagram, client.sock.getsockname())
+    deadline = time.monotonic() + 2
+    while client.control.get().generation < generation and time.monotonic() < deadline:
+        time.sleep(0.01)
+    sender.close()
+    return client.control.get()
+
+
+def test_legacy_bitrate_goes_through_the_validated_setter(client):
+    # Datagrams are handled in order, the valid one last shows the invalid one was handled
+    state = send(client, stream_bitrate(0), stream_bitrate(800), generation=1)
+    assert state.generation == 1
+    assert state.stream_bitrate_kbps == 800
+
+
+def test_legacy_stream_config_goes_through_the_validated_setter(client):
+    state = send(client, stream_config('10.0.0.2', 0, 1), stream_config('0.0.0.0', 6000, 1),
+                 stream_config('10.0.0.2', 6000, 3), stream_config('10.0.0.3', 7000, 2), generation=1)
+    assert state.generation == 1
+    assert (state.stream_host, state.stream_port, state.stream_level) == ('10.0.0.3', 7000, 2)
+
+
+def test_legacy_bitrate_is_unavailable_without_a_setter():
+    client = UDPClient('127.0.0.1', 0)
+    try:
+        assert not client.set_parameter(Parameter.STREAM_BITRATE, 800)
+        assert client.control.get().generation == 0
+    finally:
+        client.sock.close()
+
+
+def test_stream_config_over_the_extended_protocol():
+    client = UDPClient('127.0.0.1', 0)
+    try:
+        reply = decode_reply(client.commands.handle(encode_request(1, Parameter.STREAM_CONFIG, socket.inet_aton('10.0.0.4'),
+                                                                   5000, 0)))
+        assert reply == (MessageType.ACK, 1, Parameter.STREAM_CONFIG, (socket.inet_aton('10.0.0.4'), 5000, 0))
+        reply = decode_reply(client.commands.handle(encode_request(2, Parameter.STREAM_CONFIG, socket.inet_aton('10.0.0.4'),
+                                                                   5000, 1)))
+        assert reply[0] == MessageType.NACK and reply[3] == ErrorCode.INVALID_VALUE
+        assert client.control.get().stream_level == 0
+    finally:
+        client.sock.close()
@@ -0,0 +1,158 @@
+import threading
+
+import numpy as np
+import pytest
+
+from modules.pipeline import DropPolicy
+from modules.video_recorder import VideoRecorder
+
+SHAPE = (4, 6, 3)
+
+
+class FakeWriter:
+    # Records the frames written, can hold the recorder inside write() until released
+    def __init__(self, hold=False):
+        self.frames = []
+        self.released = 0
+        self.writing = threading.Event()
+        self.proceed = threading.Event()
+        if not hold:
+            self.proceed.set()
+
+    def write(self, frame, seq, capture_ns):
+        self.writing.set()
+        assert self.proceed.wait(5)
+        self.frames.append((int(frame[0, 0, 0]), seq, capture_ns, frame))
+
+    def release(self):
+        self.released += 1
+
+    def get_stats(self):
+        return {'frames': len(self.frames)}
+
+
+def frame(value):
+    return np.full(SHAPE, value, np.uint8)
+
+
+def held_recorder(drop_policy, queue_size=2):
+    # A recorder whose writer is busy with frame 0, so the next frames stay queued
+    writer = FakeWriter(hold=True)
+    recorder = VideoRecorder(writer, queue_size=queue_size, drop_policy=drop_policy)
+    recorder.start()
+    assert recorder.write(frame(0), 0)
+    assert writer.writing.wait(5)
+    return recorder, writer
+
+
+def wait_written(recorder, count):
+    with recorder.condition:
+        return recorder.condition.wait_for(lambda: recorder.written_count >= count, 5)
+
+
+def test_frames_are_copied_so_the_caller_can_reuse_them():
+    writer = FakeWriter()
+    recorder = VideoRecorder(writer)
+    recorder.start()
+    image = frame(0)
+    for seq in range(1, 4):
+        image[:] = seq
+        assert recorder.write(image, seq, seq * 10)
+    image[:] = 99
+    recorder.close()
+
+    assert [written[:3] for written in writer.frames] == [(1, 1, 10), (2, 2, 20), (3, 3, 30)]
+    assert writer.released == 1
+
+
+def test_buffers_are_reused_between_frames():
+    writer = FakeWriter()
+    recorder = VideoRecorder(writer)
+    recorder.start()
+    for seq in range(20):
+        recorder.write(frame(seq), seq)
+        assert wait_written(recorder, seq + 1)
+    recorder.close()
+    assert recorder.get_stats()['allocations'] == 1
+
+
+def test_drop_oldest_discards_the_oldest_queued_frame():
+    recorder, writer = held_recorder(DropPolicy.DROP_OLDEST)
+    for seq in range(1, 4):
+        assert recorder.write(frame(seq), seq)
+    writer.proceed.set()
+    recorder.close()
+
+    assert [seq for _, seq, _, _ in writer.frames] == [0, 2, 3]
+    assert recorder.get_stats()['dropped'] == 1
+
+
+def test_drop_newest_keeps_the_queued_frames():
+    recorder, writer = held_recorder(DropPolicy.DROP_NEWEST)
+    assert recorder.write(frame(1), 1)
+    assert recorder.write(frame(2), 2)
+    assert not recorder.write(frame(3), 3)
+    writer.proceed.set()
+    recorder.close()
+
+    assert [seq for _, seq, _, _ in writer.frames] == [0, 1, 2]
+    assert recorder.get_stats()['dropped'] == 1
+
+
+def test_block_waits_for_room_in_the_queue():
+    recorder, writer = held_recorder(DropPolicy.BLOCK, queue_size=1)
+    assert recorder.write(frame(1), 1)
+    blocked = threading.Thread(target=recorder.write, args=(frame(2), 2))
+    blocked.start()
+    blocked.join(0.1)
+    assert blocked.is_alive()
+
+    writer.proceed.set()
+    blocked.join(5)
+    recorder.close()
+    assert [seq for _, seq, _, _ in writer.frames] == [0, 1, 2]
+    assert recorder.get_stats()['dropped'] == 0
+
+
+def test_frames_are_passed_through_without_copying():
+    writer = FakeWriter()
+    recorder = VideoRecorder(writer, copy_frames=False)
+    recorder.start()
+    image = frame(5)
+    recorder.write(image, 1)
+    recorder.close()
+    assert writer.frames[0][3] is image
+    assert recorder.get_stats()['allocations'] == 0
+
+
+def test_writer_errors_do_not_stop_the_recorder():
+    writer = FakeWriter()
+    original = writer.write
+
+    def failing_write(frame, seq, capture_ns):
+        if seq == 1:
+            raise IOError("disk full")
+        original(frame, seq, capture_ns)
+
+    writer.write = failing_write
+    recorder = VideoRecorder(writer)
+    recorder.start()
+    for seq in range(3):
+        recorder.write(frame(seq), seq)
+    recorder.close()
+    assert [seq for _, seq, _, _ in writer.frames] == [0, 2]
+    assert writer.released == 1
+
+
+def test_close_without_start_releases_the_writer_and_refuses_frames():
+    writer = FakeWriter()
+    recorder = VideoRecorder(writer)
+    recorder.close()
+    assert writer.released == 1
+    assert not recorder.write(frame(1), 1)
+    assert recorder.get_stats()['dropped'] == 1
+
+
+def test_unknown_drop_policy_is_rejected():
+    with pytest.raises(ValueError):
+        VideoRecorder(FakeWriter(), drop_policy='never')
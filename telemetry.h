@@ -0,0 +1,158 @@
+#pragma once
+/////////////////////////////////////////////////////////////////////////////////
+// @file            telemetry.h
+// @brief           Binary telemetry record shared with the python scripts
+// @author          Chip Brommer
+/////////////////////////////////////////////////////////////////////////////////
+
+/////////////////////////////////////////////////////////////////////////////////
+//
+// Define:
+#ifndef TELEMETRY_H
+#define TELEMETRY_H
+//
+// Includes:
+//          name                    reason included
+//          ------------------      ------------------------
+#include    <cstdint>               // fixed width integers
+#include    <cstddef>               // size_t
+#include    <cstring>               // memcpy
+#include    <algorithm>             // min/max
+#include    <vector>                // decoded tracks
+//
+constexpr uint8_t TELEMETRY_BINARY_VERSION = 4;     // must match BINARY_VERSION in telemetry.py
+constexpr double NO_DRIVER_TIMESTAMP = -1.0;        // driverMs when the camera has no driver timestamp
+constexpr uint8_t TELEMETRY_FLAG_TRACKING = 0x01;   // the values describe a tracked target
+constexpr uint8_t TELEMETRY_FLAG_PREDICTED = 0x02;  // the values are an estimate predicted to publishNs
+constexpr uint16_t TELEMETRY_MAX_TRACKS = 256;      // must match MAX_TRACKS in telemetry.py
+//
+/////////////////////////////////////////////////////////////////////////////////
+
+/// @brief Encoding of the telemetry messages sent by the python script
+enum class TelemetryEncoding : int
+{
+    JSON,
+    BINARY,
+};
+
+/// @brief Fixed layout telemetry record, must match BINARY_RECORD in telemetry.py.
+/// Little endian and naturally aligned, so it is decoded with a single copy and no parsing.
+/// Capture and publish times come from the python monotonic clock, which is the
+/// same clock as std::chrono::steady_clock when both run on the same host.
+struct TelemetryRecord
+{
+    uint8_t     version;        //< TELEMETRY_BINARY_VERSION
+    uint8_t     flags;          //< TELEMETRY_FLAG_* bits
+    uint16_t    trackCount;     //< Number of TelemetryTrack entries following the record
+    uint32_t    sequence;       //< Message sequence number
+    uint32_t    frameSequence;  //< Sequence number of the processed frame
+    uint32_t    reserved2;      //< Reserved
+    uint64_t    captureNs;      //< Monotonic capture time of the processed frame
+    uint64_t    publishNs;      //< Monotonic time of message sending
+    double      timestamp;      //< Timestamp of message sending in seconds since midnight
+    double      azimuth;        //< Azimuth of the tracked item
+    double      elevation;      //< Elevation of the tracked item
+    double      distance;       //< Distance of the tracked item
+    double      driverMs;       //< Driver timestamp of the processed frame, NO_DRIVER_TIMESTAMP if unavailable
+    double      azimuthRate;    //< Azimuth rate of the tracked item per second
+    double      elevationRate;  //< Elevation rate of the tracked item per second
+    double      distanceRate;   //< Distance rate of the tracked item per second
+    double      azimuthVar;     //< Variance of the azimuth estimate
+    double      elevationVar;   //< Variance of the elevation estimate
+    double      distanceVar;    //< Variance of the distance estimate
+};
+static_assert(sizeof(TelemetryRecord) == 120, "TelemetryRecord layout must match telemetry.py");
+
+/// @brief One tracked target, trackCount of these follow a TelemetryRecord. Must match TRACK_DTYPE in telemetry.py.
+struct TelemetryTrack
+{
+    uint32_t    id;             //< Track id, kept while the target is tracked
+    float       azimuth;        //< Azimuth of the target
+    float       elevation;      //< Elevation of the target
+    float       distance;       //< Distance of the target
+};
+static_assert(sizeof(TelemetryTrack) == 16, "TelemetryTrack layout must match telemetry.py");
+
+/// @brief Running statistics of a single latency in milliseconds
+struct LatencyStatistic
+{
+    uint64_t    count = 0;      //< Number of samples
+    double      lastMs = 0;     //< Most recent sample
+    double      minMs = 0;      //< Smallest sample
+    double      maxMs = 0;      //< Largest sample
+    double      totalMs = 0;    //< Sum of all samples
+
+    /// @brief Adds a sample
+    /// @param ms - latency in milliseconds
+    void Add(const double ms)
+    {
+        minMs = count == 0 ? ms : std::min(minMs, ms);
+        maxMs = count == 0 ? ms : std::max(maxMs, ms);
+        lastMs = ms;
+        totalMs += ms;
+        count++;
+    }
+
+    /// @brief Mean of all samples
+    /// @return the mean in milliseconds, 0 without samples
+    double MeanMs() const
+    {
+        return count == 0 ? 0 : totalMs / count;
+    }
+};
+
+/// @brief End to end latency statistics of the camera to EO_Interface path
+struct LatencyStatistics
+{
+    LatencyStatistic    captureToPublish;   //< Frame capture to message sending
+    LatencyStatistic    publishToReceive;   //< Message sending to reception by EO_Interface
+    LatencyStatistic    captureToReceive;   //< Frame capture to reception by EO_Interface
+};
+
+/// @brief Checks if a message holds a binary record rather than JSON
+/// @param data - pointer to the message payload
+/// @param size - size of the message payload in bytes
+/// @return true if the message is a binary record
+inline bool IsBinaryTelemetry(const char* data, const size_t size)
+{
+    return size > 0 && data[0] != '{';
+}
+
+/// @brief Decodes a binary telemetry record
+/// @param data - pointer to the message payload
+/// @param size - size of the message payload in bytes
+/// @param record - record to fill in
+/// @return true if the message held a record of the supported version
+inline bool DecodeTelemetry(const char* data, const size_t size, TelemetryRecord& record)
+{
+    if (size < sizeof(TelemetryRecord) || static_cast<uint8_t>(data[0]) != TELEMETRY_BINARY_VERSION)
+    {
+        return false;
+    }
+
+    std::memcpy(&record, data, sizeof(TelemetryRecord));
+    return true;
+}
+
+/// @brief Decodes the tracks following a binary telemetry record
+/// @param data - pointer to the message payload
+/// @param size - size of the message payload in bytes
+/// @param record - the record decoded from the same message
+/// @param tracks - vector to fill, its capacity is reused between messages
+/// @return true if the message held all the tracks the record announced
+inline bool DecodeTelemetryTracks(const char* data, const size_t size, const TelemetryRecord& record,
+    std::vector<TelemetryTrack>& tracks)
+{
+    tracks.clear();
+    if (record.trackCount > TELEMETRY_MAX_TRACKS ||
+        size < sizeof(TelemetryRecord) + record.trackCount * sizeof(TelemetryTrack))
+    {
+        return false;
+    }
+
+    tracks.resize(record.trackCount);
+    std::memcpy(tracks.data(), data + sizeof(TelemetryRecord), record.trackCount * sizeof(TelemetryTrack));
+    return true;
+}
+
+#endif // TELEMETRY_H